@@ -18,7 +18,6 @@ setuptools.setup(
     setup_requires=['pandas',
                     'numpy'],
     install_requires=['editdistance',
-                      'joblib',
                     'intervaltree'],
 
     tests_require=['pytest'],
@@ -0,0 +1,12 @@
+"""Benchmarks of the evaluation measures
+
+- grouping_scaling: scaling of the grouping with the number of workers
+- synthetic: generation of synthetic golds and discovered class files
+- scaling: scaling of every stage of the evaluation with the size of the
+  synthetic corpus, with results files to compare commits
+
+Each module can be run as a script, e.g.
+
+    python -m tdev2.benchmarks.grouping_scaling --help
+
+"""
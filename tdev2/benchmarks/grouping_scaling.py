@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Scaling of the grouping measure with the number of workers
+
+Reads a gold and a discovered class file once, then computes the grouping
+with 1, 2, 4, ... up to --max_njobs workers, and reports the time taken and
+the speedup compared to a single worker. The scores are checked to be the
+same whatever the number of workers.
+
+By default, the buckeye gold and `share/gold.class` are used. As only the
+buckeye word alignment is shipped, it is also read as the phone alignment:
+the discovered intervals are transcribed with the gold words, so the
+grouping doesn't depend on the phones.
+
+    python -m tdev2.benchmarks.grouping_scaling
+
+"""
+import time
+import argparse
+import pkg_resources
+
+from tdev2.measures.grouping import Grouping
+from tdev2.readers.gold_reader import Gold
+from tdev2.readers.disc_reader import Disc
+
+
+def share_file(name):
+    return pkg_resources.resource_filename(
+        pkg_resources.Requirement.parse('tdev2'),
+        'tdev2/share/{}'.format(name))
+
+
+def time_grouping(disc, njobs, repeat):
+    """ Return the best time of repeat computations of the grouping with
+        njobs workers, and the (precision, recall) obtained
+    """
+    best = None
+    for _ in range(repeat):
+        grouping = Grouping(disc, njobs=njobs)
+        start = time.perf_counter()
+        grouping.compute_grouping()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, (grouping.precision, grouping.recall)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='grouping_scaling',
+        description='Time the grouping measure with 1 to N workers')
+    parser.add_argument('--disc_clsfile', default=share_file('gold.class'),
+                        help="discovered class file")
+    parser.add_argument('--wrd_path', default=share_file('buckeye.wrd'),
+                        help="gold word alignment")
+    parser.add_argument('--phn_path', default=share_file('buckeye.wrd'),
+                        help="gold phone alignment, the word alignment by"
+                             " default")
+    parser.add_argument('--config_file', '-cnf', default=None,
+                        help="path to .json file from which get the"
+                             " configuration, the default one is used"
+                             " otherwise")
+    parser.add_argument('--max_njobs', '-n', type=int, default=16,
+                        help="maximum number of workers")
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+                        help="keep the best time of that many runs")
+    args = parser.parse_args()
+
+    gold = Gold(wrd_path=args.wrd_path, phn_path=args.phn_path,
+                config_file=args.config_file)
+    disc = Disc(args.disc_clsfile, gold)
+
+    njobs = [1]
+    while njobs[-1] * 2 <= args.max_njobs:
+        njobs.append(njobs[-1] * 2)
+    if njobs[-1] != args.max_njobs:
+        njobs.append(args.max_njobs)
+
+    print('{:>6} {:>10} {:>8}'.format('njobs', 'time (s)', 'speedup'))
+    reference = None
+    for n in njobs:
+        elapsed, scores = time_grouping(disc, n, args.repeat)
+        if reference is None:
+            reference, reference_scores = elapsed, scores
+        assert scores == reference_scores, (
+            "grouping with {} workers gives different scores".format(n))
+        print('{:>6} {:>10.3f} {:>8.2f}'.format(
+            n, elapsed, reference / elapsed))
+
+
+if __name__ == "__main__":
+    main()
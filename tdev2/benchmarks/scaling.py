@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+"""Scaling of the evaluation with the size of the corpus
+
+Generates synthetic corpora (see `tdev2.benchmarks.synthetic`) where one
+parameter of the generation takes several values, e.g. the number of files
+or the size of the clusters, and evaluates each of them, recording the
+wall time, CPU time and peak memory of each stage (reading the gold,
+reading the discovered classes, each measure) with a Profiler:
+
+    python -m tdev2.benchmarks.scaling n_files 10 20 40 80 \\
+        --output n_files.json
+
+prints a table of the times, and writes the results in n_files.json, with
+the commit of the code, the parameters of the corpora, and the number of
+intervals, clusters and scores of each of them. With --compare, the times
+are compared to the ones of a results file written by another commit, on
+the same corpora. With --plot, the scaling curves are plotted (this needs
+matplotlib).
+
+Each corpus is evaluated in a fresh process, so that the peak memory
+recorded for a corpus doesn't include the ones of the previous corpora.
+
+"""
+import os
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing as mp
+
+from tdev2.benchmarks import synthetic
+from tdev2.eval_sign import try_compute_scores
+from tdev2.measures.context import EvaluationContext
+from tdev2.profiling import Profiler
+from tdev2.readers.disc_reader import Disc
+from tdev2.readers.gold_reader import Gold
+from tdev2.utils import can_fork
+
+MEASURES = ['boundary', 'grouping', 'token/type', 'coverage', 'coverageNS',
+            'coverageT', 'ned']
+
+
+def git_commit():
+    """ Return the commit of the code, or None if it isn't in a git
+        repository
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def evaluate_point(params, measures=MEASURES, njobs=1, work_dir=None):
+    """ Generate a synthetic corpus with the parameters params, and
+        evaluate it.
+
+        Output
+        :return: a dict of the sizes of the corpus, of the scores and of
+                 the stages recorded
+    """
+    gold_params, cluster_params = synthetic.split_params(params)
+    work_dir = tempfile.mkdtemp(dir=work_dir)
+    try:
+        wrd_path, phn_path, class_file = synthetic.generate(
+            work_dir, gold_params=gold_params, cluster_params=cluster_params)
+
+        profiler = Profiler()
+        with profiler.stage('read_gold'):
+            gold = Gold(vad_path=os.path.splitext(wrd_path)[0] + '.vad',
+                        wrd_path=wrd_path, phn_path=phn_path)
+        with profiler.stage('read_disc'):
+            disc = Disc(class_file, gold, njobs=njobs)
+        scores = try_compute_scores(
+            gold, disc, measures, context=EvaluationContext(gold, disc),
+            njobs=njobs, profiler=profiler)
+    finally:
+        shutil.rmtree(work_dir)
+
+    return {'n_words': sum(len(words) for words in gold.words.values()),
+            'n_intervals': len(disc.intervals),
+            'n_clusters': len(disc.clusters),
+            'n_nodes': sum(len(cluster) for cluster
+                           in disc.clusters.values()),
+            'scores': scores,
+            'stages': profiler.to_dict()}
+
+
+def _evaluate_point(args):
+    return evaluate_point(*args)
+
+
+def run(param, values, base_params, measures=MEASURES, njobs=1,
+        work_dir=None):
+    """ Evaluate the corpora generated with base_params, param taking each
+        of the values. Return the results as a dict that can be written to
+        JSON
+    """
+    points = []
+    for value in values:
+        params = dict(base_params, **{param: value})
+        print('Evaluating the corpus with {} = {}'.format(param, value))
+        args = (params, measures, njobs, work_dir)
+        if can_fork():
+            # a fresh process for each corpus, for its peak memory
+            with mp.get_context('fork').Pool(1) as pool:
+                point = pool.apply(_evaluate_point, (args,))
+        else:
+            point = _evaluate_point(args)
+        point['value'] = value
+        points.append(point)
+
+    return {'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'param': param,
+            'params': base_params,
+            'measures': measures,
+            'njobs': njobs,
+            'points': points}
+
+
+def stage_names(results):
+    """ Return the names of the stages recorded in the results, in the order
+        they were run
+    """
+    names = []
+    for point in results['points']:
+        names.extend(name for name in point['stages'] if name not in names)
+    return names
+
+
+def print_table(results):
+    """ Print the wall time of each stage, and the peak memory, of each
+        corpus
+    """
+    names = stage_names(results)
+    print(' '.join(['{:>12}'.format(results['param']),
+                    '{:>10}'.format('intervals')]
+                   + ['{:>10}'.format(name[:10]) for name in names]
+                   + ['{:>10}'.format('total'), '{:>10}'.format('rss (MB)')]))
+    for point in results['points']:
+        stages = point['stages']
+        times = [stages[name]['wall_time'] if name in stages else None
+                 for name in names]
+        rss = [stage['peak_rss_mb'] for stage in stages.values()
+               if stage['peak_rss_mb'] is not None]
+        print(' '.join(
+            ['{:>12}'.format(point['value']),
+             '{:>10}'.format(point['n_intervals'])]
+            + ['{:>10.3f}'.format(t) if t is not None else '{:>10}'.format('-')
+               for t in times]
+            + ['{:>10.3f}'.format(sum(t for t in times if t is not None)),
+               '{:>10.1f}'.format(max(rss)) if rss else '{:>10}'.format('-')]))
+
+
+def compare(results, reference):
+    """ Print the ratio of the wall time of each stage to its time in the
+        reference results, on the corpora evaluated in both
+    """
+    if results['param'] != reference['param'] \
+            or results['params'] != reference['params']:
+        print('WARNING: the corpora of the reference {} were generated with'
+              ' other parameters'.format(reference['commit']))
+    reference_points = {point['value']: point
+                        for point in reference['points']}
+    names = stage_names(results)
+    print('Time relative to {}'.format(reference['commit']))
+    print(' '.join(['{:>12}'.format(results['param'])]
+                   + ['{:>10}'.format(name[:10]) for name in names]))
+    for point in results['points']:
+        if point['value'] not in reference_points:
+            continue
+        stages = point['stages']
+        reference_stages = reference_points[point['value']]['stages']
+        ratios = []
+        for name in names:
+            if name in stages and name in reference_stages \
+                    and reference_stages[name]['wall_time'] > 0:
+                ratios.append('{:>10.2f}'.format(
+                    stages[name]['wall_time']
+                    / reference_stages[name]['wall_time']))
+            else:
+                ratios.append('{:>10}'.format('-'))
+        print(' '.join(['{:>12}'.format(point['value'])] + ratios))
+
+
+def plot(results, plot_path):
+    """ Plot the wall time of each stage against the value of the
+        parameter, on log-log axes
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print('WARNING: matplotlib is not installed, the scaling curves are'
+              ' not plotted')
+        return
+    fig, ax = plt.subplots()
+    for name in stage_names(results):
+        points = [point for point in results['points']
+                  if name in point['stages']]
+        ax.plot([point['value'] for point in points],
+                [point['stages'][name]['wall_time'] for point in points],
+                marker='o', label=name)
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel(results['param'])
+    ax.set_ylabel('wall time (s)')
+    ax.legend()
+    fig.savefig(plot_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='scaling',
+        description='Time the evaluation of synthetic corpora of'
+                    ' increasing size')
+    parser.add_argument('param',
+                        choices=sorted(set(synthetic.GOLD_PARAMS
+                                           + synthetic.CLUSTER_PARAMS)),
+                        help="parameter of the generation that varies")
+    parser.add_argument('values', nargs='+', type=float,
+                        help="values taken by the parameter")
+    parser.add_argument('--output', '-o', default=None,
+                        help="path to .json file in which to write the"
+                             " results")
+    parser.add_argument('--compare', default=None,
+                        help="results file of another commit to compare"
+                             " the times to")
+    parser.add_argument('--plot', default=None,
+                        help="path of the image of the scaling curves")
+    parser.add_argument('--measures', '-m', nargs='*', default=MEASURES,
+                        choices=MEASURES)
+    parser.add_argument('--njobs', '-n', type=int, default=1,
+                        help="number of cpus to be used to read the"
+                             " discovered classes and to compute the"
+                             " measures")
+    parser.add_argument('--work_dir', default=None,
+                        help="directory in which to write the corpora,"
+                             " the temporary directory by default")
+    synthetic.add_arguments(parser)
+    args = parser.parse_args()
+
+    base_params = {name: getattr(args, name) for name
+                   in synthetic.GOLD_PARAMS + synthetic.CLUSTER_PARAMS}
+    # the parameters are ints, except these ones
+    convert = (float if args.param in ('zipf', 'cluster_size', 'purity',
+                                       'jitter') else int)
+    values = [convert(value) for value in args.values]
+
+    results = run(args.param, values, base_params, args.measures,
+                  args.njobs, args.work_dir)
+    print_table(results)
+
+    if args.output is not None:
+        with open(args.output, 'w') as fout:
+            json.dump(results, fout, indent=2)
+    if args.compare is not None:
+        with open(args.compare, 'r') as fin:
+            compare(results, json.load(fin))
+    if args.plot is not None:
+        plot(results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
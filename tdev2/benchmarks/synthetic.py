@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""Synthetic corpora to benchmark the evaluation
+
+Generates a gold (.phn, .wrd and .vad alignments) and a discovered class
+file whose sizes and distributions are controlled, to time the measures on
+corpora of any size:
+
+- the gold has n_files files of words_per_file words each. As in the sign
+  corpora of tdev2/share, the phone alignment is the word alignment. The
+  words are drawn from a lexicon of lexicon_size words with a Zipf
+  distribution of exponent zipf: with zipf=0 the words are uniformly
+  distributed, the higher zipf the more the frequent words (and their
+  n-grams) are repeated. Some words are separated by gaps.
+- the discovered classes are n_clusters clusters of about cluster_size
+  intervals (Poisson distributed, at least 2). Each cluster is built around
+  an n-gram of 1 to max_ngram words: a fraction purity of its intervals are
+  tokens of this n-gram, whose boundaries are moved by up to jitter
+  seconds, and the others are random intervals. giant_clusters clusters of giant_size random intervals
+  can be added, as output by a UTD system that merges everything.
+
+The same seed gives the same corpus. It can be generated from the command
+line, e.g.
+
+    python -m tdev2.benchmarks.synthetic out_dir --n_files 100
+
+writes out_dir/synthetic.{phn,wrd,vad} and out_dir/synthetic.class.
+
+"""
+import os
+import argparse
+
+import numpy as np
+
+from tdev2.utils import write_disc_class_file
+
+# the times are generated in units of 10ms, to be written exactly
+_TIME_UNIT = 0.01
+
+
+def generate_gold(n_files=10, words_per_file=200, lexicon_size=500,
+                  zipf=1.0, gap_prob=0.3, seed=0):
+    """ Generate a gold alignment.
+
+        Output
+        :return: phones, words: two dicts that give the list of the
+                 (onset, offset, symbol) of the phones and of the words of
+                 each file. As in the sign corpora, the phones are the
+                 words.
+    """
+    rng = np.random.default_rng(seed)
+    lexicon = ['W{}'.format(i) for i in range(lexicon_size)]
+    weights = 1. / np.arange(1, lexicon_size + 1) ** zipf
+    weights /= weights.sum()
+
+    words = dict()
+    for n in range(n_files):
+        fname = 'f{:05d}'.format(n)
+        file_words = []
+        time = int(rng.integers(10, 50))
+        for word_ix in rng.choice(lexicon_size, words_per_file, p=weights):
+            duration = int(rng.integers(10, 60))
+            file_words.append((time, time + duration, lexicon[word_ix]))
+            time += duration
+            # some words are separated by a gap without annotation
+            if rng.random() < gap_prob:
+                time += int(rng.integers(10, 50))
+        words[fname] = [(on * _TIME_UNIT, off * _TIME_UNIT, symbol)
+                        for on, off, symbol in file_words]
+    return words, words
+
+
+def generate_clusters(words, n_clusters=100, cluster_size=5, max_ngram=2,
+                      giant_clusters=0, giant_size=1000, purity=0.8,
+                      jitter=0.02, seed=0):
+    """ Generate discovered clusters of the words of a gold.
+
+        Input
+        :param words:     the words of each file, as returned by
+                          `generate_gold`
+        :param max_ngram: the clusters are built around n-grams of 1 to
+                          max_ngram consecutive words
+        Output
+        :return:          the list of the clusters, each a list of
+                          (fname, onset, offset) intervals
+    """
+    rng = np.random.default_rng(seed)
+    tokens = dict()
+    for fname in sorted(words):
+        file_words = words[fname]
+        for n in range(1, max_ngram + 1):
+            for i in range(len(file_words) - n + 1):
+                ngram = tuple(symbol for _, _, symbol
+                              in file_words[i:i + n])
+                tokens.setdefault(ngram, []).append(
+                    (fname, file_words[i][0], file_words[i + n - 1][1]))
+    # the clusters are built around the repeated n-grams, more often
+    # around the frequent ones
+    types = sorted(ngram for ngram in tokens if len(tokens[ngram]) > 1)
+    if len(types) == 0:
+        raise ValueError('no n-gram occurs twice in the gold')
+    weights = np.array([len(tokens[ngram]) for ngram in types], dtype=float)
+    weights /= weights.sum()
+
+    fnames = sorted(words)
+    durations = {fname: words[fname][-1][1] for fname in fnames
+                 if len(words[fname]) > 0}
+    fnames = sorted(durations)
+    max_jitter = int(round(jitter / _TIME_UNIT))
+
+    def random_interval():
+        fname = fnames[rng.integers(len(fnames))]
+        length = int(rng.integers(20, 80))
+        onset = int(rng.integers(0, max(1, int(durations[fname]
+                                               / _TIME_UNIT) - length)))
+        return (fname, onset * _TIME_UNIT, (onset + length) * _TIME_UNIT)
+
+    def jittered(token):
+        fname, onset, offset = token
+        onset = int(round(onset / _TIME_UNIT))
+        offset = int(round(offset / _TIME_UNIT))
+        onset += int(rng.integers(-max_jitter, max_jitter + 1))
+        offset += int(rng.integers(-max_jitter, max_jitter + 1))
+        onset = max(0, onset)
+        offset = max(onset + 1, offset)
+        return (fname, onset * _TIME_UNIT, offset * _TIME_UNIT)
+
+    clusters = []
+    for type_ix in rng.choice(len(types), n_clusters, p=weights):
+        ngram_tokens = tokens[types[type_ix]]
+        size = max(2, int(rng.poisson(cluster_size)))
+        cluster = []
+        for _ in range(size):
+            if rng.random() < purity:
+                token = ngram_tokens[rng.integers(len(ngram_tokens))]
+                cluster.append(jittered(token))
+            else:
+                cluster.append(random_interval())
+        clusters.append(cluster)
+    for _ in range(giant_clusters):
+        clusters.append([random_interval() for _ in range(giant_size)])
+    return clusters
+
+
+def write_gold(phones, words, out_dir, name='synthetic'):
+    """ Write the gold in out_dir/name.phn, name.wrd and name.vad (one
+        speech segment per file, from its first to its last word). Return
+        the paths of the three files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, '{}.{}'.format(name, ext))
+             for ext in ('phn', 'wrd', 'vad')]
+    vad = {fname: [(words[fname][0][0], words[fname][-1][1])]
+           for fname in words if len(words[fname]) > 0}
+    for path, alignment in zip(paths[:2], (phones, words)):
+        with open(path, 'w') as fout:
+            for fname in sorted(alignment):
+                for onset, offset, symbol in alignment[fname]:
+                    fout.write('{} {:.2f} {:.2f} {}\n'.format(
+                        fname, onset, offset, symbol))
+    with open(paths[2], 'w') as fout:
+        for fname in sorted(vad):
+            for onset, offset in vad[fname]:
+                fout.write('{} {:.2f} {:.2f}\n'.format(fname, onset, offset))
+    return paths
+
+
+def write_clusters(clusters, class_file):
+    """ Write the clusters in the class file format read by Disc"""
+    nodes = [interval for cluster in clusters for interval in cluster]
+    dedups, start = [], 0
+    for cluster in clusters:
+        dedups.append(list(range(start, start + len(cluster))))
+        start += len(cluster)
+    write_disc_class_file(dedups, nodes, class_file)
+
+
+def generate(out_dir, name='synthetic', gold_params=None,
+             cluster_params=None):
+    """ Generate a gold and discovered clusters, and write them in out_dir.
+
+        Input
+        :param gold_params:    dict of the parameters of `generate_gold`
+        :param cluster_params: dict of the parameters of
+                               `generate_clusters`
+        Output
+        :return:               the paths of the .wrd, .phn and class files
+    """
+    phones, words = generate_gold(**(gold_params or dict()))
+    clusters = generate_clusters(words, **(cluster_params or dict()))
+    phn_path, wrd_path, _ = write_gold(phones, words, out_dir, name)
+    class_file = os.path.join(out_dir, '{}.class'.format(name))
+    write_clusters(clusters, class_file)
+    return wrd_path, phn_path, class_file
+
+
+GOLD_PARAMS = ['n_files', 'words_per_file', 'lexicon_size', 'zipf', 'seed']
+CLUSTER_PARAMS = ['n_clusters', 'cluster_size', 'max_ngram',
+                  'giant_clusters', 'giant_size', 'purity', 'jitter', 'seed']
+
+
+def add_arguments(parser):
+    """ Add the parameters of the generation to an ArgumentParser"""
+    parser.add_argument('--n_files', type=int, default=10)
+    parser.add_argument('--words_per_file', type=int, default=200)
+    parser.add_argument('--lexicon_size', type=int, default=500)
+    parser.add_argument('--zipf', type=float, default=1.0,
+                        help="exponent of the Zipf distribution of the"
+                             " words, 0 for a uniform distribution")
+    parser.add_argument('--n_clusters', type=int, default=100)
+    parser.add_argument('--cluster_size', type=float, default=5,
+                        help="mean number of intervals of a cluster")
+    parser.add_argument('--max_ngram', type=int, default=2,
+                        help="maximum number of words of the n-grams around"
+                             " which the clusters are built")
+    parser.add_argument('--giant_clusters', type=int, default=0,
+                        help="number of clusters of random intervals")
+    parser.add_argument('--giant_size', type=int, default=1000,
+                        help="number of intervals of the giant clusters")
+    parser.add_argument('--purity', type=float, default=0.8,
+                        help="fraction of the intervals of a cluster that"
+                             " are tokens of its word type")
+    parser.add_argument('--jitter', type=float, default=0.02,
+                        help="maximum shift of the boundaries of the"
+                             " tokens, in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def split_params(params):
+    """ Split a dict of the parameters of the generation in the parameters
+        of `generate_gold` and those of `generate_clusters`
+    """
+    return ({name: params[name] for name in GOLD_PARAMS if name in params},
+            {name: params[name] for name in CLUSTER_PARAMS
+             if name in params})
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='synthetic',
+        description='Generate a synthetic gold and discovered class file')
+    parser.add_argument('out_dir', help="directory in which to write them")
+    parser.add_argument('--name', default='synthetic',
+                        help="name of the files")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    gold_params, cluster_params = split_params(vars(args))
+    paths = generate(args.out_dir, args.name, gold_params, cluster_params)
+    print('Wrote {}'.format(', '.join(paths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,68 @@
-
-
+"""Default configuration of the evaluation, and the Config object that
+   carries it.
+"""
+import json
+from collections import namedtuple
 
 overlap_th = 10.
 excluded_units = ['SIL','__ON__','__OFF__','__EMOTION__','SPN']
-discoverable_th = 1
\ No newline at end of file
+discoverable_th = 1
+boundary_tolerance = 0.
+
+
+class Config(namedtuple('Config', ['overlap_th', 'excluded_units',
+                                   'discoverable_th',
+                                   'boundary_tolerance'])):
+    """Immutable configuration of an evaluation.
+
+    A Config is read once per run (see `Config.read`) and passed explicitly
+    to the Gold, the Disc and the measures, so that evaluations with
+    different configurations can run at the same time in one process.
+
+    :param overlap_th:      a phone at the border of a discovered interval
+                            is discovered if the interval overlaps it by
+                            more than overlap_th or 50% (see
+                            `check_boundary`)
+    :param excluded_units:  frozenset of the units ignored by NED and the
+                            coverages
+    :param discoverable_th: a unit is discoverable if it occurs more than
+                            discoverable_th times (see Coverage_NoSingleton)
+    :param boundary_tolerance: a discovered boundary is a gold boundary if
+                            it is at most boundary_tolerance away from it,
+                            in the time unit of the alignments (see
+                            Boundary). Optional in the config file, 0 by
+                            default: the boundaries must be the same
+    """
+    __slots__ = ()
+
+    def __new__(cls, overlap_th=overlap_th, excluded_units=excluded_units,
+                discoverable_th=discoverable_th,
+                boundary_tolerance=boundary_tolerance):
+        return super(Config, cls).__new__(
+            cls, overlap_th, frozenset(excluded_units), discoverable_th,
+            boundary_tolerance)
+
+    @classmethod
+    def read(cls, config_file):
+        """ Read the configuration from a .json file"""
+        with open(config_file, 'r') as f:
+            conf = json.load(f)
+        config = cls(conf['overlap_th'], conf['excluded_units'],
+                     conf['discoverable_th'],
+                     conf.get('boundary_tolerance', boundary_tolerance))
+        print('*** Config file read, ovth {} ***'.format(config.overlap_th))
+        return config
+
+
+def load_config(config=None, config_file=None, default=None):
+    """ Return config if given, else the configuration read from
+        config_file if given, else default if given (e.g. the configuration
+        of the gold), else the default configuration
+    """
+    if config is not None:
+        return config
+    if config_file is not None:
+        return Config.read(config_file)
+    if default is not None:
+        return default
+    return Config()
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
+import os
+import json
 import time
 import argparse
+import traceback
 import pkg_resources 
 
 from tdev2.measures.ned import *
@@ -8,6 +11,11 @@ from tdev2.measures.boundary import *
 from tdev2.measures.grouping import *
 from tdev2.measures.coverage import *
 from tdev2.measures.token_type import *
+from tdev2.measures.context import EvaluationContext
+from tdev2.eval_sign import share_context
+from tdev2.utils import fork_map, fork_shared
+from tdev2.config import load_config
+from tdev2.profiling import Profiler
 from tdev2.readers.gold_reader import *
 from tdev2.readers.disc_reader import *
 
@@ -43,16 +51,46 @@ def main():
                         nargs='*',
                         default=[],
                         choices=['boundary', 'grouping', 
-                                 'token/type', 'coverage',
+                                 'token/type', 'coverage', 'coverageT',
                                  'ned'])
     parser.add_argument('--njobs', '-n',
                         default=1,
                         type=int,
-                        help="number of cpus to be used in grouping")
+                        help="number of cpus to be used to read the discovered"
+                             " classes, to compute the measures concurrently"
+                             " and in grouping")
     parser.add_argument('output', type=str,
                         help="path in which to write the output")
+    parser.add_argument('--cache_dir', '-c',
+                        default=None,
+                        type=str,
+                        help="directory in which to cache the parsed gold"
+                             " alignments, to speed up the next runs")
+    parser.add_argument('--config_file', '-cnf',
+                        default=None,
+                        type=str,
+                        help="path to .json file from which get the"
+                             " configuration, the default one is used"
+                             " otherwise")
+    parser.add_argument('--prune_silence',
+                        action='store_true',
+                        help="throw away the discovered intervals entirely"
+                             " outside of the speech of the VAD of the"
+                             " corpus, before transcribing them")
+    parser.add_argument('--profile', '-p',
+                        action='store_true',
+                        help="record the wall time, CPU time and peak memory"
+                             " of each stage of the evaluation, and write"
+                             " them in output/profile.json")
+    parser.add_argument('--cprofile_dir',
+                        default=None,
+                        type=str,
+                        help="with --profile, also dump the cProfile"
+                             " statistics of each stage in this directory")
 
     args = parser.parse_args()
+    config = load_config(config_file=args.config_file)
+    profiler = Profiler(args.profile, args.cprofile_dir)
 
     # load the corpus alignments
     wrd_path = pkg_resources.resource_filename(
@@ -61,45 +99,118 @@ def main():
     phn_path = pkg_resources.resource_filename(
             pkg_resources.Requirement.parse('tdev2'),
             'tdev2/share/{}.phn'.format(args.corpus))
+    vad_path = pkg_resources.resource_filename(
+            pkg_resources.Requirement.parse('tdev2'),
+            'tdev2/share/{}.vad'.format(args.corpus))
+    if not os.path.isfile(vad_path):
+        vad_path = None
  
     print('Reading gold')
-    gold = Gold(wrd_path=wrd_path, 
-                phn_path=phn_path)
+    with profiler.stage('read_gold'):
+        gold = Gold(vad_path=vad_path,
+                    wrd_path=wrd_path, 
+                    phn_path=phn_path,
+                    cache_dir=args.cache_dir,
+                    config=config)
 
     print('Reading discovered classes')
-    disc = Disc(args.disc_clsfile, gold) 
+    with profiler.stage('read_disc'):
+        disc = Disc(args.disc_clsfile, gold, njobs=args.njobs,
+                    prune_silence=args.prune_silence)
 
     measures = args.measures
     output = args.output
 
-    # Launch evaluation of each metric and write it 
-    # in the output
-    if len(measures) == 0 or "boundary" in measures:
-        print('Computing Boundary...')
-        boundary = Boundary(gold, disc, output)
-        boundary.compute_boundary()
-        boundary.write_score()
-    if len(measures) == 0 or "grouping" in measures:
-        print('Computing Grouping...')
-        grouping = Grouping(disc, output, args.njobs)
-        grouping.compute_grouping()
-        grouping.write_score()
-    if len(measures) == 0 or "token/type" in measures:
-        print('Computing Token and Type...')
-        token_type = TokenType(gold, disc, output)
-        token_type.compute_token_type()
-        token_type.write_score()
-    if len(measures) == 0 or "coverage" in measures:
-        print('Computing Coverage...')
-        coverage = Coverage(gold, disc, output)
-        coverage.compute_coverage()
-        coverage.write_score()
-    if len(measures) == 0 or "ned" in measures:
-        print('Computing NED...')
-        ned = Ned(disc, output)
-        ned.compute_ned()
-        ned.write_score()
+    # data shared by the measures, computed once
+    context = EvaluationContext(gold, disc)
+
+    # Launch evaluation of each metric and write it
+    # in the output. The measures are independent, with njobs > 1
+    # they are computed concurrently on forked processes.
+    measures = [measure for measure
+                in ['boundary', 'grouping', 'token/type', 'coverage',
+                    'coverageT', 'ned']
+                if len(measures) == 0 or measure in measures]
+    if args.njobs > 1:
+        with profiler.stage('shared_context'):
+            share_context(context, measures)
+    results = fork_map(try_compute_measure, measures, args.njobs,
+                       shared=(gold, disc, context, output, args.njobs,
+                               config, profiler),
+                       on_crash=_crashed_measure)
+
+    # a failing measure doesn't stop the others
+    for measure, (stages, failure) in zip(measures, results):
+        profiler.update(stages)
+        if failure is not None:
+            trace, exc = failure
+            print('WARNING: Computing {} scores failed ! '.format(measure))
+            print(trace)
+            print(exc)
+
+    if args.profile:
+        with open(os.path.join(output, 'profile.json'), 'w') as fout:
+            json.dump(profiler.to_dict(), fout, indent=2)
+
+
+def try_compute_measure(measure):
+    """ Compute a measure and write its score in the output. Return the
+        stages recorded while computing it when profiling, and None, or the
+        traceback and the message of the exception if it failed.
+    """
+    profiler = fork_shared()[-1]
+    # the stages recorded by a worker are sent back to the main process
+    profiler = Profiler(profiler.enabled, profiler.cprofile_dir)
+    try:
+        compute_measure(measure, profiler)
+    except Exception as exc:
+        return profiler.to_dict(), (traceback.format_exc(), str(exc))
+    return profiler.to_dict(), None
+
+
+def _crashed_measure(measure, exc):
+    """ The failure of a measure whose worker died"""
+    return {}, ('the worker computing {} died'.format(measure), str(exc))
+
+
+def compute_measure(measure, profiler):
+    """ Compute a measure and write its score in the output, recording it
+        as a stage of the profiler.
+    """
+    gold, disc, context, output, njobs, config, _ = fork_shared()
+    with profiler.stage(measure):
+        if measure == "boundary":
+            print('Computing Boundary...')
+            boundary = Boundary(gold, disc, output, context=context,
+                                config=config)
+            boundary.compute_boundary()
+            boundary.write_score()
+        if measure == "grouping":
+            print('Computing Grouping...')
+            grouping = Grouping(disc, output, njobs, context=context)
+            grouping.compute_grouping()
+            grouping.write_score()
+        if measure == "token/type":
+            print('Computing Token and Type...')
+            token_type = TokenType(gold, disc, output, context=context)
+            token_type.compute_token_type()
+            token_type.write_score()
+        if measure == "coverage":
+            print('Computing Coverage...')
+            coverage = Coverage(gold, disc, output, context=context)
+            coverage.compute_coverage()
+            coverage.write_score()
+        if measure == "coverageT":
+            print('Computing Time Coverage...')
+            coverageT = TimeCoverage(gold, disc, output, context=context)
+            coverageT.compute_coverage()
+            coverageT.write_score()
+        if measure == "ned":
+            print('Computing NED...')
+            ned = Ned(disc, output_folder=output)
+            ned.compute_ned()
+            ned.write_score()
+
 
-    
 if __name__ == "__main__": 
     main()
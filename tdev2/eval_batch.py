@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""Evaluate many experiment directories against one loaded gold
+
+The gold of the corpus is read once, and each experiment directory is
+evaluated as by `eval_sign.py`: the gold is narrowed to the files of the
+experiment, the output of the UTD system is read, and the
+scores are computed. The experiments are shared between a pool of njobs
+processes forked after the gold is loaded. The scores of all the
+experiments are written in one JSON file, and in a CSV file with one row
+per experiment:
+
+    python eval_batch.py phoenix sdtw scores.json 'sweep/exp_*'
+
+An experiment that fails, or whose process dies, is reported and gets
+empty scores, without stopping the others.
+
+"""
+import os
+import csv
+import glob
+import json
+import argparse
+import traceback
+
+from tdev2.config import Config
+from tdev2.eval_sign import cols, load_gold, evaluate_experiment
+from tdev2.utils import fork_map, fork_shared
+
+
+def expand_paths(patterns, exp_list=None):
+    """ Return the sorted experiment directories matching the glob
+        patterns, and those listed in the exp_list file (one per line)
+    """
+    exp_paths = set()
+    for pattern in patterns:
+        matches = [path for path in glob.glob(pattern) if os.path.isdir(path)]
+        if len(matches) == 0:
+            print('WARNING: no experiment directory matches {}'.format(
+                pattern))
+        exp_paths.update(matches)
+    if exp_list is not None:
+        with open(exp_list, 'r') as fin:
+            exp_paths.update(line.strip() for line in fin if line.strip())
+    return sorted(exp_paths)
+
+
+def _evaluate(exp_path):
+    """ Evaluate an experiment in a worker process. Return its scores, or
+        None if the evaluation failed
+    """
+    gold, utd_sys, measures, kwargs = fork_shared()
+    try:
+        return evaluate_experiment(gold, exp_path, utd_sys, measures,
+                                   **kwargs)
+    except Exception as exc:
+        print('WARNING: Evaluating {} failed ! '.format(exp_path))
+        print(traceback.format_exc())
+        print(exc)
+        return None
+
+
+def _crashed_experiment(exp_path, exc):
+    """ The scores of an experiment whose worker died"""
+    print('WARNING: Evaluating {} failed, its process died ! '.format(
+        exp_path))
+    print(exc)
+    return None
+
+
+def evaluate_batch(gold, exp_paths, utd_sys, measures=[], njobs=1,
+                   write_class=False, **kwargs):
+    """ Evaluate all the experiments of exp_paths against the gold.
+
+        The experiments are evaluated on a pool of njobs processes, each
+        experiment being evaluated in a single process. An experiment
+        fails if its process dies (e.g. killed when out of memory).
+
+        Output
+        :return: a dict that gives the scores of each experiment, None for
+                 the experiments whose evaluation failed
+    """
+    kwargs = dict(kwargs, njobs=1, write_class=write_class)
+    results = fork_map(_evaluate, exp_paths, njobs,
+                       shared=(gold, utd_sys, measures, kwargs),
+                       on_crash=_crashed_experiment)
+    return dict(zip(exp_paths, results))
+
+
+def write_csv(all_scores, csv_path):
+    """ Write the scores of each experiment as a row of csv_path"""
+    columns = ['exp_path'] + cols + ['n_clus', 'n_node']
+    with open(csv_path, 'w', newline='') as fout:
+        writer = csv.writer(fout)
+        writer.writerow(columns)
+        for exp_path, scores in all_scores.items():
+            if scores is None:
+                scores = {}
+            writer.writerow([exp_path] + [scores.get(col, '')
+                                          for col in columns[1:]])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='TDE batch',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Evaluate many sign term discovery experiments',
+        epilog=__doc__)
+    parser.add_argument('corpus', metavar='language', type=str,
+                        choices=['phoenix','phoenixClean', 'mdgsClean_right', 'mdgsClean_both'],
+                        help='Choose the corpus you want to evaluate')
+
+    parser.add_argument('UTDsys', type=str, choices=['zr17','sdtw'],
+                        help="type of UTD system")
+
+    parser.add_argument('output', type=str,
+                        help="path to .json file in which to write the"
+                             " scores of all the experiments")
+
+    parser.add_argument('exp_paths', metavar='experiment_fullpath',
+                        type=str, nargs='*',
+                        help="experiment directories, or glob patterns"
+                             " matching them")
+
+    parser.add_argument('--exp_list', '-l',
+                        default=None,
+                        type=str,
+                        help="file listing experiment directories, one per"
+                             " line")
+
+    parser.add_argument('--csv', '-o',
+                        default=None,
+                        type=str,
+                        help="path to .csv file in which to write the scores,"
+                             " by default the output with a .csv extension")
+
+    parser.add_argument('--measures', '-m',
+                        nargs='*',
+                        default=[],
+                        choices=['boundary', 'grouping',
+                                 'token/type', 'coverage','coverageNS',
+                                 'coverageT',
+                                 'ned'])
+
+    parser.add_argument('--njobs', '-n',
+                        default=1,
+                        type=int,
+                        help="number of experiments evaluated at the same"
+                             " time")
+
+    parser.add_argument('--config_file', '-cnf',
+                        default='../../../config.json',
+                        type=str,
+                        help="path to .json file from which get the configuration")
+
+    parser.add_argument('--cache_dir', '-c',
+                        default=None,
+                        type=str,
+                        help="directory in which to cache the parsed gold"
+                             " alignments, to speed up the next runs")
+
+    parser.add_argument('--write_class', '-w',
+                        action='store_true',
+                        help="also write the discovered clusters as a class"
+                             " file in each experiment directory")
+
+    parser.add_argument('--prune_silence',
+                        action='store_true',
+                        help="throw away the discovered intervals entirely"
+                             " outside of the speech of the VAD of the"
+                             " corpus, before transcribing them")
+
+    args = parser.parse_args()
+
+    exp_paths = expand_paths(args.exp_paths, args.exp_list)
+    if len(exp_paths) == 0:
+        parser.error('no experiment to evaluate')
+    print('{} experiments to evaluate'.format(len(exp_paths)))
+
+    # the configuration is read once, and shared by all the experiments
+    config = Config.read(args.config_file)
+    gold = load_gold(args.corpus, args.cache_dir, config=config)
+
+    all_scores = evaluate_batch(gold, exp_paths, args.UTDsys, args.measures,
+                                njobs=args.njobs,
+                                write_class=args.write_class,
+                                config=config,
+                                prune_silence=args.prune_silence)
+
+    with open(args.output, 'w') as fout:
+        json.dump(all_scores, fout)
+
+    csv_path = args.csv
+    if csv_path is None:
+        csv_path = os.path.splitext(args.output)[0] + '.csv'
+    write_csv(all_scores, csv_path)
+
+    n_failed = sum(scores is None for scores in all_scores.values())
+    if n_failed > 0:
+        print('WARNING: {} experiments out of {} failed'.format(
+            n_failed, len(all_scores)))
+
+
+if __name__ == "__main__":
+    main()
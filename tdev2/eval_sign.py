@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import time
 import argparse
 import pkg_resources 
@@ -8,16 +9,23 @@ from tdev2.measures.boundary import *
 from tdev2.measures.grouping import *
 from tdev2.measures.coverage import *
 from tdev2.measures.token_type import *
+from tdev2.measures.context import EvaluationContext
+from tdev2.config import Config, load_config
+from tdev2.profiling import Profiler
+from tdev2.measures.statistics import merge_statistics, in_shard
 from tdev2.readers.gold_reader import *
 from tdev2.readers.disc_reader import *
 
-from tdev2.utils import zrexp2tde, sdtw2tde, narrow_gold
+from tdev2.utils import zrexp2nodes, sdtw2nodes, narrow_gold
+from tdev2.utils import write_disc_class_file
+from tdev2.utils import fork_map, fork_shared
 import json
 import traceback
+from collections import Counter
 from os.path import join
 
 cols = [
-            'ned', 'coverage', 'coverageNS', 'coverageNS_f', 
+            'ned', 'coverage', 'coverageNS', 'coverageNS_f', 'coverageT',
             'grouping_F', 'grouping_P', 'grouping_R', 
             'token_F', 'token_P', 'token_R', 
             'type_F', 'type_P', 'type_R',
@@ -25,6 +33,17 @@ cols = [
         ]
 
 
+# data of the EvaluationContext used by each measure
+context_data = {
+    'boundary': ['disc_boundaries', 'gold_boundaries', 'n_gold_boundaries'],
+    'grouping': ['type_groups'],
+    'token/type': ['word_counts', 'words', 'phones', 'phone_symbols'],
+    'coverage': ['phone_counts'],
+    'coverageNS': ['phones', 'phone_symbols', 'phone_totals'],
+    'coverageT': ['phones', 'phone_symbols'],
+    'ned': []}
+
+
 def prf2dict(dct, measurename, obj):
     dct[measurename + '_P'] = obj.precision
     dct[measurename + '_R'] = obj.recall
@@ -33,48 +52,74 @@ def prf2dict(dct, measurename, obj):
     return dct
 
 
-def compute_scores(gold, disc, measures=[], **kwargs):
+def compute_scores(gold, disc, measures=[], context=None, statistics=None,
+                   **kwargs):
+    """ Compute the scores of the measures. If statistics is given, the
+        scores are computed from the statistics of each measure (e.g.
+        merged from shards, see `compute_statistics`) instead of from the
+        whole corpus.
+    """
     scores = dict()
-    
+    config = load_config(kwargs.get('config'), kwargs.get('config_file'),
+                         default=getattr(gold, 'config', None))
+    profiler = kwargs.get('profiler') or Profiler(enabled=False)
+
+    # data shared by the measures, computed once
+    if context is None:
+        context = EvaluationContext(gold, disc)
+
+    def compute(name, measure, compute_measure):
+        with profiler.stage(name):
+            if statistics is not None:
+                measure.load_statistics(statistics[name])
+            else:
+                compute_measure()
+
     # Launch evaluation of each metric
     if len(measures) == 0 or "boundary" in measures:
         print('Computing Boundary...')
-        boundary = Boundary(gold, disc)
-        boundary.compute_boundary()
+        boundary = Boundary(gold, disc, config=config, context=context)
+        compute('boundary', boundary, boundary.compute_boundary)
         scores = prf2dict(scores, 'boundary', boundary)
         
     if len(measures) == 0 or "grouping" in measures:
         print('Computing Grouping...')
-        grouping = Grouping(disc,  njobs=kwargs['njobs'])
-        grouping.compute_grouping()
+        grouping = Grouping(disc,  njobs=kwargs['njobs'], context=context)
+        compute('grouping', grouping, grouping.compute_grouping)
         scores = prf2dict(scores, 'grouping', grouping)    
         
     if len(measures) == 0 or "token/type" in measures:
         print('Computing Token and Type...')
-        token_type = TokenType(gold, disc)
-        token_type.compute_token_type()
+        token_type = TokenType(gold, disc, context=context)
+        compute('token/type', token_type, token_type.compute_token_type)
         scores['token_P'],scores['token_R'],scores['token_F'] = token_type.precision[0], token_type.recall[0], token_type.fscore[0]
         scores['type_P'],scores['type_R'],scores['type_F'] = token_type.precision[1], token_type.recall[1], token_type.fscore[1]        
         
     if len(measures) == 0 or "coverage" in measures:
         print('Computing Coverage...')
-        coverage = Coverage(gold, disc)
-        coverage.compute_coverage()
+        coverage = Coverage(gold, disc, context=context)
+        compute('coverage', coverage, coverage.compute_coverage)
         scores['coverage'] = coverage.coverage
 
         
     if len(measures) == 0 or "coverageNS" in measures:
         print('Computing Coverage No Single...')
-        coverageNS = Coverage_NoSingleton(gold, disc, config_file=kwargs['config_file'])
-        coverageNS.compute_coverage()
+        coverageNS = Coverage_NoSingleton(gold, disc, config=config,
+                                          context=context)
+        compute('coverageNS', coverageNS, coverageNS.compute_coverage)
         scores['coverageNS'] = coverageNS.coverage
         scores['coverageNS_f'] = coverageNS.coverage_frames
 
+    if len(measures) == 0 or "coverageT" in measures:
+        print('Computing Time Coverage...')
+        coverageT = TimeCoverage(gold, disc, config=config, context=context)
+        compute('coverageT', coverageT, coverageT.compute_coverage)
+        scores['coverageT'] = coverageT.coverage
         
     if len(measures) == 0 or "ned" in measures:
         print('Computing NED...')
-        ned = Ned(disc, config_file=kwargs['config_file'])
-        ned.compute_ned()
+        ned = Ned(disc, config=config)
+        compute('ned', ned, ned.compute_ned)
         scores['ned'] = ned.ned
     
     scores['n_clus'] = len(disc.clusters)
@@ -83,7 +128,76 @@ def compute_scores(gold, disc, measures=[], **kwargs):
     return scores
 
 
-def try_compute_scores(gold, disc, measures=[], **kwargs):
+def compute_statistics(gold, disc, measures=[], shard=0, n_shards=1,
+                       context=None, **kwargs):
+    """ Compute the statistics of the measures on one shard of the corpus.
+
+        The files, the clusters (for NED and Grouping) and the types (for
+        the gold pairs of Grouping) are split in n_shards shards by hash
+        (see `in_shard`), so that the shards can be computed by different
+        processes or machines. The statistics of all the shards merged by
+        `merge_statistics` are the statistics of the whole corpus, from
+        which `compute_scores` computes the scores.
+
+        Output
+        :return: a dict that gives the Statistics of each measure
+    """
+    if len(measures) == 0:
+        measures = ['boundary', 'grouping', 'token/type',
+                    'coverage', 'coverageNS', 'coverageT', 'ned']
+    if context is None:
+        context = EvaluationContext(gold, disc)
+    config = load_config(kwargs.get('config'), kwargs.get('config_file'),
+                         default=getattr(gold, 'config', None))
+
+    fnames = set(gold.words).union(
+        fname for fname, _, _, _, _ in disc.intervals)
+    if getattr(gold, 'vad', None) is not None:
+        fnames.update(gold.vad)
+    fnames = {fname for fname in fnames if in_shard(fname, shard, n_shards)}
+    class_numbers = {class_nb for class_nb in disc.clusters
+                     if in_shard(class_nb, shard, n_shards)}
+
+    statistics = dict()
+    if "boundary" in measures:
+        boundary = Boundary(gold, disc, config=config, context=context)
+        statistics['boundary'] = boundary.partial_statistics(fnames)
+
+    if "grouping" in measures:
+        grouping = Grouping(disc, njobs=kwargs.get('njobs', 1),
+                            context=context)
+        types = {ngram for ngram in context.type_groups[1]
+                 if in_shard(ngram, shard, n_shards)}
+        statistics['grouping'] = grouping.partial_statistics(
+            class_numbers, types)
+
+    if "token/type" in measures:
+        token_type = TokenType(gold, disc, context=context)
+        statistics['token/type'] = token_type.partial_statistics(fnames)
+
+    if "coverage" in measures:
+        coverage = Coverage(gold, disc, context=context)
+        statistics['coverage'] = coverage.partial_statistics(fnames)
+
+    if "coverageNS" in measures:
+        coverageNS = Coverage_NoSingleton(gold, disc, config=config,
+                                          context=context)
+        statistics['coverageNS'] = coverageNS.partial_statistics(fnames)
+
+    if "coverageT" in measures:
+        coverageT = TimeCoverage(gold, disc, config=config, context=context)
+        statistics['coverageT'] = coverageT.partial_statistics(fnames)
+
+    if "ned" in measures:
+        ned = Ned(disc, config=config)
+        statistics['ned'] = ned.partial_statistics(
+            (class_nb, disc.clusters[class_nb]) for class_nb in disc.clusters
+            if class_nb in class_numbers)
+
+    return statistics
+
+
+def try_compute_scores(gold, disc, measures=[], context=None, **kwargs):
     
     # scores = dict()
     scores = {k:0.0 for k in cols}
@@ -92,16 +206,31 @@ def try_compute_scores(gold, disc, measures=[], **kwargs):
 
     if len(measures) == 0: 
         measures = ['boundary', 'grouping', 'token/type', 
-                    'coverage','coverageNS', 'ned']
-
-    for measure in measures:
-        try: 
-            tmp_score = compute_scores(gold, disc, measures=measure, **kwargs)
+                    'coverage','coverageNS', 'coverageT', 'ned']
+
+    # shared by all the measures
+    if context is None:
+        context = EvaluationContext(gold, disc)
+
+    # the measures are independent, with njobs > 1 they are computed
+    # concurrently on forked processes.
+    njobs = kwargs.get('njobs', 1)
+    profiler = kwargs.get('profiler') or Profiler(enabled=False)
+    if njobs > 1:
+        with profiler.stage('shared_context'):
+            share_context(context, measures)
+
+    results = fork_map(_try_measure, measures, njobs,
+                       shared=(gold, disc, context, kwargs),
+                       on_crash=_crashed_measure)
+
+    for measure, (tmp_score, trace, exc, stages) in zip(measures, results):
+        profiler.update(stages)
+        if trace is None:
             scores = {**scores, **tmp_score}
-
-        except Exception as exc:
+        else:
             print('WARNING: Computing {} scores failed ! '.format(measure))
-            print(traceback.format_exc())
+            print(trace)
             print(exc)
  
 
@@ -111,9 +240,178 @@ def try_compute_scores(gold, disc, measures=[], **kwargs):
             scores[k] = round(v*100,2) 
 
     return scores
-    
 
 
+def sweep_scores(gold, discs, measures=[], **kwargs):
+    """ Compute the scores of the same discovered intervals transcribed with
+        several overlap thresholds (see `Disc.sweep`). The data derived from
+        the gold is computed once for all the thresholds.
+
+        Input
+        :param discs: the dict that gives the Disc of each threshold
+        Output
+        :return:      the dict that gives the scores of each threshold
+    """
+    context = None
+    all_scores = dict()
+    for ovth, disc in discs.items():
+        print('Computing scores with overlap threshold {}'.format(ovth))
+        if context is None:
+            context = EvaluationContext(gold, disc)
+        else:
+            context = context.with_disc(disc)
+        all_scores[ovth] = try_compute_scores(gold, disc, measures,
+                                              context=context, **kwargs)
+        all_scores[ovth]['overlap_th'] = ovth
+    return all_scores
+
+
+def share_context(context, measures):
+    """ Compute the context data used by several of the measures, before
+        the measures are computed concurrently on forked processes, so
+        that it is computed once and shared with them.
+    """
+    needed = Counter(name for measure in measures
+                     for name in context_data.get(measure, []))
+    for name, n_measures in needed.items():
+        if n_measures > 1:
+            try:
+                getattr(context, name)
+            except Exception:
+                # the measures that need it will fail and report it
+                pass
+
+
+def _try_measure(measure):
+    """ Compute the scores of a measure, in a worker process when measures
+        are computed concurrently. Return the scores, or the traceback and
+        the message of the exception if it failed, so that a failing
+        measure doesn't stop the others, and the stages recorded while
+        computing it when profiling.
+    """
+    gold, disc, context, kwargs = fork_shared()
+    # the stages recorded by a worker are sent back to the profiler of
+    # the main process
+    profiler = kwargs.get('profiler') or Profiler(enabled=False)
+    profiler = Profiler(profiler.enabled, profiler.cprofile_dir)
+    kwargs = dict(kwargs, profiler=profiler)
+    try:
+        return (compute_scores(gold, disc, measures=[measure],
+                               context=context, **kwargs),
+                None, None, profiler.to_dict())
+    except Exception as exc:
+        return None, traceback.format_exc(), str(exc), profiler.to_dict()
+
+
+def _crashed_measure(measure, exc):
+    """ The result of a measure whose worker died"""
+    return (None, 'the worker computing {} died'.format(measure), str(exc),
+            {})
+
+
+def load_gold(corpus, cache_dir=None, **kwargs):
+    """ Read the gold alignments of a corpus shipped in tdev2/share"""
+    # load the corpus alignments
+    wrd_path = pkg_resources.resource_filename(
+            pkg_resources.Requirement.parse('tdev2'),
+            'tdev2/share/{}.wrd'.format(corpus))
+    phn_path = pkg_resources.resource_filename(
+            pkg_resources.Requirement.parse('tdev2'),
+            'tdev2/share/{}.phn'.format(corpus))
+    # the VAD, used by the time coverage, if the corpus has one
+    vad_path = pkg_resources.resource_filename(
+            pkg_resources.Requirement.parse('tdev2'),
+            'tdev2/share/{}.vad'.format(corpus))
+    if not os.path.isfile(vad_path):
+        vad_path = None
+ 
+    print('Reading gold')
+    return Gold(vad_path=vad_path,
+                wrd_path=wrd_path, 
+                phn_path=phn_path,
+                cache_dir=cache_dir,
+                **kwargs)
+
+
+def evaluate_experiment(gold, exp_path, utd_sys, measures=[],
+                        write_class=False, overlap_ths=None, **kwargs):
+    """ Evaluate the output of a UTD system stored in exp_path.
+
+        The nodes and clusters output by the system are read directly by
+        Disc (see `Disc.from_nodes`). With write_class, they are also
+        written as a class file in the experiment directory.
+
+        The gold is narrowed to the files listed in exp_path/seq_names.txt,
+        without modifying it, so that the same loaded gold can be used for
+        several experiments. The discovered clusters are saved in
+        exp_path/clusters_tde.json.
+
+        Input
+        :param gold:     the loaded Gold
+        :param exp_path: the experiment directory
+        :param utd_sys:  the UTD system that produced it, 'zr17' or 'sdtw'
+        :param measures: the measures to compute, all if empty
+        :param overlap_ths: a list of overlap thresholds, to compute the
+                         scores with each of them (see `sweep_scores`)
+                         instead of with the one of the config file
+        :param profiler: optional keyword argument, a Profiler that records
+                         the time and memory taken by reading the
+                         discovered classes and by each measure
+        Output
+        :return:         the dict of scores, with the exp_path, or the dict
+                         of the scores of each threshold
+    """
+    profiler = kwargs.get('profiler') or Profiler(enabled=False)
+
+    # select only the included files from gold 
+    with profiler.stage('narrow_gold'):
+        gold = narrow_gold(gold, exp_path)
+
+    print('Reading discovered classes')
+    with profiler.stage('read_disc'):
+        if utd_sys == 'zr17':
+            nodes, dedups, disc_clsfile = zrexp2nodes(exp_path)
+        elif utd_sys == 'sdtw':
+            nodes, dedups, disc_clsfile = sdtw2nodes(exp_path)
+
+    if write_class:
+        print('Writing discovered -class- file')
+        write_disc_class_file(dedups, nodes, disc_clsfile)
+
+    if overlap_ths is not None:
+        with profiler.stage('transcribe_disc'):
+            discs = Disc.sweep(overlap_ths, gold, nodes=nodes, dedups=dedups,
+                               njobs=kwargs['njobs'],
+                               config=kwargs.get('config'),
+                               prune_silence=kwargs.get('prune_silence',
+                                                        False))
+        print('Computing scores..')
+        all_scores = sweep_scores(gold, discs, measures, **kwargs)
+        for ovth, scores in all_scores.items():
+            scores['exp_path'] = exp_path
+            with open(join(exp_path, 'clusters_tde_ovth{}.json'.format(ovth)),
+                      'w') as f:
+                json.dump(dict(discs[ovth].clusters), f)
+        return all_scores
+
+    with profiler.stage('transcribe_disc'):
+        disc = Disc.from_nodes(nodes, dedups, gold, njobs=kwargs['njobs'],
+                               config=kwargs.get('config'),
+                               prune_silence=kwargs.get('prune_silence',
+                                                        False))
+
+    print('Computing scores..')
+    scores = try_compute_scores(gold, disc, measures, **kwargs)
+
+    # for k,v in scores.items(): print('{}:\t{:.4f}'.format(k,v))
+    scores['exp_path'] = exp_path
+
+    # save clusters info
+    with open(join(exp_path, 'clusters_tde.json'),'w') as f:
+        json.dump(dict(disc.clusters), f)
+
+    return scores
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -149,6 +447,7 @@ def main():
                         default=[],
                         choices=['boundary', 'grouping', 
                                  'token/type', 'coverage','coverageNS',
+                                 'coverageT',
                                  'ned'])
 
     parser.add_argument('UTDsys', type=str, choices=['zr17','sdtw'],
@@ -160,56 +459,72 @@ def main():
     parser.add_argument('--njobs', '-n',
                         default=1,
                         type=int,
-                        help="number of cpus to be used in grouping")   
+                        help="number of cpus to be used to read the discovered"
+                             " classes, to compute the measures concurrently"
+                             " and in grouping")   
 
     parser.add_argument('--config_file', '-cnf',
                         default='../../../config.json',
                         type=str,
                         help="path to .json file from which get the configuration")   
 
-    args = parser.parse_args()
-
-    kwargs = {'njobs': args.njobs, 'config_file': args.config_file}
-    # load the corpus alignments
-    wrd_path = pkg_resources.resource_filename(
-            pkg_resources.Requirement.parse('tdev2'),
-            'tdev2/share/{}.wrd'.format(args.corpus))
-    phn_path = pkg_resources.resource_filename(
-            pkg_resources.Requirement.parse('tdev2'),
-            'tdev2/share/{}.phn'.format(args.corpus))
- 
-    print('Reading gold')
-    gold = Gold(wrd_path=wrd_path, 
-                phn_path=phn_path,
-                **kwargs)
-
-    # select only the included files from gold 
-    gold = narrow_gold(gold, args.exp_path)
-
+    parser.add_argument('--cache_dir', '-c',
+                        default=None,
+                        type=str,
+                        help="directory in which to cache the parsed gold"
+                             " alignments, to speed up the next runs")
+
+    parser.add_argument('--write_class', '-w',
+                        action='store_true',
+                        help="also write the discovered clusters as a class"
+                             " file in the experiment directory")
+
+    parser.add_argument('--overlap_th', '-t',
+                        nargs='+',
+                        default=None,
+                        type=float,
+                        help="compute the scores with each of these overlap"
+                             " thresholds, in one pass, instead of with the"
+                             " one of the config file. The output gives the"
+                             " scores of each threshold")
+
+    parser.add_argument('--prune_silence',
+                        action='store_true',
+                        help="throw away the discovered intervals entirely"
+                             " outside of the speech of the VAD of the"
+                             " corpus, before transcribing them")
+
+    parser.add_argument('--profile', '-p',
+                        action='store_true',
+                        help="record the wall time, CPU time and peak memory"
+                             " of each stage of the evaluation, and write"
+                             " them in the output under 'profile'")
+
+    parser.add_argument('--cprofile_dir',
+                        default=None,
+                        type=str,
+                        help="with --profile, also dump the cProfile"
+                             " statistics of each stage in this directory")
 
-    print('Generating discovered -class- file')
-    if args.UTDsys == 'zr17':
-        disc_clsfile = zrexp2tde(args.exp_path)
-    elif args.UTDsys == 'sdtw':
-        disc_clsfile = sdtw2tde(args.exp_path)
+    args = parser.parse_args()
 
-    print('Reading discovered classes')
-    disc = Disc(disc_clsfile, gold) 
+    # the configuration is read once, and passed to the gold, the
+    # discovered intervals and the measures
+    profiler = Profiler(args.profile, args.cprofile_dir)
+    kwargs = {'njobs': args.njobs, 'config': Config.read(args.config_file),
+              'prune_silence': args.prune_silence, 'profiler': profiler}
+    with profiler.stage('read_gold'):
+        gold = load_gold(args.corpus, args.cache_dir, **kwargs)
 
     output = args.output
+    scores = evaluate_experiment(gold, args.exp_path, args.UTDsys,
+                                 args.measures, args.write_class,
+                                 overlap_ths=args.overlap_th, **kwargs)
+    if args.profile:
+        scores['profile'] = profiler.to_dict()
 
-    print('Computing scores..')
-    scores = try_compute_scores(gold, disc, args.measures, **kwargs)
-
-    # for k,v in scores.items(): print('{}:\t{:.4f}'.format(k,v))
-    scores['exp_path'] = args.exp_path
-
-    with open(args.output, 'w') as file:
+    with open(output, 'w') as file:
         json.dump(scores, file)
-    
-    # save clusters info
-    with open(join(args.exp_path, 'clusters_tde.json'),'w') as f:
-        json.dump(disc.clusters, f)
 
 if __name__ == "__main__": 
     main()
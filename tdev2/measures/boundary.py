@@ -1,46 +1,49 @@
 import numpy as np
+
+from tdev2.config import load_config
+
 from .measures import Measure
+from .context import EvaluationContext
+from .statistics import Statistics
+
+
+def match_times(times, reference, tolerance=0.):
+    """ Return the boolean array which is True for the times that are at
+        most tolerance away from a time of reference, a sorted array. With
+        the default tolerance, the times must be in reference.
+    """
+    times = np.asarray(times, dtype=float)
+    if len(reference) == 0:
+        return np.zeros(len(times), dtype=bool)
+    # the first time of reference after the beginning of the window
+    ix = np.searchsorted(reference, times - tolerance)
+    found = ix < len(reference)
+    return found & (reference[np.minimum(ix, len(reference) - 1)]
+                    <= times + tolerance)
 
 
 class Boundary(Measure):
-    def __init__(self, gold, disc, output_folder=None):
+    def __init__(self, gold, disc, output_folder=None, context=None,
+                 config_file=None, config=None):
         self.metric_name = "boundary"
         self.output_folder = output_folder
+        if context is None:
+            context = EvaluationContext(gold, disc)
 
-        # get gold as interval trees
-        self.gold_boundaries_up = gold.boundaries[0]
-        self.gold_boundaries_down = gold.boundaries[1]
-        self.gold_wrd = gold.words
-        assert type(self.gold_wrd) == dict, (
-            "gold_phn should be a dict "
-            "of intervaltree objects but is {} ".format(type(self.gold_wrd)))
-
-        # get all discovered boundaries
-        bounds_down = [(fname, ngram[0][0])
-                       for fname, _, _, ngram, _ in disc.intervals
-                       if len(ngram) > 0]
-        bounds_up = [(fname, ngram[-1][1])
-                     for fname, _, _, ngram, _ in disc.intervals
-                     if len(ngram) > 0]
-        self.disc_down = set(bounds_down)
-        self.disc_up = set(bounds_up)
+        # config params, those of the gold by default
+        config = load_config(config, config_file,
+                             default=getattr(gold, 'config', None))
+        self.tolerance = config.boundary_tolerance
+
+        # gold and discovered boundaries, as sorted arrays per file
+        self.gold_boundaries = context.gold_boundaries
+        self.disc_boundaries = context.disc_boundaries
 
         # measures
-        self.boundaries = dict()
-        self.boundaries_seen = set()
-        self.n_correct_disc_boundary = 0
-
-        # if boundary is discovered as up and down, only count it once
-        self.n_all_disc_boundary = len(self.disc_up.difference(
-            self.disc_up.intersection(self.disc_down))) + len(self.disc_down)
-        self.n_gold_boundary = 0
         self.n_discovered_boundary = 0
-        for fname in self.gold_boundaries_up:
-            self.n_gold_boundary += len(
-               self.gold_boundaries_up[fname].difference(
-                self.gold_boundaries_up[fname].intersection(
-                 self.gold_boundaries_down[fname])))
-            self.n_gold_boundary += len(self.gold_boundaries_down[fname])
+        self.n_matched_gold_boundary = 0
+        self.n_all_disc_boundary = 0
+        self.n_gold_boundary = context.n_gold_boundaries
 
     @property
     def precision(self):
@@ -60,46 +63,79 @@ class Boundary(Measure):
         if self.n_gold_boundary == 0:
             boundary_rec = np.nan
         else:
-            boundary_rec = self.n_discovered_boundary / self.n_gold_boundary
+            boundary_rec = self.n_matched_gold_boundary / self.n_gold_boundary
 
         return boundary_rec
 
-    def compute_boundary(self):
-        """ Create intervaltree containing only boundary phones.
-            Here we discriminate upward and downward boundaries,
+    def partial_statistics(self, fnames=None):
+        """ Count the discovered boundaries that are gold boundaries, all the
+            discovered boundaries and all the gold boundaries. Here we
+            discriminate upward and downward boundaries,
             because if a word is followed by a silence, the upward
             boundary should be counted if discovered as upward, but not
-            if discovered as downward.
+            if discovered as downward. A boundary discovered (or in the
+            gold) as upward and downward is only counted once.
+
+            The boundaries of each file are matched at once on their sorted
+            arrays (see `match_times`). With a tolerance, a discovered
+            boundary is found if a gold boundary is at most tolerance away
+            from it, and the precision counts the discovered boundaries
+            found while the recall counts the gold boundaries found, as
+            several discovered boundaries can be close to the same gold
+            boundary. Without tolerance, both counts are the same.
 
             Input
-            :param disc_down:  a list of all the downward boundaries of
-                               discovered segments
-            :param disc_up:    a list of all the upward boundaries of
-                               discovered segments
-            :gold_boundaries_down: a set of all the downward gold boundaries
-            :gold_boundaries_up:   a set of all the upward gold boundaries
+            :param fnames:     the set of the files to count the boundaries
+                               of, all the files if None
+            Output
+            :return:           the Statistics of the boundaries of fnames
         """
-        # downward boundaries
-        for fname, disc_time in self.disc_down:
-            if fname not in self.gold_boundaries_down:
-                raise ValueError('{}: file not found in gold'.format(fname))
-
-            if (
-                    disc_time in self.gold_boundaries_down[fname]
-                    and not (fname, disc_time) in self.boundaries_seen
-            ):
-
-                self.n_discovered_boundary += 1
-                self.boundaries_seen.add((fname, disc_time))
-
-        # upward boundaries
-        for fname, disc_time in self.disc_up:
-            if fname not in self.gold_boundaries_up:
+        n_discovered_boundary = 0
+        n_matched_gold_boundary = 0
+        n_all_disc_boundary = 0
+        for fname, (disc_down, disc_up) in self.disc_boundaries.items():
+            if fnames is not None and fname not in fnames:
+                continue
+            if fname not in self.gold_boundaries:
                 raise ValueError('{}: file not found in gold'.format(fname))
+            gold_down, gold_up = self.gold_boundaries[fname]
+
+            n_found = len(np.union1d(
+                disc_down[match_times(disc_down, gold_down, self.tolerance)],
+                disc_up[match_times(disc_up, gold_up, self.tolerance)]))
+            n_discovered_boundary += n_found
+            if self.tolerance == 0:
+                # the boundaries found are the same in the gold
+                n_matched_gold_boundary += n_found
+            else:
+                n_matched_gold_boundary += len(np.union1d(
+                    gold_down[match_times(gold_down, disc_down,
+                                          self.tolerance)],
+                    gold_up[match_times(gold_up, disc_up, self.tolerance)]))
+            n_all_disc_boundary += len(np.union1d(disc_down, disc_up))
+
+        if fnames is None:
+            n_gold_boundary = self.n_gold_boundary
+        else:
+            n_gold_boundary = sum(
+                len(np.union1d(*self.gold_boundaries[fname]))
+                for fname in fnames if fname in self.gold_boundaries)
+
+        return Statistics(self.metric_name, counts={
+            'n_discovered_boundary': n_discovered_boundary,
+            'n_matched_gold_boundary': n_matched_gold_boundary,
+            'n_all_disc_boundary': n_all_disc_boundary,
+            'n_gold_boundary': n_gold_boundary})
+
+    def load_statistics(self, stats):
+        """ Set the counts from which the scores are computed"""
+        self.n_discovered_boundary = stats.counts['n_discovered_boundary']
+        self.n_matched_gold_boundary = stats.counts['n_matched_gold_boundary']
+        self.n_all_disc_boundary = stats.counts['n_all_disc_boundary']
+        self.n_gold_boundary = stats.counts['n_gold_boundary']
 
-            if (
-                    disc_time in self.gold_boundaries_up[fname]
-                    and not (fname, disc_time) in self.boundaries_seen
-            ):
-                self.n_discovered_boundary += 1
-                self.boundaries_seen.add((fname, disc_time))
+    def compute_boundary(self):
+        """ Count the discovered boundaries that are gold boundaries in all
+            the files (see `partial_statistics`)
+        """
+        self.load_statistics(self.partial_statistics())
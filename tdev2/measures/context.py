@@ -0,0 +1,227 @@
+"""Implement class EvaluationContext.
+   An EvaluationContext is built once from the gold and the discovered
+   elements, and computes lazily the data derived from them that several
+   measures need (gold phone and word counts, gold alignments as
+   Alignments, discovered boundaries, intervals grouped by type...).
+   Each derived structure is computed the first time a measure asks for
+   it and then shared by all the measures evaluated with the same context.
+"""
+from collections import defaultdict, Counter
+
+import numpy as np
+
+from tdev2.readers.alignment import Alignment
+from tdev2.readers.symbols import SymbolTable
+from tdev2.readers.interval_table import IntervalTable
+
+
+def as_alignments(gold):
+    """ Convert a dict of interval trees (or of lists of intervals) to
+        a dict of Alignments sharing the same symbols, sorted so that
+        the codes are in the same order as the symbols. A dict of
+        Alignments is returned as is.
+    """
+    if all(isinstance(ali, Alignment) for ali in gold.values()):
+        return gold
+    symbols = sorted({symbol for fname in gold
+                      for _, _, symbol in gold[fname]})
+    symbol2ix = {symbol: ix for ix, symbol in enumerate(symbols)}
+    return {fname: Alignment.from_tuples(
+                [tuple(interval) for interval in gold[fname]],
+                symbol2ix, symbols)
+            for fname in gold}
+
+
+def phone_totals(alignments, n_symbols):
+    """ Return the number of tokens and the total duration of the tokens of
+        each symbol of the alignments, as two arrays of length n_symbols
+        indexed by the codes of the symbols
+    """
+    alignments = [ali for ali in alignments if len(ali) > 0]
+    if len(alignments) == 0:
+        return np.zeros(n_symbols, dtype=np.int64), np.zeros(n_symbols)
+    codes = np.concatenate([ali.codes for ali in alignments])
+    durations = np.concatenate([ali.offsets - ali.onsets
+                                for ali in alignments])
+    return (np.bincount(codes, minlength=n_symbols),
+            np.bincount(codes, weights=durations, minlength=n_symbols))
+
+
+def group_boundaries(fnames, file_ix, downs, ups):
+    """ Group the boundaries by file.
+
+        Input
+        :param fnames:  SymbolTable of the file names
+        :param file_ix: array of the code of the file of each boundary
+        :param downs:   array of the downward boundaries
+        :param ups:     array of the upward boundaries
+        Output
+        :return:        a dict that gives the sorted arrays of the distinct
+                        downward and upward boundaries of each file
+    """
+    # the boundaries of the file of code f are order[ptr[f]:ptr[f + 1]],
+    # and are sorted file by file, which is faster than sorting them all
+    file_ix = np.asarray(file_ix, dtype=np.int32)
+    order = np.argsort(file_ix, kind='stable')
+    ptr = np.searchsorted(file_ix[order], np.arange(len(fnames) + 1))
+    downs = np.asarray(downs, dtype=float)[order]
+    ups = np.asarray(ups, dtype=float)[order]
+    return {fnames[f]: (np.unique(downs[ptr[f]:ptr[f + 1]]),
+                        np.unique(ups[ptr[f]:ptr[f + 1]]))
+            for f in range(len(fnames)) if ptr[f + 1] > ptr[f]}
+
+
+class EvaluationContext():
+    # the data that only depends on the gold
+    gold_data = ['phone_counts', 'phone_durations', 'phone_totals',
+                 'word_counts', 'words', 'phones', 'phone_symbols',
+                 'gold_boundaries', 'n_gold_boundaries']
+
+    def __init__(self, gold, disc):
+        """Data shared by the measures evaluated on gold and disc.
+
+        :param gold: the Gold, can be None for measures that only use
+                     the discovered elements
+        :param disc: the Disc
+        """
+        self.gold = gold
+        self.disc = disc
+        self._cache = dict()
+
+    def with_disc(self, disc):
+        """ Return a context for the same gold and another disc (e.g. the
+            same discovered intervals transcribed with another overlap
+            threshold), that shares the data derived from the gold only
+        """
+        context = EvaluationContext(self.gold, disc)
+        for name in self.gold_data:
+            if name in self._cache:
+                context._cache[name] = self._cache[name]
+        return context
+
+    def cached(self, name, compute):
+        """ Return the derived data called name, computing it with compute
+            the first time it is asked
+        """
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def phone_counts(self):
+        """ Counter of the number of tokens of each gold phone"""
+        return self.cached('phone_counts', lambda: Counter(
+            phn for fname in self.gold.phones
+            for on, off, phn in self.gold.phones[fname]))
+
+    @property
+    def phone_durations(self):
+        """ Dict of the total duration of the tokens of each gold phone"""
+        def compute():
+            durations = defaultdict(float)
+            for fname in self.gold.phones:
+                for on, off, phn in self.gold.phones[fname]:
+                    durations[phn] += off - on
+            return dict(durations)
+        return self.cached('phone_durations', compute)
+
+    @property
+    def phone_totals(self):
+        """ The number of tokens and the total duration of the tokens of
+            each gold phone, as two arrays indexed by the phone codes of
+            phone_symbols
+        """
+        return self.cached('phone_totals', lambda: phone_totals(
+            self.phones.values(), len(self.phone_symbols)))
+
+    @property
+    def word_counts(self):
+        """ Counter of the number of tokens of each gold word"""
+        return self.cached('word_counts', lambda: Counter(
+            wrd for fname in self.gold.words
+            for on, off, wrd in self.gold.words[fname]))
+
+    @property
+    def words(self):
+        """ The gold words as a dict of Alignments"""
+        return self.cached('words', lambda: as_alignments(self.gold.words))
+
+    @property
+    def phones(self):
+        """ The gold phones as a dict of Alignments"""
+        return self.cached('phones', lambda: as_alignments(self.gold.phones))
+
+    @property
+    def phone_symbols(self):
+        """ The SymbolTable of the codes of the phones Alignments"""
+        def compute():
+            for ali in self.phones.values():
+                return SymbolTable(ali.symbols)
+            return SymbolTable()
+        return self.cached('phone_symbols', compute)
+
+    @property
+    def disc_boundaries(self):
+        """ Dict that gives the sorted arrays of the distinct downward and
+            upward boundaries of the discovered intervals of each file,
+            i.e. the onsets of their first phone and the offsets of their
+            last phone
+        """
+        def compute():
+            if isinstance(self.disc.intervals, IntervalTable):
+                return group_boundaries(self.disc.intervals.fnames,
+                                        *self.disc.intervals.boundaries())
+            fnames = SymbolTable()
+            file_ix, downs, ups = [], [], []
+            for fname, _, _, token_ngram, _ in self.disc.intervals:
+                if len(token_ngram) > 0:
+                    file_ix.append(fnames.intern(fname))
+                    downs.append(token_ngram[0][0])
+                    ups.append(token_ngram[-1][1])
+            return group_boundaries(fnames, file_ix, downs, ups)
+        return self.cached('disc_boundaries', compute)
+
+    @property
+    def gold_boundaries(self):
+        """ Dict that gives the sorted arrays of the downward and upward
+            gold boundaries of each file
+        """
+        def compute():
+            boundaries_up, boundaries_down = self.gold.boundaries
+            return {fname: (np.array(sorted(boundaries_down[fname]),
+                                     dtype=float),
+                            np.array(sorted(boundaries_up[fname]),
+                                     dtype=float))
+                    for fname in boundaries_up}
+        return self.cached('gold_boundaries', compute)
+
+    @property
+    def n_gold_boundaries(self):
+        """ The number of gold boundaries, a boundary that is both upward
+            and downward being counted once
+        """
+        return self.cached('n_gold_boundaries', lambda: sum(
+            len(np.union1d(downs, ups))
+            for downs, ups in self.gold_boundaries.values()))
+
+    @property
+    def type_groups(self):
+        """ The distinct discovered intervals grouped by type, with their
+            tokens (token_ngram) and types (ngram) interned as integers.
+
+            Output
+            :return: tokens, types, two SymbolTables, and a dict that gives
+                     for each type code the set of its intervals, encoded
+                     as (filename, onset, offset, token code, type code)
+        """
+        def compute():
+            tokens = SymbolTable()
+            types = SymbolTable()
+            same = defaultdict(set)
+            for fname, disc_on, disc_off, token_ngram, ngram \
+                    in self.disc.intervals:
+                ngram_ix = types.intern(ngram)
+                same[ngram_ix].add((fname, disc_on, disc_off,
+                                    tokens.intern(token_ngram), ngram_ix))
+            return tokens, types, same
+        return self.cached('type_groups', compute)
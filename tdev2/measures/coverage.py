@@ -1,22 +1,30 @@
 import os
+import math
 import numpy as np
+from collections import Counter
+
+from tdev2.config import load_config
+from tdev2.readers.symbols import SymbolTable
+from tdev2.readers.interval_table import IntervalTable
+from tdev2.utils import interval_union, covered_time
 
 from .measures import Measure
+from .context import EvaluationContext, phone_totals
+from .statistics import Statistics
 
 
 class Coverage(Measure):
-    def __init__(self, gold, disc, output_folder=None):
+    def __init__(self, gold, disc, output_folder=None, context=None):
         self.metric_name = "coverage"
         self.output_folder = output_folder
+        if context is None:
+            context = EvaluationContext(gold, disc)
 
         # self.all_intervals = set()
-        self.n_phones = 0
-
-        for fname in gold.phones:
-            # TODO remove SIL here ?
-            self.n_phones += len([
-                ph for on, off, ph in gold.phones[fname]
-                if (ph != "SIL" and ph != "SPN")])
+        # TODO remove SIL here ?
+        self.n_phones = sum(
+            count for ph, count in context.phone_counts.items()
+            if (ph != "SIL" and ph != "SPN"))
 
         self.covered_phn = set(
             (fname, phn_on, phn_off, phn)
@@ -25,8 +33,35 @@ class Coverage(Measure):
             for phn_on, phn_off, phn in token_ngram
             if (phn != "SIL" and phn != "SPN"))
 
+        self.gold_phn = gold.phones
+        self.n_covered = len(self.covered_phn)
         self.coverage = 0
 
+    def partial_statistics(self, fnames=None):
+        """ Count the covered phones and all the phones of the files of
+            fnames, all the files if None
+        """
+        if fnames is None:
+            return Statistics(self.metric_name, counts={
+                'n_covered': len(self.covered_phn),
+                'n_phones': self.n_phones})
+
+        n_covered = sum(1 for fname, _, _, _ in self.covered_phn
+                        if fname in fnames)
+        n_phones = sum(1 for fname in fnames if fname in self.gold_phn
+                       for _, _, phn in self.gold_phn[fname]
+                       if (phn != "SIL" and phn != "SPN"))
+        return Statistics(self.metric_name, counts={
+            'n_covered': n_covered, 'n_phones': n_phones})
+
+    def load_statistics(self, stats):
+        """ Set the counts from which the coverage is computed, and
+            compute it
+        """
+        self.n_covered = stats.counts['n_covered']
+        self.n_phones = stats.counts['n_phones']
+        self.coverage = self.n_covered / self.n_phones
+
     def compute_coverage(self):
         """ For coverage, simply compute the ratio of discovered phones over all phone
 
@@ -37,7 +72,7 @@ class Coverage(Measure):
             :param coverage:     the ratio of number of covered phones over
                                  the overall number of phones in the corpus
         """
-        self.coverage = len(self.covered_phn) / self.n_phones
+        self.load_statistics(self.partial_statistics())
 
     def write_score(self):
         if not self.coverage:
@@ -49,55 +84,166 @@ class Coverage(Measure):
 
 
 
-# from tdev2 import config
-#excluded_units = ['SIL','__ON__','__OFF__','__EMOTION__','SPN']
+def _as_counter(symbols, values, counts=None):
+    """ Return the Counter of the values of the symbols, indexed by their
+        codes, that occur (whose counts are not 0, the values themselves
+        if counts is None)
+    """
+    if counts is None:
+        counts = values
+    return Counter({symbols[code]: value.item() for code, value
+                    in zip(np.flatnonzero(counts), values[counts > 0])})
+
 
-from tdev2.utils import read_config
 
 class Coverage_NoSingleton(Measure):
-    def __init__(self, gold, disc, output_folder=None, config_file=None):
+    def __init__(self, gold, disc, output_folder=None, config_file=None,
+                 context=None, config=None):
         self.metric_name = "coverage_nosingleton"
         self.output_folder = output_folder
         self.config_file = config_file
+        if context is None:
+            context = EvaluationContext(gold, disc)
         
-        # read config params
-        conf = read_config(config_file)
-        excluded_units = conf['excluded_units']
-        discoverable_th = conf['discoverable_th']
-
-        phones = []
-        for fname in gold.phones:
-            phones.extend([
-                ph for on, off, ph in gold.phones[fname]
-                if (ph not in excluded_units)])
-            
-        unique, counts = np.unique(phones, return_counts=True)
-        discoverable_units = unique[counts>discoverable_th] # unique set of labels
-        n_discoverable = np.sum(counts[counts>discoverable_th]) # total number of their occurences
-
-        self.covered_phn = set(
-            (fname, phn_on, phn_off, phn)
-            for fname, disc_on, disc_off, token_ngram, ngram
-            in disc.intervals
-            for phn_on, phn_off, phn in token_ngram
-            if ((phn not in excluded_units) and (phn in discoverable_units)))
+        # config params, those of the gold by default
+        config = load_config(config, config_file,
+                             default=getattr(gold, 'config', None))
+        self.excluded_units = config.excluded_units
+        self.discoverable_th = config.discoverable_th
+        self.disc = disc.intervals
 
-        self.n_phones = n_discoverable
+        # the gold phones as Alignments, and the number of tokens and the
+        # duration of each phone, indexed by the phone codes
+        self.phones = context.phones
+        self.phone_symbols = context.phone_symbols
+        self.phone_totals = context.phone_totals
+        self._covered = None
 
-        # compute in terms of #frames, instead of #units
+        self.n_phones = 0
+        self.n_covered = 0
         self.total_covered = 0
-        for (fname,phn_on, phn_off, phn) in self.covered_phn:
-            self.total_covered += phn_off - phn_on
-        
         self.total_discoverable = 0
-        for fname in gold.phones:
-            for on, off, phn in gold.phones[fname]: 
-                if ((len(phn )>0) and (phn not in excluded_units) and (phn in discoverable_units)):
-                    self.total_discoverable += (off-on) 
-
         self.coverage = 0
         self.coverage_frames = 0
 
+    def covered_phones(self):
+        """ Find the distinct phones, not excluded, of the transcriptions
+            of the discovered intervals.
+
+            The phones are encoded with the codes of the gold phones, the
+            phones that are not in the gold getting the next codes.
+
+            Output
+            :return: fnames, a SymbolTable of the file names, units, a
+                     SymbolTable of the phones, and the arrays of the file
+                     code, the duration and the phone code of each covered
+                     phone
+        """
+        if self._covered is not None:
+            return self._covered
+
+        if isinstance(self.disc, IntervalTable):
+            fnames = self.disc.fnames
+            if self.disc.transcribed:
+                phone_ix, lengths = self.disc.phone_ix()
+                file_ix = np.repeat(self.disc.file_ix, lengths)
+                phn_on, phn_off, phn_codes, symbols = self.disc.phones
+                onsets = phn_on[phone_ix]
+                offsets = phn_off[phone_ix]
+                codes = phn_codes[phone_ix]
+            else:
+                symbols = []
+                file_ix = codes = np.zeros(0, dtype=np.int64)
+                onsets = offsets = np.zeros(0)
+        else:
+            # intervals given as tuples
+            fnames, symbols = SymbolTable(), SymbolTable()
+            covered = [(fnames.intern(fname), phn_on, phn_off,
+                        symbols.intern(phn))
+                       for fname, _, _, token_ngram, _ in self.disc
+                       for phn_on, phn_off, phn in token_ngram]
+            file_ix = np.array([f for f, _, _, _ in covered], dtype=np.int64)
+            onsets = np.array([on for _, on, _, _ in covered], dtype=float)
+            offsets = np.array([off for _, _, off, _ in covered],
+                               dtype=float)
+            codes = np.array([c for _, _, _, c in covered], dtype=np.int64)
+
+        # encode the phones of the transcriptions with the gold codes
+        units = SymbolTable(self.phone_symbols)
+        to_unit = np.array([units.intern(phn) for phn in symbols],
+                           dtype=np.int64)
+        excluded = np.array([phn in self.excluded_units for phn in symbols],
+                            dtype=bool)
+        keep = ~excluded[codes]
+        file_ix, onsets, offsets = file_ix[keep], onsets[keep], offsets[keep]
+        codes = to_unit[codes[keep]]
+
+        # keep each (file, onset, offset, phone) once
+        order = np.lexsort((codes, offsets, onsets, file_ix))
+        file_ix, onsets, offsets, codes = (
+            file_ix[order], onsets[order], offsets[order], codes[order])
+        distinct = np.ones(len(codes), dtype=bool)
+        distinct[1:] = ((file_ix[1:] != file_ix[:-1])
+                        | (onsets[1:] != onsets[:-1])
+                        | (offsets[1:] != offsets[:-1])
+                        | (codes[1:] != codes[:-1]))
+
+        self._covered = (fnames, units, file_ix[distinct],
+                         offsets[distinct] - onsets[distinct],
+                         codes[distinct])
+        return self._covered
+
+    def partial_statistics(self, fnames=None):
+        """ Count the tokens and the total duration of each phone, and of
+            its covered tokens, in the files of fnames (all the files if
+            None). The discoverable units are only known once all the files
+            are counted, so the counts are kept for all the phones that are
+            not excluded.
+        """
+        file_table, units, file_ix, durations, codes = self.covered_phones()
+        if fnames is None:
+            phone_counts, phone_durations = self.phone_totals
+        else:
+            phone_counts, phone_durations = phone_totals(
+                [self.phones[fname] for fname in fnames
+                 if fname in self.phones], len(self.phone_symbols))
+            in_files = np.isin(file_ix, [file_table.index(fname)
+                                         for fname in fnames
+                                         if fname in file_table])
+            durations, codes = durations[in_files], codes[in_files]
+        covered_counts = np.bincount(codes, minlength=len(units))
+        covered_durations = np.bincount(codes, weights=durations,
+                                        minlength=len(units))
+
+        return Statistics(self.metric_name, counters={
+            'phone_counts': _as_counter(self.phone_symbols, phone_counts),
+            'phone_durations': _as_counter(
+                self.phone_symbols, phone_durations, phone_counts),
+            'covered_counts': _as_counter(units, covered_counts),
+            'covered_durations': _as_counter(
+                units, covered_durations, covered_counts)})
+
+    def load_statistics(self, stats):
+        """ Set the counts from which the coverage is computed, once the
+            discoverable units are known, and compute it
+        """
+        phone_counts = stats.counters['phone_counts']
+        units = [ph for ph in phone_counts if ph not in self.excluded_units]
+        counts = np.array([phone_counts[ph] for ph in units], dtype=np.int64)
+        discoverable_units = [ph for ph, discoverable
+                              in zip(units, counts > self.discoverable_th)
+                              if discoverable]
+        covered_counts = stats.counters['covered_counts']
+        self.n_phones = int(counts[counts > self.discoverable_th].sum())
+        self.n_covered = sum(covered_counts[ph] for ph in discoverable_units)
+        self.total_covered = math.fsum(
+            stats.counters['covered_durations'][ph]
+            for ph in discoverable_units)
+        self.total_discoverable = math.fsum(
+            stats.counters['phone_durations'][ph] for ph in discoverable_units
+            if len(ph) > 0)
+        self.coverage = self.n_covered / self.n_phones
+        self.coverage_frames = self.total_covered / self.total_discoverable
 
     def compute_coverage(self):
         """ For coverage, simply compute the ratio of discovered units over all 'discoverable' units
@@ -109,8 +255,7 @@ class Coverage_NoSingleton(Measure):
             :param coverage:     the ratio of number of covered phones over
                                  the overall number of phones in the corpus
         """
-        self.coverage = len(self.covered_phn) / self.n_phones
-        self.coverage_frames = self.total_covered / self.total_discoverable
+        self.load_statistics(self.partial_statistics())
 
     def write_score(self):
         if not self.coverage:
@@ -122,3 +267,122 @@ class Coverage_NoSingleton(Measure):
 
 
 
+
+
+class TimeCoverage(Measure):
+    def __init__(self, gold, disc, output_folder=None, config_file=None,
+                 context=None, config=None):
+        """Fraction of the speech time covered by the discovered intervals.
+
+        The speech is given by the VAD of the gold, or if the gold has no
+        VAD, by the gold phones that are not excluded units (see
+        `tdev2.config`). Unlike `Coverage`, that counts the covered phone
+        tokens, the time covered is the same whatever the granularity of
+        the discovered intervals.
+        """
+        self.metric_name = "time_coverage"
+        self.output_folder = output_folder
+        if context is None:
+            context = EvaluationContext(gold, disc)
+
+        config = load_config(config, config_file,
+                             default=getattr(gold, 'config', None))
+        self.excluded_units = config.excluded_units
+        self.vad = getattr(gold, 'vad', None)
+        self.phones = context.phones
+        self.phone_symbols = context.phone_symbols
+        self.disc = disc.intervals
+        self._speech = None
+
+        self.covered_time = 0
+        self.speech_time = 0
+        self.coverage = 0
+
+    @property
+    def speech(self):
+        """ Dict of the onsets and offsets of the disjoint speech segments
+            of each file
+        """
+        if self._speech is None:
+            if self.vad is not None:
+                self._speech = self.vad
+            else:
+                excluded = np.array([phn in self.excluded_units
+                                     for phn in self.phone_symbols],
+                                    dtype=bool)
+                self._speech = dict()
+                for fname, ali in self.phones.items():
+                    keep = ~excluded[ali.codes]
+                    self._speech[fname] = interval_union(
+                        ali.onsets[keep], ali.offsets[keep])
+        return self._speech
+
+    def discovered_intervals(self):
+        """ Return the file names, and the arrays of the file code, onset
+            and offset of each discovered interval
+        """
+        if isinstance(self.disc, IntervalTable):
+            return (self.disc.fnames, self.disc.file_ix, self.disc.onsets,
+                    self.disc.offsets)
+        fnames = SymbolTable()
+        file_ix = np.array([fnames.intern(fname)
+                            for fname, _, _, _, _ in self.disc],
+                           dtype=np.int64)
+        onsets = np.array([on for _, on, _, _, _ in self.disc], dtype=float)
+        offsets = np.array([off for _, _, off, _, _ in self.disc],
+                           dtype=float)
+        return fnames, file_ix, onsets, offsets
+
+    def partial_statistics(self, fnames=None):
+        """ Sum the speech time, and the speech time covered by the union
+            of the discovered intervals, of the files of fnames (all the
+            files if None)
+        """
+        speech = self.speech
+        if fnames is None:
+            fnames = speech
+        disc_fnames, file_ix, onsets, offsets = self.discovered_intervals()
+
+        # the intervals of each file are in order[ptr[i]:ptr[i + 1]]
+        order = np.argsort(file_ix, kind='stable')
+        ptr = np.searchsorted(file_ix[order], np.arange(len(disc_fnames) + 1))
+
+        speech_time = 0.
+        covered = 0.
+        for fname in fnames:
+            if fname not in speech:
+                continue
+            speech_on, speech_off = speech[fname]
+            speech_time += float((speech_off - speech_on).sum())
+            ix = disc_fnames.index(fname)
+            if ix is None:
+                continue
+            file_intervals = order[ptr[ix]:ptr[ix + 1]]
+            union_on, union_off = interval_union(onsets[file_intervals],
+                                                 offsets[file_intervals])
+            covered += float(covered_time(speech_on, speech_off,
+                                          union_on, union_off).sum())
+        return Statistics(self.metric_name, counts={
+            'covered_time': covered, 'speech_time': speech_time})
+
+    def load_statistics(self, stats):
+        """ Set the times from which the coverage is computed, and compute
+            it
+        """
+        self.covered_time = stats.counts['covered_time']
+        self.speech_time = stats.counts['speech_time']
+        self.coverage = self.covered_time / self.speech_time
+
+    def compute_coverage(self):
+        """ Compute the ratio of the speech time covered by the union of the
+            discovered intervals over all the speech time
+        """
+        self.load_statistics(self.partial_statistics())
+
+    def write_score(self):
+        if not self.coverage:
+            raise AttributeError('Attempting to print scores but score'
+                                 ' is not yet computed!')
+        with open(os.path.join(self.output_folder, self.metric_name), 'w') as fout:
+            fout.write("metric: {}\n".format(self.metric_name))
+            fout.write("coverage: {}\n".format(self.coverage))
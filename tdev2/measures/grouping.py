@@ -1,23 +1,27 @@
+import math
 import numpy as np
 
-from joblib import Parallel, delayed
 from .measures import Measure
-from itertools import combinations
-from collections import defaultdict, Counter
-from tdev2.utils import overlap
+from .context import EvaluationContext
+from .statistics import Statistics
+from collections import Counter
+from tdev2.utils import balance, fork_map, fork_shared
 
 
 class Grouping(Measure):
-    def __init__(self, disc, output_folder=None, njobs=1):
+    def __init__(self, disc, output_folder=None, njobs=1, context=None):
         self.metric_name = "grouping"
         self.output_folder = output_folder
+        if context is None:
+            context = EvaluationContext(None, disc)
+        self.context = context
         self.clusters = disc.clusters
         self.intervals = disc.intervals
         self.njobs = njobs
-        self.found_pairs = set()
-        self.gold_pairs = set()
         self.found_types = set()
         self.gold_types = set()
+        # tokens (token_ngram) and types (ngram) are interned as integers
+        self.tokens, self.types, _ = context.type_groups
         print('Number of grouping jobs: {}'.format(njobs))
 
     @property
@@ -25,7 +29,7 @@ class Grouping(Measure):
         if len(self.found_types) == 0:
             prec = np.nan
         else:
-            prec = sum(self.found_weights[t] * self.found_gold_counter[t]
+            prec = math.fsum(self.found_weights[t] * self.found_gold_counter[t]
                        / self.found_counter[t] for t in self.found_types)
         return prec
 
@@ -34,79 +38,152 @@ class Grouping(Measure):
         if len(self.gold_types) == 0:
             rec = np.nan
         else:
-            rec = sum(self.gold_weights[t] * self.found_gold_counter[t]
+            rec = math.fsum(self.gold_weights[t] * self.found_gold_counter[t]
                       / self.gold_counter[t] for t in self.gold_types)
         return rec
 
-    def get_gold_pairs(self):
-        """ Get all the gold pairs that can be created using the
-            discovered intervals.
-            The pairs are ordered by filename and onset.
+    @staticmethod
+    def count_overlaps(segments, onsets, offsets):
+        """ For each interval, count the other intervals of the same segment
+            (i.e. the same file of the same group) that overlap it.
+
+            Instead of checking all the pairs, the intervals are sorted by
+            segment and time once: the intervals overlapping an interval are
+            those of its segment starting before its offset, minus those
+            ending before (or at) its onset.
+
+            Input
+            :param segments: array of the integer segment of each interval
+            :param onsets:   array of the onsets of the intervals
+            :param offsets:  array of the offsets of the intervals
+            Output
+            :return:         array of the number of overlapping intervals
+        """
+        starts_before = _count_before(segments, onsets, offsets, strict=True)
+        ends_before = _count_before(segments, offsets, onsets, strict=False)
+        # the interval overlaps itself
+        return starts_before - ends_before - 1
+
+    @staticmethod
+    def find_partners(groups, fnames, onsets, offsets):
+        """ For distinct intervals split in groups, check if each of them
+            can form a pair with another interval of its group, i.e. if
+            there's another interval that is not in the same file or that
+            doesn't overlap it. All the groups are processed at once.
 
             Input
+            :param groups:  array of the integer group of each interval
+            :param fnames:  list of the filename of each interval
+            :param onsets:  array of the onsets of the intervals
+            :param offsets: array of the offsets of the intervals
+            Output
+            :return:        array of booleans, True if the interval has at
+                            least one partner, and the number of pairs of
+                            each group that are not in the same file with
+                            an overlap
+        """
+        segment_ix = dict()
+        segments = np.array(
+            [segment_ix.setdefault(key, len(segment_ix))
+             for key in zip(groups.tolist(), fnames)], dtype=np.int64)
+        n_overlaps = Grouping.count_overlaps(segments, onsets, offsets)
+
+        sizes = np.bincount(groups)
+        partners = sizes[groups] - 1 - n_overlaps > 0
+        # each overlapping pair is counted by its two intervals
+        n_pairs = (sizes * (sizes - 1) // 2
+                   - np.bincount(groups, weights=n_overlaps,
+                                 minlength=len(sizes)).astype(np.int64) // 2)
+        return partners, n_pairs
+
+    @staticmethod
+    def has_partner(intervals):
+        """ For a list of distinct intervals, check if each of them can form
+            a pair with another one, i.e. if there's another interval that
+            is not in the same file or that doesn't overlap it.
+
+            Input
+            :param intervals: a list of distinct intervals, stored as
+                              (filename, onset, offset, token_ngram, ngram)
+            Output
+            :return:          a list of booleans, True if the interval
+                              has at least one partner
+        """
+        if len(intervals) == 0:
+            return []
+        partners, _ = Grouping.find_partners(
+            np.zeros(len(intervals), dtype=np.int64),
+            [interval[0] for interval in intervals],
+            np.array([interval[1] for interval in intervals], dtype=float),
+            np.array([interval[2] for interval in intervals], dtype=float))
+        return partners.tolist()
+
+    def encode(self, interval):
+        """ Return the interval with its token and type interned, as
+            (filename, onset, offset, token code, type code)
+        """
+        fname, disc_on, disc_off, token_ngram, ngram = interval
+        return (fname, disc_on, disc_off,
+                self.tokens.intern(token_ngram), self.types.intern(ngram))
+
+    def decode(self, counter):
+        """ Return a counter keyed by type codes as keyed by types """
+        return Counter({self.types[ix]: n for ix, n in counter.items()})
+
+    @staticmethod
+    def count_tokens(tokens):
+        """ Count the tokens of each type
+
+            Input
+            :param tokens:  a dict that for each token (i.e. token_ngram)
+                            gives its type (i.e. ngram)
+            Output
+            :return:        counter, a dict that for each type gives its
+                            number of tokens.
+        """
+        return Counter(tokens.values())
+
+    @staticmethod
+    def type_weights(counter):
+        """ For each type get its weight, computed as
+            number_of_tokens(ngram)/total_number_of_tokens
+        """
+        n_tokens = sum(counter.values())
+        return {ngram: counter[ngram]/n_tokens for ngram in counter}
+
+    def get_gold_counter(self, types=None):
+        """ Count the tokens of each type that are in the gold pairs that
+            can be created using the discovered intervals, without creating
+            the pairs: two intervals form a gold pair if they have the same
+            transcription and are not in the same file with an overlap, so
+            a token is in a gold pair if it has a partner among the
+            intervals of its type.
+
+            The types are independent, so they are split in chunks balanced
+            by number of intervals, which are counted on a pool of njobs
+            processes, and the counters of the chunks are summed.
+            The number of gold pairs, i.e. the number of candidate pairs
+            minus the pairs in the same file with an overlap, is stored in
+            n_gold_pairs.
+
+            Input
+            :param types:     the set of the types (ngram) to count the
+                              tokens of, all the types if None
             :param intervals: a list of all the discovered intervals, with
                               their transcription
             Output
-            :param gold_pairs: a set of all the gold pairs created from the
-                               discovered intervals
-            :param gold_types: all the types (n-gram) that occur in gold_pairs
+            :return:          a Counter that gives the number of tokens of
+                              each type code in the gold pairs
         """
-        counter = Counter()
-        gold_found_pairs = set()
-
-        def _ngram_pairs(pair):
-            # check if a pair should be kept as gold
-            # and if it intersects with discovered pairs
-            f1, f2 = pair
-
-            # check if should be kept
-            if (f1[0] == f2[0] and overlap((f1[1], f1[2]),
-                                           (f2[1], f2[2]))[0] > 0):
-                return (None, False)
-
-            # check if discovered
-            if (f1, f2) in self.found_pairs:
-                intersection = True
-            else:
-                intersection = False
-
-            return ((f1, f2), intersection)
-
-        # get all discovered intervals
-        same = defaultdict(set)
-        for fname, disc_on, disc_off, token_ngram, ngram in self.intervals:
-            # ngram = tuple(ph for on, off, ph in token_ngram)
-            same[ngram].add((fname, disc_on, disc_off, token_ngram, ngram))
-        # get all gold pairs
-        seen_token = set()
+        _, _, same = self.context.type_groups
+        sizes = {ngram: len(same[ngram]) for ngram in same
+                 if len(same[ngram]) > 1
+                 and (types is None or self.types[ngram] in types)}
+        chunks = balance(sizes, self.njobs)
+        results = fork_map(_gold_counter, chunks, self.njobs, shared=same)
 
-        # parallelize over all possible pairs
-        for ngram in same: 
-            _gold_pairs_found = Parallel(n_jobs=self.njobs, backend="threading")(
-                delayed(_ngram_pairs)(sorted((f1, f2),
-                                    key=lambda f: (f[0], f[1])))
-                                   for f1, f2 in combinations(same[ngram], 2))
-
-            _gold_pairs = {pair for pair, found in _gold_pairs_found if pair is not None}
-            if len(_gold_pairs) > 0: 
-                self.gold_types.add(ngram)
-            _intersection = {pair for pair, found in _gold_pairs_found if found == True}
-            gold_found_pairs = gold_found_pairs.union(_intersection)
-
-            # update counters
-            for f1, f2 in _gold_pairs:
-                if f1[3] not in seen_token:
-                    counter.update((f1[4],))
-                    # count token as seen
-                    seen_token.add(f1[3])
-                if f2[3] not in seen_token:
-                    counter.update((f2[4],))
-                    seen_token.add(f2[3])
-
-        # compute weights for each n gram
-        weights = {ngram: counter[ngram]/len(seen_token) for ngram in counter}
-           
-        return gold_found_pairs, counter, weights
+        self.n_gold_pairs = sum(n for _, n in results)
+        return sum((counter for counter, _ in results), Counter())
 
     #def get_gold_pairs_buggy(self):
     #    """ Get all the gold pairs that can be created using the
@@ -146,31 +223,66 @@ class Grouping(Measure):
     #    gold_types = {f1[4] for f1, f2 in self.gold_pairs}
     #    return gold_pairs, gold_types
 
-    def get_found_pairs(self):
-        """ Get all the pairs that were found.
-            The pairs are ordered by filename and onset.
+    def get_found_tokens(self, class_numbers=None):
+        """ Get all the tokens that are in the discovered pairs, and all the
+            tokens that are both in a discovered pair and in a gold pair,
+            without creating the pairs.
+
+            All the intervals of a cluster are in a discovered pair. An
+            interval is in a pair that is discovered and gold if, in one of
+            its clusters, it has a partner among the other intervals of its
+            type. The intervals of all the clusters are checked at once, the
+            intervals of each type in each cluster forming a group (see
+            `find_partners`).
 
             Input
+            :param class_numbers: the set of the clusters to get the tokens
+                             of, all the clusters if None
             :param clusters: a dict of all the clusters found. the keys
                              are the clusters names, the values are
                              a list of the intervals in this cluster
             Output
-            :param found_pairs: a set of all the discovered pairs
+            :return:         a dict {token: type} of the codes of the tokens
+                             in the discovered pairs, a dict {token: type}
+                             of the codes of the tokens in the discovered
+                             gold pairs
         """
+        found_tokens = dict()
+        group_ix = dict()
+        intervals = []
+        groups = []
         for class_nb in self.clusters:
-            self.found_pairs = self.found_pairs.union(
-                set(combinations(self.clusters[class_nb], 2)))
+            if class_numbers is not None and class_nb not in class_numbers:
+                continue
+            seen = set()
+            cluster = [self.encode(interval)
+                       for interval in self.clusters[class_nb]]
+            for interval in cluster:
+                found_tokens[interval[3]] = interval[4]
+                if interval in seen:
+                    continue
+                seen.add(interval)
+                intervals.append(interval)
+                groups.append(group_ix.setdefault((class_nb, interval[4]),
+                                                  len(group_ix)))
 
             # count type only if clusters has two elements
-            if len(self.clusters[class_nb]) > 1 :
-                self.found_types = self.found_types.union(
-                    {ngram for _, _, _, token_ngram, ngram
-                    in self.clusters[class_nb]})
-
-        # order found pairs
-        self.found_pairs = {
-            tuple(sorted((f1, f2), key=lambda f: (f[0], f[1])))
-            for f1, f2 in self.found_pairs}
+            if len(cluster) > 1 :
+                self.found_types.update(
+                    self.types[interval[4]] for interval in cluster)
+
+        found_gold_tokens = dict()
+        if len(intervals) > 0:
+            partners, _ = self.find_partners(
+                np.array(groups, dtype=np.int64),
+                [interval[0] for interval in intervals],
+                np.array([interval[1] for interval in intervals], dtype=float),
+                np.array([interval[2] for interval in intervals], dtype=float))
+            for interval, partner in zip(intervals, partners.tolist()):
+                if partner:
+                    found_gold_tokens[interval[3]] = interval[4]
+
+        return found_tokens, found_gold_tokens
 
     @staticmethod
     def get_weights(pairs):
@@ -205,23 +317,107 @@ class Grouping(Measure):
         weights = {ngram: counter[ngram]/len(seen_token) for ngram in counter}
         return weights, counter
 
+    def partial_statistics(self, class_numbers=None, types=None):
+        """ Get the tokens in the discovered pairs and in the discovered
+            gold pairs of the clusters of class_numbers, and count the
+            tokens of each type of types in the gold pairs. The two
+            selections are independent: the found tokens can be got by
+            shard of clusters, and the gold tokens by shard of types.
+
+            Input
+            :param class_numbers: the set of the clusters, all the clusters
+                                  if None
+            :param types:         the set of the types (ngram), all the
+                                  types if None
+            Output
+            :return:              the Statistics of the tokens, stored as
+                                  (token_ngram, ngram)
+        """
+        self.found_types = set()
+        found_tokens, found_gold_tokens = self.get_found_tokens(
+            class_numbers)
+        gold_counter = self.decode(self.get_gold_counter(types))
+
+        return Statistics(
+            self.metric_name,
+            counts={'n_gold_pairs': self.n_gold_pairs},
+            sets={'found_tokens': {
+                      (self.tokens[token], self.types[ngram])
+                      for token, ngram in found_tokens.items()},
+                  'found_gold_tokens': {
+                      (self.tokens[token], self.types[ngram])
+                      for token, ngram in found_gold_tokens.items()},
+                  'found_types': self.found_types},
+            counters={'gold_counter': gold_counter})
+
+    def load_statistics(self, stats):
+        """ Count the tokens of each type, and compute the weights of the
+            types from the statistics
+        """
+        self.n_gold_pairs = stats.counts['n_gold_pairs']
+        self.found_types = stats.sets['found_types']
+
+        # count tokens in gold pairs
+        self.gold_counter = Counter(stats.counters['gold_counter'])
+        self.gold_types = set(self.gold_counter)
+
+        # count occurences and weights for gold pairs, found pairs
+        # and intersection of gold and found pairs
+        self.gold_weights = self.type_weights(self.gold_counter)
+        self.found_counter = Counter(
+            ngram for _, ngram in stats.sets['found_tokens'])
+        self.found_weights = self.type_weights(self.found_counter)
+        self.found_gold_counter = Counter(
+            ngram for _, ngram in stats.sets['found_gold_tokens'])
+
     def compute_grouping(self):
         """ Compute the grouping by essentially counting the number of tokens
             of each type in three sets: the set of gold pairs, the set of
             found pairs, and the intersection of gold pairs and found pairs
         """
-        # get discovered pairs
-        self.get_found_pairs()
-
-        # get intersection of discovered pairs and gold pairs
-        # and count occurences and weights for gold pairs
-        gold_found_pairs, self.gold_counter, self.gold_weights = self.get_gold_pairs()
-
-        # count occurences and weights for found pairs
-        self.found_weights, self.found_counter = self.get_weights(
-            self.found_pairs)
-
-        # count occurences and weights for intersection of gold and 
-        # found pairs
-        _, self.found_gold_counter = self.get_weights(gold_found_pairs)
-
+        self.load_statistics(self.partial_statistics())
+
+
+def _count_before(segments, values, queries, strict):
+    """ For each interval i, count the intervals of the same segment whose
+        value is lower than queries[i] (or lower or equal, if not strict).
+
+        Values and queries are sorted together by segment and time: when a
+        value and a query are equal, the query is put first for a strict
+        comparison, last otherwise. The number of values before a query is
+        then a cumulative sum, from which the values of the previous
+        segments are subtracted.
+    """
+    n = len(segments)
+    is_value = np.concatenate([np.ones(n, dtype=np.int64),
+                               np.zeros(n, dtype=np.int64)])
+    ties = np.concatenate([np.full(n, strict), np.full(n, not strict)])
+    order = np.lexsort((ties, np.concatenate([values, queries]),
+                        np.concatenate([segments, segments])))
+    n_before = np.empty(2 * n, dtype=np.int64)
+    n_before[order] = np.cumsum(is_value[order])
+    segment_start = np.searchsorted(np.sort(segments), segments, side='left')
+    return n_before[n:] - segment_start
+
+
+def _gold_counter(ngrams):
+    """ Count the tokens in gold pairs of a chunk of types, and the number of
+        gold pairs, in a worker process. The intervals of each type are
+        shared by `Grouping.get_gold_counter`
+    """
+    same = fork_shared()
+    intervals = [interval for ngram in ngrams for interval in same[ngram]]
+    if len(intervals) == 0:
+        return Counter(), 0
+
+    groups = np.repeat(np.arange(len(ngrams)),
+                       [len(same[ngram]) for ngram in ngrams])
+    partners, n_pairs = Grouping.find_partners(
+        groups,
+        [interval[0] for interval in intervals],
+        np.array([interval[1] for interval in intervals], dtype=float),
+        np.array([interval[2] for interval in intervals], dtype=float))
+
+    tokens = {(interval[4], interval[3]) for interval, partner
+              in zip(intervals, partners.tolist()) if partner}
+    return Counter(ngram for ngram, _ in tokens), int(n_pairs.sum())
@@ -1,24 +1,42 @@
 import os
+import math
 import numpy as np
 import editdistance
 from .measures import Measure
 from itertools import combinations
+from collections import Counter
 
-from tdev2.utils import read_config
+from tdev2.config import load_config
+from tdev2.readers.symbols import SymbolTable
+from .statistics import Statistics
 
 class Ned(Measure):
-    def __init__(self, disc, config_file, output_folder=None):
+    def __init__(self, disc, config_file=None, output_folder=None,
+                 memoize=False, config=None):
         self.metric_name = "ned"
         self.output_folder = output_folder
-        self.disc = disc.clusters
+        # disc can be None if the clusters are given to compute_ned
+        self.disc = disc.clusters if disc is not None else dict()
 
         # measures
         self.n_pairs = None
+        self.distances = None
         self.ned = None
 
-        # read config params
-        conf = read_config(config_file)
-        self.excluded_units = conf['excluded_units']
+        # config params, those of disc by default
+        config = load_config(config, config_file,
+                             default=getattr(disc, 'config', None))
+        self.excluded_units = config.excluded_units
+
+        # distinct n-grams, once the excluded units are removed, encoded
+        # as tuples of phone codes
+        self.ngram2ix = dict()
+        self.ngrams = []
+        self.phones = SymbolTable()
+
+        # if memoize, edit distances between distinct n-grams are kept
+        # across clusters
+        self.memo = dict() if memoize else None
 
     # @staticmethod
     def pairwise_ned(self, s1, s2):
@@ -29,30 +47,121 @@ class Ned(Measure):
         else:
             return 1.0
 
-    def compute_ned(self):
+    def ngram_index(self, ngram):
+        """ Return the index of the distinct n-gram of ngram once the
+            excluded units are removed
+        """
+        if ngram not in self.ngram2ix:
+            encoded = self.phones.encode(
+                phn for phn in ngram if phn not in self.excluded_units)
+            self.ngram2ix[ngram] = len(self.ngrams)
+            self.ngrams.append(encoded)
+        return self.ngram2ix[ngram]
+
+    def distance(self, ix1, ix2):
+        """ Return the edit distance between two distinct n-grams and the
+            length by which it is normalized, as integers, so that the NED
+            of a pair is distance / length
+        """
+        if self.memo is not None and (ix1, ix2) in self.memo:
+            return self.memo[(ix1, ix2)]
+
+        s1, s2 = self.ngrams[ix1], self.ngrams[ix2]
+        if max(len(s1), len(s2)) > 0:
+            dist = (editdistance.eval(s1, s2), max(len(s1), len(s2)))
+        else:
+            dist = (1, 1)
+
+        if self.memo is not None:
+            self.memo[(ix1, ix2)] = dist
+        return dist
+
+    def add_cluster(self, cluster):
+        """ Add the pairs of a cluster to the sums of the edit distances
+            and the number of pairs (see `compute_ned`)
+        """
+        counts = Counter(
+            self.ngram_index(ngram)
+            for fname, disc_on, disc_off, token_ngram, ngram
+            in cluster)
+        counts = sorted(counts.items())
+
+        for i, (ix1, count1) in enumerate(counts):
+            # pairs of two occurences of the same n-gram
+            same = count1 * (count1 - 1) // 2
+            if same > 0 and len(self.ngrams[ix1]) == 0:
+                self.distances[1] += same
+            self.n_pairs += same
+
+            for ix2, count2 in counts[i + 1:]:
+                dist, length = self.distance(ix1, ix2)
+                self.distances[length] += count1 * count2 * dist
+                self.n_pairs += count1 * count2
+
+    def compute_ned(self, clusters=None):
         """ compute edit distance over all discovered pairs and average across
             all pairs
 
+            Each cluster is first collapsed into the multiset of its distinct
+            n-grams. The edit distance is computed once for each pair of
+            distinct n-grams, and weighted by the number of pairs of
+            intervals they represent, i.e. the product of their
+            multiplicities (or m * (m - 1) / 2 for two occurences of the
+            same n-gram, whose NED is 0, or 1 if it's empty).
+
+            The weighted distances are summed exactly as integers for each
+            normalization length, so the result is the mean over all pairs.
+            The clusters are only read once, one at a time, so they can be
+            given as they are read (see `Disc.iter_clusters`), and the
+            clusters can be split in shards whose statistics are merged
+            (see `partial_statistics`).
+
             Input:
-            :param disc:  a dictionnary containing all the discovered clusters.
-                          Each key in the dict is a class, and its value is
-                          all the intervals in this cluster.
+            :param disc:     a dictionnary containing all the discovered
+                             clusters. Each key in the dict is a class, and
+                             its value is all the intervals in this cluster.
+            :param clusters: an iterable of (class, cluster), used instead
+                             of the clusters of disc if given
             Output:
             :param ned:   the average edit distance of all the pairs
         """
-        overall_ned = []
-        for class_nb in self.disc:
-            for discovered1, discovered2 in combinations(
-                    self.disc[class_nb], 2):
-                fname1, disc_on1, disc_off1, token_ngram1, ngram1 = discovered1
-                fname2, disc_on2, disc_off2, token_ngram2, ngram2 = discovered2
-                pair_ned = self.pairwise_ned(ngram1, ngram2)
-                overall_ned.append(pair_ned)
+        self.load_statistics(self.partial_statistics(clusters))
+
+    def partial_statistics(self, clusters=None):
+        """ Sum the edit distances of the pairs of the clusters, for each
+            normalization length, and count the pairs (see `compute_ned`)
+
+            Input:
+            :param clusters: an iterable of (class, cluster), all the
+                             clusters of disc if None
+            Output:
+            :return:         the Statistics of the pairs of the clusters
+        """
+        if clusters is None:
+            clusters = self.disc.items()
+
+        # sum of the edit distances of the pairs, for each normalization
+        # length
+        self.distances = Counter()
+        self.n_pairs = 0
+        for class_nb, cluster in clusters:
+            self.add_cluster(cluster)
+
+        return Statistics(self.metric_name, counts={'n_pairs': self.n_pairs},
+                          counters={'distances': self.distances})
+
+    def load_statistics(self, stats):
+        """ Set the sums of the edit distances and the number of pairs, and
+            compute the ned
+        """
+        self.n_pairs = stats.counts['n_pairs']
+        self.distances = stats.counters['distances']
 
         # get number of pairs and ned value
-        self.n_pairs = len(overall_ned)
         if self.n_pairs > 0:
-            self.ned = np.mean(overall_ned)
+            self.ned = math.fsum(
+                dist / length for length, dist in self.distances.items()
+            ) / self.n_pairs
         else: 
             self.ned = 1.
 
@@ -0,0 +1,113 @@
+"""Implement class Statistics.
+   The Statistics of a measure are the counts from which its scores are
+   computed. They can be computed on a part of the corpus (a shard of the
+   files, or of the clusters for NED and Grouping), and the Statistics of
+   all the parts merged into the Statistics of the whole corpus, so that an
+   evaluation can be split between processes or machines and reduced at the
+   end. They are made of:
+   - counts, numbers that are summed
+   - sets, that are merged by union
+   - counters, dicts of numbers that are summed key by key
+
+   Merging is associative and commutative, and Statistics can be written
+   to JSON with `to_dict` and read back with `from_dict`.
+"""
+import zlib
+from collections import Counter
+
+
+class Statistics():
+    def __init__(self, metric_name, counts=None, sets=None, counters=None):
+        """Sufficient statistics of a measure.
+
+        :param metric_name: the name of the measure
+        :param counts:      dict of the numbers that are summed
+        :param sets:        dict of the sets that are merged by union
+        :param counters:    dict of the Counters that are summed
+        """
+        self.metric_name = metric_name
+        self.counts = dict(counts) if counts else dict()
+        self.sets = {name: set(values)
+                     for name, values in (sets or dict()).items()}
+        self.counters = {name: Counter(counter)
+                         for name, counter in (counters or dict()).items()}
+
+    def __repr__(self):
+        return 'Statistics({}: {})'.format(self.metric_name, ', '.join(
+            ['{}={}'.format(name, n) for name, n in self.counts.items()]
+            + ['{}={} elements'.format(name, len(values))
+               for name, values in self.sets.items()]
+            + ['{}={} keys'.format(name, len(counter))
+               for name, counter in self.counters.items()]))
+
+    def __eq__(self, other):
+        return (isinstance(other, Statistics)
+                and self.metric_name == other.metric_name
+                and self.counts == other.counts
+                and self.sets == other.sets
+                and self.counters == other.counters)
+
+    def merge(self, other):
+        """ Return the Statistics of the union of the two parts of the
+            corpus self and other were computed on
+        """
+        if other.metric_name != self.metric_name:
+            raise ValueError('Attempting to merge statistics of {} and'
+                             ' {}'.format(self.metric_name, other.metric_name))
+        merged = Statistics(self.metric_name, self.counts, self.sets,
+                            self.counters)
+        for name, n in other.counts.items():
+            merged.counts[name] = merged.counts.get(name, 0) + n
+        for name, values in other.sets.items():
+            merged.sets.setdefault(name, set()).update(values)
+        for name, counter in other.counters.items():
+            merged.counters.setdefault(name, Counter()).update(counter)
+        return merged
+
+    def to_dict(self):
+        """ Return the statistics as a dict that can be written to JSON,
+            the sets and counters being written as sorted lists
+        """
+        return {'metric_name': self.metric_name,
+                'counts': self.counts,
+                'sets': {name: sorted(values, key=repr)
+                         for name, values in self.sets.items()},
+                'counters': {name: sorted(counter.items(), key=repr)
+                             for name, counter in self.counters.items()}}
+
+    @classmethod
+    def from_dict(cls, dct):
+        """ Read the statistics written by `to_dict`, the lists read from
+            JSON being converted back to tuples
+        """
+        return cls(dct['metric_name'], dct['counts'],
+                   {name: [_as_tuple(value) for value in values]
+                    for name, values in dct['sets'].items()},
+                   {name: {_as_tuple(key): n for key, n in items}
+                    for name, items in dct['counters'].items()})
+
+
+def merge_statistics(all_stats):
+    """ Merge a list of Statistics of the same measure"""
+    all_stats = list(all_stats)
+    if len(all_stats) == 0:
+        raise ValueError('no statistics to merge')
+    merged = all_stats[0]
+    for stats in all_stats[1:]:
+        merged = merged.merge(stats)
+    return merged
+
+
+def in_shard(key, shard, n_shards):
+    """ Whether key (a file name, a class number, or an n-gram) is in the
+        shard-th of n_shards shards. The shard of a key only depends on
+        its value, so all the processes agree on it.
+    """
+    return zlib.crc32(repr(key).encode('utf-8')) % n_shards == shard
+
+
+def _as_tuple(value):
+    """ Convert the (nested) lists of a value read from JSON to tuples"""
+    if isinstance(value, list):
+        return tuple(_as_tuple(v) for v in value)
+    return value
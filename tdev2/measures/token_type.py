@@ -2,13 +2,16 @@ import os
 import numpy as np
 
 from .measures import Measure
-from tdev2.utils import overlap
+from .context import EvaluationContext
+from .statistics import Statistics
 
 
 class TokenType(Measure):
-    def __init__(self, gold, disc, output_folder=None):
+    def __init__(self, gold, disc, output_folder=None, context=None):
         self.metric_name = "token_type"
         self.output_folder = output_folder
+        if context is None:
+            context = EvaluationContext(gold, disc)
 
         # get gold as interval trees
         self.gold_phn = gold.phones
@@ -20,18 +23,22 @@ class TokenType(Measure):
         assert type(self.gold_wrd) == dict, (
             "gold_phn should be a dict "
             "of intervaltree objects but is {} ".format(type(self.gold_wrd)))
-        self.all_type = set()
-        self.n_token = 0
 
         # get gold types and count gold tokens
-        for fname in self.gold_wrd:
-            self.all_type.update(set(
-                [word for on, off, word in self.gold_wrd[fname]]))
-            self.n_token += len(self.gold_wrd[fname])
+        self.all_type = set(context.word_counts)
+        self.n_token = sum(context.word_counts.values())
         self.n_type = len(self.all_type)
 
+        # words and phones as Alignments, the phonetic transcription of
+        # each word is looked up in the transcriptions column of the words
+        self.gold_wrd = context.words
+        self.gold_phn = context.phones
+        self.phone_symbols = context.phone_symbols
+        self.ngram_codes = dict()
+
         # get discovered as list of intervals
         self.disc = disc.intervals
+        self.n_disc = len(self.disc)
 
         # measures
         self.n_discovered_words = 0
@@ -44,14 +51,25 @@ class TokenType(Measure):
         self.type_prec = None
         self.type_rec = None
 
+    def encode(self, ngram):
+        """ Return the tuple of phone codes of an ngram, or None if one of
+            its symbols is not a phone of the gold
+        """
+        if ngram not in self.ngram_codes:
+            if all(phn in self.phone_symbols for phn in ngram):
+                self.ngram_codes[ngram] = self.phone_symbols.encode(ngram)
+            else:
+                self.ngram_codes[ngram] = None
+        return self.ngram_codes[ngram]
+
     @property
     def precision(self):
         """Return Token and Type precision"""
         # Token precision/recall
-        if len(self.disc) == 0:
+        if self.n_disc == 0:
             self.token_prec = np.nan
         else:
-            self.token_prec = self.token_hit / len(self.disc)
+            self.token_prec = self.token_hit / self.n_disc
 
         # Types precision/recall
         if len(self.type_seen) == 0:
@@ -91,9 +109,9 @@ class TokenType(Measure):
             self.type_prec + self.type_rec)
         return self.token_fscore, self.type_fscore
 
-    def compute_token_type(self):
-        """ Loop over all intervals and compute token
-            type measure.
+    def partial_statistics(self, fnames=None):
+        """ Loop over the intervals of fnames and count the gold words
+            discovered by the system, and the types discovered and seen.
 
             The Token measure is computed by
             counting all the gold words discovered by the
@@ -104,6 +122,8 @@ class TokenType(Measure):
 
 
             Input:
+            :param fnames:   the set of the files to count the tokens and
+                             types of, all the files if None
             :param gold_phn: the gold phone alignment
                              stored as an interval tree
             :type gold_phn:  Interval Tree
@@ -114,16 +134,25 @@ class TokenType(Measure):
                              intervals
             :type disc:      list of tuples
             Output:
-            :return:         The Token Type measure
+            :return:         the Statistics of the tokens and types of
+                             fnames
         """
+        token_hit = 0
+        n_disc = 0
+        type_hit = set()
+        type_seen = set()
+        token_seen = set()
         for fname, disc_on, disc_off, token_ngram, ngram in self.disc:
+            if fnames is not None and fname not in fnames:
+                continue
             if fname not in self.gold_wrd:
                 raise ValueError('{}: file not found in gold'.format(fname))
 
-            overlap_wrd = self.gold_wrd[fname].overlap(disc_on, disc_off)
-            # ngram = tuple(phn for _, _, phn in ngram)
+            n_disc += 1
+            words = self.gold_wrd[fname]
+            overlap_wrd = words.overlap_ix(disc_on, disc_off)
             # get type by getting ngram covered
-            self.type_seen.add(tuple(ngram))
+            type_seen.add(tuple(ngram))
 
             # switch cases.
             # if interval overlaps with less than 1 word
@@ -134,37 +163,66 @@ class TokenType(Measure):
             if len(overlap_wrd) < 1:
                 continue
             elif len(overlap_wrd) > 1:
-                # choose word with the most overlap
-                current_overlap = 0
-                for wrd_on, wrd_off, wrd in overlap_wrd:
-                    ov, _ = overlap((disc_on, disc_off), (wrd_on, wrd_off))
-                    if ov > current_overlap:
-                        current_overlap = ov
-                        chosen = (wrd_on, wrd_off, wrd)
+                # choose word with the most overlap, relative to its length
+                wrd_on = words.onsets[overlap_wrd]
+                wrd_off = words.offsets[overlap_wrd]
+                ov = ((np.minimum(wrd_off, disc_off)
+                       - np.maximum(wrd_on, disc_on)) / (wrd_off - wrd_on))
+                chosen = int(overlap_wrd[np.argmax(ov)])
+            else:
+                chosen = int(overlap_wrd[0])
 
-                overlap_wrd = chosen
+            # get the phonetic transcription of the word by index
+            if words.transcriptions is None:
+                words.transcriptions = words.transcribe(self.gold_phn[fname])
+            gold_wrd_trs = words.transcriptions[chosen]
 
-            else:
-                # Get word and add it to types seen (not necessarily hit)
-                overlap_wrd = overlap_wrd.pop()
-            gold_wrd_on, gold_wrd_off, gold_wrd_token = overlap_wrd
-            gold_wrd_trs = sorted(
-                [phn for phn
-                 in self.gold_phn[fname].overlap(gold_wrd_on, gold_wrd_off)])
-
-            gold_wrd_trs = tuple(
-                [phn for phn_on, phn_off, phn in gold_wrd_trs])
-
-            if ((gold_wrd_trs == ngram) and
-                not ((fname, gold_wrd_on,
-                      gold_wrd_off, gold_wrd_token) in self.token_seen)):
-                self.token_hit += 1
-                self.token_seen.add(
-                    (fname, gold_wrd_on, gold_wrd_off, gold_wrd_token))
+            if gold_wrd_trs != self.encode(ngram):
+                continue
+            if (fname, chosen) not in token_seen:
+                token_hit += 1
+                token_seen.add((fname, chosen))
 
             # TODO CHECK HOMOPHONE CASE W/ EMMANUEL
-            if ((gold_wrd_trs == ngram) and ngram not in self.type_hit):
-                self.type_hit.add(ngram)
+            type_hit.add(ngram)
+
+        # gold tokens and types of fnames
+        if fnames is None:
+            n_token = self.n_token
+            all_type = self.all_type
+        else:
+            n_token = 0
+            all_type = set()
+            for fname in fnames:
+                if fname in self.gold_wrd:
+                    n_token += len(self.gold_wrd[fname])
+                    all_type.update(wrd for _, _, wrd in self.gold_wrd[fname])
+
+        return Statistics(
+            self.metric_name,
+            counts={'token_hit': token_hit, 'n_disc': n_disc,
+                    'n_token': n_token},
+            sets={'type_hit': type_hit, 'type_seen': type_seen,
+                  'all_type': all_type})
+
+    def load_statistics(self, stats):
+        """ Set the counts from which the scores are computed"""
+        self.token_hit = stats.counts['token_hit']
+        self.n_disc = stats.counts['n_disc']
+        self.n_token = stats.counts['n_token']
+        self.type_hit = stats.sets['type_hit']
+        self.type_seen = stats.sets['type_seen']
+        self.all_type = stats.sets['all_type']
+        self.n_type = len(self.all_type)
+
+    def compute_token_type(self):
+        """ Loop over all intervals and compute token
+            type measure (see `partial_statistics`).
+
+            Output:
+            :return:         The Token Type measure
+        """
+        self.load_statistics(self.partial_statistics())
 
     def write_score(self):
         #if not self.token_fscore:
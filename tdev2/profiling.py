@@ -0,0 +1,232 @@
+"""Time and memory taken by each stage of an evaluation
+
+A Profiler records, for each stage of an evaluation (reading the gold,
+reading the discovered classes, each measure...), the wall time, the CPU
+time and the resident memory of the process:
+
+    profiler = Profiler()
+    with profiler.stage('read_gold'):
+        gold = Gold(...)
+    profiler.to_dict()
+
+The CPU time includes the time of the children processes that ended
+during the stage (e.g. a pool of workers).
+
+The memory is that of the stage, not of the whole process: rss_start_mb
+and rss_end_mb are the resident memory of the process when the stage
+starts and ends, and peak_rss_mb is the peak resident memory reached
+during the stage. On Linux, the peak of the process is reset to its
+current resident memory when a stage starts, by writing 5 in
+/proc/self/clear_refs, so peak_rss_mb is the peak of this process during
+the stage. Elsewhere, the peak of the process can't be reset, so it is
+only known when the stage reaches a new peak of the process, and is None
+otherwise. When children processes that ended during the stage reached a
+higher peak than the children ended before, their peak is included. The
+resident memory is None where /proc/self/status can't be read.
+
+A stage that is run several times (e.g. a measure computed with several
+overlap thresholds) is recorded once, with the sum of the times, the
+highest peak, the memory at the start of the first run and at the end of
+the last run.
+
+With a cprofile_dir, each stage is also profiled by cProfile, and its
+statistics dumped in cprofile_dir/<stage>.prof, to be read by `pstats`.
+As only one cProfile can run at a time, and as the peak memory is reset
+when a stage starts, the stages should not be nested.
+A disabled Profiler records nothing, so that the stages can be marked
+whether profiling was asked or not.
+
+"""
+import os
+import sys
+import time
+import cProfile
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, the peak memory is not recorded
+    resource = None
+
+
+def max_rss(who='self'):
+    """ Return the peak resident memory of this process ('self') or of
+        the largest of its ended children ('children') since the process
+        started, in MB, or None if it can't be read on this platform
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF if who == 'self'
+                             else resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kB elsewhere
+    if sys.platform == 'darwin':
+        return rss / 1024 ** 2
+    return rss / 1024
+
+
+def memory_status():
+    """ Return the current ('rss') and peak ('hwm') resident memory of this
+        process in MB, read in /proc/self/status, or None if it can't be
+        read on this platform
+    """
+    fields = {'VmRSS:': 'rss', 'VmHWM:': 'hwm'}
+    status = dict()
+    try:
+        with open('/proc/self/status', 'r') as fin:
+            for line in fin:
+                line = line.split()
+                if len(line) == 3 and line[0] in fields:
+                    # the values are in kB
+                    status[fields[line[0]]] = int(line[1]) / 1024
+    except (OSError, ValueError):
+        return None
+    if len(status) < len(fields):
+        return None
+    return status
+
+
+def reset_peak_rss():
+    """ Reset the peak resident memory of this process to its current
+        resident memory, on Linux. Return whether it was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as fout:
+            fout.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def cpu_time():
+    """ Return the CPU time of this process and of its ended children"""
+    if resource is None:
+        return time.process_time()
+    return sum(usage.ru_utime + usage.ru_stime for usage in (
+        resource.getrusage(resource.RUSAGE_SELF),
+        resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+
+class Profiler():
+    def __init__(self, enabled=True, cprofile_dir=None):
+        """Record the time and memory taken by the stages of an evaluation.
+
+        :param enabled:      whether to record the stages
+        :param cprofile_dir: if given, directory in which to dump the
+                             cProfile statistics of each stage
+        """
+        self.enabled = enabled
+        self.cprofile_dir = cprofile_dir
+        self.stages = dict()
+        self.cprofiles = dict()
+        if enabled and cprofile_dir is not None:
+            os.makedirs(cprofile_dir, exist_ok=True)
+
+    def __repr__(self):
+        return 'Profiler({} stages)'.format(len(self.stages))
+
+    def stage(self, name):
+        """ Return a context manager that records the stage name"""
+        return _Stage(self, name)
+
+    def record(self, name, wall, cpu, rss, calls=1, rss_start=None,
+               rss_end=None):
+        """ Add runs of the stage name to its record.
+
+        :param rss:       the peak resident memory of the runs, in MB
+        :param rss_start: the resident memory at the start of the first
+                          run, in MB
+        :param rss_end:   the resident memory at the end of the last run,
+                          in MB
+        """
+        if name not in self.stages:
+            self.stages[name] = {'wall_time': 0., 'cpu_time': 0.,
+                                 'peak_rss_mb': None, 'rss_start_mb': None,
+                                 'rss_end_mb': None, 'calls': 0}
+        record = self.stages[name]
+        record['wall_time'] += wall
+        record['cpu_time'] += cpu
+        if record['calls'] == 0:
+            record['rss_start_mb'] = rss_start
+        record['rss_end_mb'] = rss_end
+        record['calls'] += calls
+        if rss is not None:
+            record['peak_rss_mb'] = max(record['peak_rss_mb'] or 0, rss)
+
+    def update(self, stages):
+        """ Add the stages recorded by another profiler (e.g. in a worker
+            process), as returned by `to_dict`
+        """
+        for name, record in stages.items():
+            self.record(name, record['wall_time'], record['cpu_time'],
+                        record['peak_rss_mb'], record['calls'],
+                        record['rss_start_mb'], record['rss_end_mb'])
+
+    def to_dict(self):
+        """ Return the records of the stages, in the order they were run,
+            as a dict that can be written to JSON
+        """
+        return {name: dict(record) for name, record in self.stages.items()}
+
+    def cprofile_path(self, name):
+        """ Return the file in which the cProfile statistics of the stage
+            name are dumped
+        """
+        fname = ''.join(c if c.isalnum() or c in '-_.' else '_'
+                        for c in name)
+        return os.path.join(self.cprofile_dir, '{}.prof'.format(fname))
+
+
+class _Stage():
+    """ Context manager that records a stage of a Profiler"""
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.cprofile = None
+
+    def __enter__(self):
+        if not self.profiler.enabled:
+            return self
+        if self.profiler.cprofile_dir is not None:
+            # the statistics of the runs of a stage are accumulated
+            self.cprofile = self.profiler.cprofiles.setdefault(
+                self.name, cProfile.Profile())
+            self.cprofile.enable()
+        # the peaks before the stage, to know whether the stage reached a
+        # new peak where the peak of this process can't be reset
+        self.max_rss = max_rss('self')
+        self.children_max_rss = max_rss('children')
+        self.reset = reset_peak_rss()
+        self.status = memory_status()
+        self.wall = time.perf_counter()
+        self.cpu = cpu_time()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.profiler.enabled:
+            return False
+        wall = time.perf_counter() - self.wall
+        cpu = cpu_time() - self.cpu
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.profiler.cprofile_path(self.name))
+        status = memory_status()
+        self.profiler.record(
+            self.name, wall, cpu, self.peak_rss(status), calls=1,
+            rss_start=None if self.status is None else self.status['rss'],
+            rss_end=None if status is None else status['rss'])
+        return False
+
+    def peak_rss(self, status):
+        """ Return the peak resident memory reached during the stage, or
+            None if it isn't known (see the module docstring)
+        """
+        if self.reset and status is not None:
+            peak = status['hwm']
+        else:
+            peak = max_rss('self')
+            if peak is None or peak <= self.max_rss:
+                return None
+        children = max_rss('children')
+        if children is not None and children > self.children_max_rss:
+            peak = max(peak, children)
+        return peak
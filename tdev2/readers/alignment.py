@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""Array-backed representation of a time alignment
+
+An :class:`Alignment` stores the intervals of one file as three NumPy arrays
+sorted by onset: the onsets, the offsets and the integer code of the symbol
+of each interval. It implements the part of the `intervaltree.IntervalTree`
+interface used by the readers and the measures (iteration, `len` and
+`overlap`), so that `gold.phones[fname]` and `gold.words[fname]` can be used
+the same way whatever the backend used to read the gold.
+
+Overlap queries are answered by two binary searches on the sorted arrays
+(O( log(n) + m), m being the number of results found), without building
+any python object per gold interval.
+
+The phonetic transcription of each word of a word alignment can be stored in
+its `transcriptions` column (see `Gold.index_word_transcriptions`), so that
+the measures get it by index instead of querying the phone alignment.
+
+"""
+
+import numpy as np
+
+
+class Alignment():
+    def __init__(self, onsets, offsets, codes, symbols, sorted_offsets=None):
+        """Alignment of one file.
+
+        :param onsets:  array of the onsets, sorted in ascending order
+        :param offsets: array of the offsets, same order as onsets
+        :param codes:   array of the integer codes of the symbols
+        :param symbols: sequence that returns the symbol for each code
+        :param sorted_offsets: whether the offsets are sorted in ascending
+                               order, checked if not given
+        """
+        self.onsets = onsets
+        self.offsets = offsets
+        self.codes = codes
+        self.symbols = symbols
+
+        # for each interval, the tuple of codes of the intervals of another
+        # alignment it covers (e.g. the phones of each word), if indexed
+        self.transcriptions = None
+
+        # running maximum of the offsets, so that the first interval ending
+        # after a given time can be found by binary search even when
+        # intervals overlap. When the offsets are already sorted (which is
+        # the case when the intervals don't overlap), every interval after
+        # that one ends after the given time.
+        if sorted_offsets is None:
+            sorted_offsets = bool((offsets[1:] >= offsets[:-1]).all())
+        self.sorted_offsets = sorted_offsets
+        if self.sorted_offsets:
+            self._max_offsets = offsets
+        else:
+            self._max_offsets = np.maximum.accumulate(offsets)
+
+    @classmethod
+    def from_tuples(cls, intervals, symbol2ix, symbols):
+        """Build the alignment from (onset, offset, symbol) tuples.
+
+        As in an interval tree, duplicated intervals are only kept once.
+        """
+        intervals = sorted(set(intervals))
+        onsets = np.array([on for on, _, _ in intervals], dtype=float)
+        offsets = np.array([off for _, off, _ in intervals], dtype=float)
+        codes = np.array([symbol2ix[symbol] for _, _, symbol in intervals],
+                         dtype=np.int32)
+        return cls(onsets, offsets, codes, symbols)
+
+    def __len__(self):
+        return len(self.onsets)
+
+    def __iter__(self):
+        symbols = self.symbols
+        return zip(self.onsets.tolist(), self.offsets.tolist(),
+                   [symbols[c] for c in self.codes.tolist()])
+
+    def __getitem__(self, i):
+        return (float(self.onsets[i]), float(self.offsets[i]),
+                self.symbols[self.codes[i]])
+
+    def __repr__(self):
+        return 'Alignment({} intervals)'.format(len(self))
+
+    def is_empty(self):
+        return len(self) == 0
+
+    def search(self, begins, ends):
+        """ Vectorized search of the candidates overlapping each query.
+
+            For each query interval [begin, end), return the bounds
+            [lo, hi) of the slice of the alignment that contains all
+            the intervals overlapping it. When the alignment doesn't
+            contain overlapping intervals, all the intervals of the
+            slice overlap the query.
+
+            Input
+            :param begins: array of the onsets of the queries
+            :param ends:   array of the offsets of the queries
+            Output
+            :return:       lo, hi, two arrays of indices
+        """
+        lo = np.searchsorted(self._max_offsets, begins, side='right')
+        hi = np.searchsorted(self.onsets, ends, side='left')
+        return lo, np.maximum(lo, hi)
+
+    def overlap_ix(self, begin, end):
+        """ Return the indices, sorted by onset, of the intervals that
+            overlap [begin, end), with the same semantics as
+            `intervaltree.IntervalTree.overlap`
+        """
+        if begin >= end:
+            return np.arange(0)
+        lo = self._max_offsets.searchsorted(begin, side='right')
+        hi = self.onsets.searchsorted(end, side='left')
+        ix = np.arange(lo, max(lo, hi))
+        if not self.sorted_offsets:
+            ix = ix[self.offsets[ix] > begin]
+        return ix
+
+    def overlap(self, begin, end):
+        """ Return the list of (onset, offset, symbol) tuples that overlap
+            [begin, end), sorted by onset.
+        """
+        ix = self.overlap_ix(begin, end)
+        symbols = self.symbols
+        return list(zip(self.onsets[ix].tolist(), self.offsets[ix].tolist(),
+                        [symbols[c] for c in self.codes[ix].tolist()]))
+
+    def transcribe(self, other):
+        """ For each interval, get the codes of the intervals of another
+            alignment that overlap it, sorted by onset as in `overlap`
+            (e.g. the phones of each word of a word alignment).
+
+            Input
+            :param other: the Alignment of the same file to transcribe with
+            Output
+            :return:      a list of tuples of codes, one per interval
+        """
+        codes = other.codes.tolist()
+        if other.sorted_offsets:
+            lo, hi = other.search(self.onsets, self.offsets)
+            # empty queries don't overlap anything
+            hi = np.where(self.onsets < self.offsets, hi, lo)
+            return [tuple(codes[i:j]) for i, j in zip(lo.tolist(), hi.tolist())]
+        return [tuple(codes[i] for i in other.overlap_ix(on, off).tolist())
+                for on, off in zip(self.onsets.tolist(), self.offsets.tolist())]
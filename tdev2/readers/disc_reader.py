@@ -20,24 +20,138 @@ The discovered elements can be represented in 3 ways, depending on the usage:
 :param clusters: a dictionary where all the keys are class numbers, and the
     values are all the intervals for that class
 
+The intervals and the clusters are stored in columns (see `IntervalTable`),
+and `intervals` and `clusters` are read-only views of these columns that
+give the intervals as (fname, onset, offset, token_ngram, ngram) tuples.
+
 """
 
 
 import os
+import sys
 import codecs
+import numpy as np
 import intervaltree
 
-from tdev2.utils import check_boundary
+from collections import defaultdict
+
+from tdev2.config import load_config
+from tdev2.utils import check_boundary, edge_overlaps, keep_boundaries
+from tdev2.utils import balance, fork_map, fork_shared
+from tdev2.readers.alignment import Alignment
+from tdev2.readers.symbols import SymbolTable
+from tdev2.readers.interval_table import IntervalTable, ClusterTable
 
 
 class Disc():
-    def __init__(self, disc_path=None, gold=None):
+    def __init__(self, disc_path=None, gold=None, njobs=1, config=None,
+                 prune_silence=False):
 
-        if not os.path.isfile(disc_path):
+        # the class file can also be read from a pipe, or from stdin
+        if disc_path != '-' and (not os.path.exists(disc_path)
+                                 or os.path.isdir(disc_path)):
             raise ValueError('{}: File Not Found'.format(disc_path))
+        self.setup(disc_path, gold, njobs, config, prune_silence)
+        self.read_clusters()
+
+    @classmethod
+    def from_nodes(cls, nodes, dedups, gold=None, njobs=1, config=None,
+                   prune_silence=False):
+        """ Build the discovered clusters directly from the output of a UTD
+            system, without writing and reading a class file.
+
+            The result is the same as reading the class file written by
+            `write_disc_class_file`: the timestamps are rounded to 2
+            decimals, and the classes are numbered from 1.
+
+            Input
+            :param nodes:  the (filename, onset, offset) of each node,
+                           indexed by the node numbers
+            :param dedups: the list of the clusters, as lists of node
+                           numbers
+        """
+        disc = cls.__new__(cls)
+        disc.setup(None, gold, njobs, config, prune_silence)
+        disc.build_clusters(*read_nodes(nodes, dedups))
+        return disc
+
+    @classmethod
+    def sweep(cls, thresholds, gold, disc_path=None, nodes=None,
+              dedups=None, njobs=1, config=None, prune_silence=False):
+        """ Read the discovered clusters once, from a class file or from the
+            nodes and clusters of a UTD system (see `from_nodes`), and
+            transcribe them with each overlap threshold.
+
+            The overlaps of the discovered intervals with the first and last
+            phones they cover are computed once (see `locate_intervals`),
+            and only the decision to keep these phones depends on the
+            threshold.
+
+            Input
+            :param thresholds: the list of the overlap thresholds
+            :param gold:       the Gold used to transcribe the intervals
+            :param config:     the Config of the other parameters, the one
+                               of the gold if None
+            Output
+            :return:           a dict that gives the Disc of each threshold
+        """
+        if not gold:
+            raise ValueError('The discovered intervals can only be'
+                             ' transcribed with a gold')
+        if disc_path is not None:
+            classes, unique_nodes = read_classes(disc_path)
+        else:
+            classes, unique_nodes = read_nodes(nodes, dedups)
+
+        # only the intervals in the speech are located, if they are pruned
+        speech = None
+        located_nodes = unique_nodes
+        if prune_silence and getattr(gold, 'vad', None) is not None:
+            speech = gold.in_speech(
+                [fname for fname, _, _ in unique_nodes],
+                np.array([on for _, on, _ in unique_nodes], dtype=float),
+                np.array([off for _, _, off in unique_nodes], dtype=float))
+            located_nodes = [unique_nodes[i]
+                             for i in np.flatnonzero(speech)]
+
+        by_file, located = locate_intervals(located_nodes, gold.words, njobs,
+                                            thresholds)
+        discs = dict()
+        for k, ovth in enumerate(thresholds):
+            disc = cls.__new__(cls)
+            disc.setup(disc_path, gold, njobs, config, prune_silence)
+            disc.config = disc.config._replace(overlap_th=ovth)
+            slices = disc.assemble_slices(len(located_nodes), by_file,
+                                          located, disc.gold_phn, k)
+            if speech is not None:
+                slices = expand_slices(slices, np.flatnonzero(speech),
+                                       len(unique_nodes))
+            disc.build_clusters(classes, unique_nodes, slices, speech)
+            discs[ovth] = disc
+        return discs
+
+    def setup(self, disc_path, gold, njobs, config=None,
+              prune_silence=False):
+        """ Initialize the attributes, before the clusters are read. The
+            intervals are transcribed with the overlap threshold of config,
+            or of the configuration of the gold if None.
+
+            With prune_silence, the intervals entirely outside the speech
+            of the VAD of the gold (see `Gold.in_speech`) are thrown away
+            before being transcribed.
+        """
         self.disc_path = disc_path
-        self.clusters = None
-        self.intervals = None
+        self.njobs = njobs
+        self.config = load_config(config, default=getattr(gold, 'config',
+                                                          None))
+        self.table = None
+        self.cluster_table = None
+        self._clusters = None
+        self._intervals = None
+        # distinct n-grams, shared by all the intervals that have them
+        self.ngrams = SymbolTable()
+        # symbols of the phones of the transcriptions
+        self.phones = SymbolTable()
         if gold:
             self.gold_phn = gold.words
         else:
@@ -45,7 +159,41 @@ class Disc():
                   " without gold, so no transcription is given")
             self.gold_phn = None
         self.intervals_tree = None
-        self.read_clusters()
+
+        # the gold whose VAD is used to prune the intervals, if any
+        self.vad_gold = None
+        if prune_silence:
+            if getattr(gold, 'vad', None) is None:
+                print('WARNING: the gold has no VAD, the discovered'
+                      ' intervals are not pruned')
+            else:
+                self.vad_gold = gold
+
+    @property
+    def intervals(self):
+        """ The distinct discovered intervals, as a sequence of
+            (fname, onset, offset, token_ngram, ngram) tuples
+        """
+        if self._intervals is not None:
+            return self._intervals
+        return self.table
+
+    @intervals.setter
+    def intervals(self, intervals):
+        self._intervals = intervals
+
+    @property
+    def clusters(self):
+        """ The discovered clusters, as a mapping from the class numbers to
+            the lists of the intervals of each class
+        """
+        if self._clusters is not None:
+            return self._clusters
+        return self.cluster_table
+
+    @clusters.setter
+    def clusters(self, clusters):
+        self._clusters = clusters
 
     def __repr__(self):
         return '\n'.join(
@@ -53,85 +201,152 @@ class Disc():
            for (fname, t0, t1) in self.intervals)
 
     def read_clusters(self):
-        """ Read discovered clusters """
-        classes = []
-        discovered = dict()
-        intervals = set()
-        # file is decoded line by line and ned statistics are computed in
-        # a streaming to avoid using a high amount of memory
-        with open(self.disc_path) as fin:
-            cfile = fin.readlines()
-
-            # check that last line is empty
-            assert cfile[-1] == '\n', ("discovered class file should end with"
-                                     " and empty line")
-            for lines in cfile:
-                line = lines.strip()
-
-                # check what type of line is being read, either it begins with
-                # "Class", so it's the start of a new cluster or it contains an
-                # interval, so add it to current cluster or it is empty, so the
-                # previous cluster has been read entirely
-                if line[:5] == 'Class':  # class + number + ngram if available
-                    class_number = line.strip().split(' ')[1]
-                elif len(line.split(' ')) == 3:
-                    fname, start, end = line.split(' ')
-                    disc_on, disc_off = float(start), float(end)
-
-                    # check that timestamps are correct
-                    assert disc_off > disc_on, ("timestamps are not"
-                     " correct\n {} {} {}\n".format(fname, disc_on, disc_off))
-
-                    # get the phone transcription for current interval
-                    if self.gold_phn:
-                        token_ngram, ngram = (self.get_transcription(
-                         fname, disc_on, disc_off, self.gold_phn))
-
-                        # throw away interval if outside of transcription
-                        if len(token_ngram) == 0:
-                            continue
-                    else:
-                        token_ngram, ngram = None, None
-
-                    intervals.add(
-                        (fname, disc_on, disc_off, token_ngram, ngram))
-                    classes.append(
-                        (fname, disc_on, disc_off, token_ngram, ngram))
-                elif len(line) == 0:
-                    # empty line means that the class has ended
-                    # add class to discovered dict.
-                    # if entry already exists, exit with an error
-                    assert class_number not in discovered, (
-                        "Two Classes have the same number {}"
-                        " in discovered classes".format(class_number))
-                    #assert len(classes) > 0, (
-                    #        'class {} if empty'.format(class_number))
-                    
-
-                    # changed here too
-                    # if len(classes) > 0:
-                    if len(classes) > 1:
-                        discovered[class_number] = classes
-
-                    # re-initialize classes
-                    classes = list()
-                else:
-                    raise ValueError('Line in discovered classes has wrong'
-                            ' format\n {}\n'.format(line))
-
-        # # I added here, not to count intervals that belong to singleton clusters
-        # # count only the intervals from clusters of length > 1
-        # for class_number, classes in discovered.items():
-        #     for (fname, disc_on, disc_off, token_ngram, ngram) in classes:
-        #         intervals.add( (fname, disc_on, disc_off, token_ngram, ngram) )
-
-
-        self.clusters = discovered
-        self.intervals = list(intervals)
+        """ Read discovered clusters
+
+            The class file is read in two passes: first all the discovered
+            intervals are read, one class at a time (see `read_class_file`),
+            then they are all transcribed at once, file by file (see
+            `get_transcriptions`), and the clusters are built.
+        """
+        self.build_clusters(*read_classes(self.disc_path))
+
+    @staticmethod
+    def iter_clusters(disc_path, gold, config=None):
+        """ Read and transcribe the clusters of a class file one at a time,
+            without keeping the file nor the previous clusters in memory,
+            so that a measure computed cluster by cluster (e.g. NED) can be
+            computed on a class file of any size, or on a pipe.
+
+            As in `read_clusters`, the intervals that have no transcription
+            are thrown away, and only the clusters of more than one interval
+            are kept.
+
+            Input
+            :param disc_path: path of the class file, '-' for stdin
+            :param gold:      the Gold used to transcribe the intervals
+            :param config:    the Config, the one of the gold if None
+            Output
+            :return:          a generator of (class_number, cluster)
+        """
+        gold_phn = gold.words
+        ovth = load_config(config, default=gold.config).overlap_th
+        kept = set()
+        for class_number, class_intervals in read_class_file(disc_path):
+            assert class_number not in kept, (
+                "Two Classes have the same number {}"
+                " in discovered classes".format(class_number))
+
+            by_file = defaultdict(list)
+            for interval in class_intervals:
+                by_file[interval[0]].append(interval)
+
+            cluster = []
+            for fname, file_intervals in by_file.items():
+                transcriptions = transcribe_file(gold_phn, fname,
+                                                 file_intervals, ovth)
+                for interval, (token_ngram, ngram) in zip(
+                        file_intervals, transcriptions):
+                    if len(token_ngram) > 0:
+                        cluster.append(interval + (token_ngram, ngram))
+
+            if len(cluster) > 1:
+                kept.add(class_number)
+                yield class_number, cluster
+
+    def build_clusters(self, classes, nodes, slices=None, speech=None):
+        """ Transcribe all the discovered intervals at once and build the
+            clusters
+
+            The intervals that have a transcription are stored in an
+            IntervalTable, and the clusters of more than one interval in a
+            ClusterTable.
+
+            Input
+            :param classes: list of (class_number, list of node indices)
+            :param nodes:   list of the distinct (fname, onset, offset)
+            :param slices:  the transcriptions of the nodes, as returned by
+                            `get_phone_slices`, computed if None
+            :param speech:  the mask of the nodes in the speech, computed
+                            if None and the silences are pruned
+        """
+        fnames = SymbolTable()
+        file_ix = np.array([fnames.intern(fname) for fname, _, _ in nodes],
+                           dtype=np.int32)
+        onsets = np.array([on for _, on, _ in nodes], dtype=float)
+        offsets = np.array([off for _, _, off in nodes], dtype=float)
+
+        # the intervals in the speech, if they are pruned
+        if self.vad_gold is None or not self.gold_phn:
+            speech = None
+        elif speech is None:
+            speech = self.vad_gold.in_speech(
+                [fname for fname, _, _ in nodes], onsets, offsets)
+        if speech is not None:
+            print('{} of {} intervals are outside of the speech'.format(
+                len(nodes) - speech.sum(), len(nodes)))
+
+        # get the phone transcription of all the intervals, as slices of the
+        # phone buffer
+        if self.gold_phn:
+            if slices is None and speech is not None:
+                # only transcribe the intervals in the speech
+                in_speech = np.flatnonzero(speech)
+                slices = self.get_phone_slices(
+                    [nodes[i] for i in in_speech], self.gold_phn,
+                    self.njobs)
+                slices = expand_slices(slices, in_speech, len(nodes))
+            elif slices is None:
+                slices = self.get_phone_slices(nodes, self.gold_phn,
+                                               self.njobs)
+            starts, ends, ngram_ix, phones = slices
+            # throw away interval if outside of transcription
+            keep = ends > starts
+            if speech is not None:
+                keep &= speech
+        else:
+            starts = ends = np.zeros(len(nodes), dtype=np.int64)
+            ngram_ix = np.full(len(nodes), -1, dtype=np.int32)
+            phones = (np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int32))
+            keep = np.ones(len(nodes), dtype=bool)
+
+        # index of each kept node in the table, -1 if it is thrown away
+        node2row = np.full(len(nodes), -1, dtype=np.int64)
+        node2row[keep] = np.arange(keep.sum())
+        self.table = IntervalTable(
+            fnames, file_ix[keep], onsets[keep], offsets[keep], starts[keep],
+            ends[keep], ngram_ix[keep], phones + (self.phones,), self.ngrams,
+            transcribed=bool(self.gold_phn))
+
+        class_numbers = []
+        kept = set()
+        members = []
+        bounds = [0]
+        for class_number, class_nodes in classes:
+            # add class to discovered dict.
+            # if entry already exists, exit with an error
+            assert class_number not in kept, (
+                "Two Classes have the same number {}"
+                " in discovered classes".format(class_number))
+
+            rows = node2row[np.asarray(class_nodes, dtype=np.int64)]
+            rows = rows[rows >= 0]
+
+            # changed here too
+            # if len(classes) > 0:
+            if len(rows) > 1:
+                class_numbers.append(class_number)
+                kept.add(class_number)
+                members.append(rows)
+                bounds.append(bounds[-1] + len(rows))
+
+        members = (np.concatenate(members) if members
+                   else np.zeros(0, dtype=np.int64))
+        self.cluster_table = ClusterTable(
+            self.table, class_numbers, members, np.array(bounds))
 
         print("Discovered Class file read\n")
         print("{} unique intervals, {} clusters with {} nodes found".format(
-            len(self.intervals), len(self.clusters), sum([len(x) for k,x in self.clusters.items()])))
+            len(self.table), len(self.cluster_table), len(members)))
 
     def read_intervals_tree(self):
         """ Read discovered intervals as interval tree"""
@@ -141,8 +356,11 @@ class Disc():
                 self.intervals[fname])
 
     @staticmethod
-    def get_transcription(fname, disc_on, disc_off, gold_phn):
-        """ Given an interval, get its phone transcription"""
+    def get_transcription(fname, disc_on, disc_off, gold_phn, ovth=None):
+        """ Given an interval, get its phone transcription, the first and
+            last phones being kept according to the overlap threshold ovth
+            (the default one if None)
+        """
         # Get all covered phones
         covered = sorted(
             [phn for phn
@@ -155,11 +373,11 @@ class Disc():
         # Check if first and last phones are discovered
         keep_first = check_boundary(
             (covered[0][0], covered[0][1]),
-            (disc_on, disc_off))
+            (disc_on, disc_off), ovth)
 
         keep_last = check_boundary(
             (covered[-1][0], covered[-1][1]),
-            (disc_on, disc_off))
+            (disc_on, disc_off), ovth)
 
         if keep_first:
             token_ngram = [
@@ -179,3 +397,409 @@ class Disc():
 
         return tuple(token_ngram), tuple(ngram)
 
+    @staticmethod
+    def get_transcriptions(intervals, gold_phn, njobs=1, ovth=None):
+        """ Batch version of `get_transcription`: given a list of
+            (fname, onset, offset) intervals, return the list of their
+            (token_ngram, ngram) transcriptions.
+
+            The intervals are grouped by file and each file is transcribed
+            at once (see `transcribe_file`). With njobs > 1, the files are
+            shared between a pool of processes. The workers are forked after
+            the gold is loaded, so they read it without copying it, and
+            the results are put back in the order of the intervals.
+        """
+        transcriptions = [None] * len(intervals)
+
+        by_file = defaultdict(list)
+        for i, (fname, disc_on, disc_off) in enumerate(intervals):
+            by_file[fname].append(i)
+
+        # balance the shards by number of intervals
+        shards = balance({fname: len(ix) for fname, ix in by_file.items()},
+                         njobs)
+        tasks = [[(fname, [intervals[i] for i in by_file[fname]])
+                  for fname in shard] for shard in shards]
+        results = fork_map(_transcribe_shard, tasks, njobs,
+                           shared=(gold_phn, ovth))
+
+        for task, shard_trs in zip(tasks, results):
+            for (fname, _), file_trs in zip(task, shard_trs):
+                for i, trs in zip(by_file[fname], file_trs):
+                    transcriptions[i] = trs
+        return transcriptions
+
+    def get_phone_slices(self, intervals, gold_phn, njobs=1):
+        """ Transcribe a list of (fname, onset, offset) intervals as slices
+            of a flat buffer of phones, as in `get_transcriptions`.
+
+            The phones of each file of the gold are copied once in the
+            buffer, and the transcription of an interval is the slice of
+            the phones of its file it covers. The transcriptions of the
+            files whose gold isn't an :class:`Alignment` of non overlapping
+            phones are appended to the buffer one after the other.
+
+            Output
+            :return: starts, ends, the arrays of the bounds of the slice of
+                     each interval in the buffer, the array of the codes of
+                     the n-grams in self.ngrams, and the buffer, as a tuple
+                     of the arrays of the onsets, offsets and codes (in
+                     self.phones) of the phones
+        """
+        by_file, located = locate_intervals(intervals, gold_phn, njobs,
+                                            [self.config.overlap_th])
+        return self.assemble_slices(len(intervals), by_file, located,
+                                    gold_phn)
+
+    def assemble_slices(self, n_intervals, by_file, located, gold_phn, k=0):
+        """ Build the phone buffer and the slices of the intervals from
+            their location in the gold (see `get_phone_slices`)
+
+            Input
+            :param n_intervals: the number of intervals
+            :param by_file:     the dict of the indices of the intervals of
+                                each file
+            :param located:     the dict of the location of the intervals
+                                of each file, for each threshold, returned
+                                by `locate_intervals`
+            :param k:           the index of the threshold
+        """
+        starts = np.zeros(n_intervals, dtype=np.int64)
+        ends = np.zeros(n_intervals, dtype=np.int64)
+        ngram_ix = np.full(n_intervals, -1, dtype=np.int32)
+        buffer_on, buffer_off, buffer_codes = [], [], []
+        buffer_len = 0
+
+        # codes of the symbols of the gold in self.phones
+        recode = dict()
+        for fname in by_file:
+            slices, transcriptions = located[fname][k]
+            ix = np.array(by_file[fname], dtype=np.int64)
+            if slices is not None:
+                gold = gold_phn[fname]
+                if id(gold.symbols) not in recode:
+                    recode[id(gold.symbols)] = np.array(
+                        [self.phones.intern(symbol)
+                         for symbol in gold.symbols], dtype=np.int32)
+                symbols = [gold.symbols[c] for c in gold.codes.tolist()]
+                file_starts, file_ends = slices
+                ngram_ix[ix] = [
+                    self.ngrams.intern(tuple(symbols[s:e])) if e > s
+                    else -1
+                    for s, e in zip(file_starts.tolist(),
+                                    file_ends.tolist())]
+                starts[ix] = buffer_len + file_starts
+                ends[ix] = buffer_len + file_ends
+                buffer_on.append(gold.onsets)
+                buffer_off.append(gold.offsets)
+                buffer_codes.append(recode[id(gold.symbols)][gold.codes])
+                buffer_len += len(gold)
+                continue
+
+            for i, (token_ngram, ngram) in zip(ix.tolist(),
+                                               transcriptions):
+                if len(token_ngram) == 0:
+                    continue
+                ngram_ix[i] = self.ngrams.intern(ngram)
+                starts[i] = buffer_len
+                ends[i] = buffer_len + len(token_ngram)
+                buffer_on.append(np.array(
+                    [on for on, _, _ in token_ngram], dtype=float))
+                buffer_off.append(np.array(
+                    [off for _, off, _ in token_ngram], dtype=float))
+                buffer_codes.append(np.array(
+                    [self.phones.intern(phn) for _, _, phn in token_ngram],
+                    dtype=np.int32))
+                buffer_len += len(token_ngram)
+
+        if buffer_len == 0:
+            phones = (np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int32))
+        else:
+            phones = (np.concatenate(buffer_on), np.concatenate(buffer_off),
+                      np.concatenate(buffer_codes))
+        return starts, ends, ngram_ix, phones
+
+
+def expand_slices(slices, ix, n_intervals):
+    """ Given the slices (see `Disc.get_phone_slices`) of the intervals of
+        indices ix out of n_intervals, return the slices of all the
+        intervals, the other intervals getting an empty transcription
+    """
+    starts, ends, ngram_ix, phones = slices
+    all_starts = np.zeros(n_intervals, dtype=starts.dtype)
+    all_ends = np.zeros(n_intervals, dtype=ends.dtype)
+    all_ngram_ix = np.full(n_intervals, -1, dtype=ngram_ix.dtype)
+    all_starts[ix] = starts
+    all_ends[ix] = ends
+    all_ngram_ix[ix] = ngram_ix
+    return all_starts, all_ends, all_ngram_ix, phones
+
+
+def read_classes(disc_path):
+    """ Read the classes of a class file, and number the distinct
+        discovered intervals.
+
+        Output
+        :return: classes, the list of (class_number, list of node indices),
+                 and nodes, the list of the distinct (fname, onset, offset)
+    """
+    classes = []
+
+    # unique discovered intervals, (fname, onset, offset) -> index
+    nodes = dict()
+    for class_number, class_intervals in read_class_file(disc_path):
+        classes.append((class_number, [
+            nodes.setdefault(interval, len(nodes))
+            for interval in class_intervals]))
+    return classes, list(nodes)
+
+
+def read_nodes(nodes, dedups):
+    """ Read the nodes and clusters output by a UTD system as the class
+        file written by `write_disc_class_file` would be read: the
+        timestamps are rounded to 2 decimals, and the classes are numbered
+        from 1. Same output as `read_classes`.
+    """
+    classes = []
+    unique_nodes = dict()
+    for class_number, class_ in enumerate(dedups, start=1):
+        class_nodes = []
+        for element in class_:
+            fname, start, end = nodes[element]
+            # same timestamps as when written in a class file
+            disc_on = float('{:.2f}'.format(start))
+            disc_off = float('{:.2f}'.format(end))
+
+            # check that timestamps are correct
+            assert disc_off > disc_on, ("timestamps are not"
+             " correct\n {} {} {}\n".format(fname, disc_on, disc_off))
+
+            class_nodes.append(unique_nodes.setdefault(
+                (str(fname), disc_on, disc_off), len(unique_nodes)))
+        classes.append((str(class_number), class_nodes))
+    return classes, list(unique_nodes)
+
+
+def read_class_file(disc_path):
+    """ Parse a class file line by line, and yield each class as soon as it
+        is read, as (class_number, list of (fname, onset, offset)).
+
+        The file is not loaded in memory. That it ends with an empty line is
+        checked once it is read, after the last class is yielded.
+
+        Input
+        :param disc_path: path of the class file, '-' for stdin
+    """
+    if disc_path == '-':
+        yield from _parse_class_file(sys.stdin)
+    else:
+        with open(disc_path) as fin:
+            yield from _parse_class_file(fin)
+
+
+def _parse_class_file(fin):
+    """ Parse the lines of a class file, see `read_class_file`"""
+    class_intervals = []
+    lines = None
+    for lines in fin:
+        line = lines.strip()
+
+        # check what type of line is being read, either it begins with
+        # "Class", so it's the start of a new cluster or it contains an
+        # interval, so add it to current cluster or it is empty, so the
+        # previous cluster has been read entirely
+        if line[:5] == 'Class':  # class + number + ngram if available
+            class_number = line.strip().split(' ')[1]
+        elif len(line.split(' ')) == 3:
+            fname, start, end = line.split(' ')
+            disc_on, disc_off = float(start), float(end)
+
+            # check that timestamps are correct
+            assert disc_off > disc_on, ("timestamps are not"
+             " correct\n {} {} {}\n".format(fname, disc_on, disc_off))
+
+            class_intervals.append((fname, disc_on, disc_off))
+        elif len(line) == 0:
+            # empty line means that the class has ended
+            yield class_number, class_intervals
+
+            # re-initialize classes
+            class_intervals = list()
+        else:
+            raise ValueError('Line in discovered classes has wrong'
+                    ' format\n {}\n'.format(line))
+
+    # check that last line is empty
+    assert lines == '\n', ("discovered class file should end with"
+                           " and empty line")
+
+
+def locate_intervals(intervals, gold_phn, njobs=1, ovths=(None,)):
+    """ Locate the phones of the gold covered by each of a list of
+        (fname, onset, offset) intervals, for each overlap threshold of
+        ovths (None for the default threshold).
+
+        The intervals are grouped by file, and the files are shared between
+        a pool of njobs processes (see `Disc.get_transcriptions`). For the
+        files whose gold is an :class:`Alignment` of non overlapping phones,
+        the covered phones are slices of the phones of the file (see
+        `sweep_phone_slices`), the other files are transcribed interval by
+        interval.
+
+        Output
+        :return: by_file, a dict that gives the indices of the intervals
+                 of each file, and located, a dict that gives for each file
+                 the list of (slices, transcriptions) of each threshold,
+                 slices being (starts, ends) or None if the file is
+                 transcribed interval by interval
+    """
+    by_file = defaultdict(list)
+    for i, (fname, disc_on, disc_off) in enumerate(intervals):
+        by_file[fname].append(i)
+
+    # balance the shards by number of intervals
+    shards = balance({fname: len(ix) for fname, ix in by_file.items()},
+                     njobs)
+    tasks = [[(fname, [intervals[i] for i in by_file[fname]])
+              for fname in shard] for shard in shards]
+    results = fork_map(_locate_shard, tasks, njobs,
+                       shared=(gold_phn, list(ovths)))
+
+    located = dict()
+    for task, shard_results in zip(tasks, results):
+        for (fname, _), file_located in zip(task, shard_results):
+            located[fname] = file_located
+    return by_file, located
+
+
+def _locate_shard(shard):
+    """ Locate the phones covered by a list of (fname, intervals) in a
+        worker process, see `locate_intervals`
+    """
+    gold_phn, ovths = fork_shared()
+    located = []
+    for fname, file_intervals in shard:
+        if _can_slice(gold_phn[fname]):
+            located.append([
+                (slices, None) for slices in sweep_phone_slices(
+                    gold_phn[fname], file_intervals, ovths)])
+        else:
+            located.append([
+                (None, transcribe_file(gold_phn, fname, file_intervals,
+                                       ovth))
+                for ovth in ovths])
+    return located
+
+
+def _can_slice(gold):
+    """ Whether the gold of a file is an Alignment of non overlapping
+        phones, whose covered phones are contiguous
+    """
+    return (isinstance(gold, Alignment) and gold.sorted_offsets
+            and len(gold) > 0)
+
+
+def _transcribe_shard(shard):
+    """ Transcribe a list of (fname, intervals) in a worker process"""
+    gold_phn, ovth = fork_shared()
+    return [transcribe_file(gold_phn, fname, file_intervals, ovth)
+            for fname, file_intervals in shard]
+
+
+def transcribe_file(gold_phn, fname, intervals, ovth=None):
+    """ Transcribe all the (fname, onset, offset) intervals of a file.
+
+        The phones covered by all the intervals are found at once (see
+        `phone_slices`). Files whose gold isn't an :class:`Alignment` of non
+        overlapping phones are transcribed interval by interval.
+
+        Input
+        :param ovth: the overlap threshold, the default one if None
+        Output
+        :return: the list of the (token_ngram, ngram) transcriptions, in the
+                 same order as the intervals
+    """
+    gold = gold_phn[fname]
+    if not _can_slice(gold):
+        return [Disc.get_transcription(fname, disc_on, disc_off, gold_phn,
+                                       ovth)
+                for _, disc_on, disc_off in intervals]
+
+    # the token_ngrams share the (onset, offset, symbol) of the gold phones
+    symbols = [gold.symbols[c] for c in gold.codes.tolist()]
+    phones = list(zip(gold.onsets.tolist(), gold.offsets.tolist(), symbols))
+    starts, ends = phone_slices(gold, intervals, ovth)
+    transcriptions = []
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        if e <= s:
+            transcriptions.append((tuple(), tuple()))
+        else:
+            transcriptions.append((tuple(phones[s:e]), tuple(symbols[s:e])))
+    return transcriptions
+
+
+def phone_slices(gold, intervals, ovth=None):
+    """ Get the slice [start, end) of the phones of a file covered by each
+        of its (fname, onset, offset) intervals.
+
+        Input
+        :param gold:      the Alignment of the phones of the file, that
+                          must not contain overlapping phones
+        :param intervals: the list of (fname, onset, offset)
+        :param ovth:      the overlap threshold, the default one if None
+        Output
+        :return:          starts, ends, two arrays in the same order as
+                          the intervals, end <= start meaning that no phone
+                          is covered
+    """
+    return sweep_phone_slices(gold, intervals, [ovth])[0]
+
+
+def sweep_phone_slices(gold, intervals, ovths):
+    """ Get the slices of the phones covered by the intervals of a file
+        (see `phone_slices`) for several overlap thresholds.
+
+        The intervals are sorted by onset and walked against the sorted
+        arrays of the gold phones of the file (see `Alignment.search`), and
+        the overlaps of all the intervals with their first and last covered
+        phones are computed at once (see `edge_overlaps`). Only the
+        decision to keep these phones is taken for each threshold.
+
+        Output
+        :return:          the list of (starts, ends) of each threshold
+    """
+    disc_on = np.array([on for _, on, _ in intervals], dtype=float)
+    disc_off = np.array([off for _, _, off in intervals], dtype=float)
+    order = np.argsort(disc_on, kind='stable')
+    disc_on, disc_off = disc_on[order], disc_off[order]
+
+    # all the phones between lo and hi are covered
+    lo, hi = gold.search(disc_on, disc_off)
+    n_covered = hi - lo
+
+    # overlaps with the first and last phones
+    first = np.where(n_covered > 0, lo, 0)
+    last = np.where(n_covered > 0, hi - 1, 0)
+    first_overlaps = edge_overlaps(
+        gold.onsets[first], gold.offsets[first], disc_on, disc_off)
+    last_overlaps = edge_overlaps(
+        gold.onsets[last], gold.offsets[last], disc_on, disc_off)
+
+    all_slices = []
+    for ovth in ovths:
+        # check if first and last phones are discovered
+        keep_first = keep_boundaries(first_overlaps, ovth)
+        keep_last = keep_boundaries(last_overlaps, ovth)
+
+        # if only one phone is covered, it's both first and last, and
+        # only the check of the first phone counts
+        start = lo + (~keep_first).astype(int)
+        end = np.where(n_covered > 1, hi - (~keep_last).astype(int), hi)
+        end = np.maximum(start, end)
+
+        starts = np.empty(len(intervals), dtype=np.int64)
+        ends = np.empty(len(intervals), dtype=np.int64)
+        starts[order] = start
+        ends[order] = end
+        all_slices.append((starts, ends))
+    return all_slices
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""On-disk binary snapshots of parsed gold alignments
+
+Parsing the text alignments dominates the start-up time of short
+evaluations. Once parsed, the flat arrays of an alignment (see
+`Gold.read_alignment_arrays`) are saved as `.npy` files in a directory named
+after a hash of the content of the alignment file, so that later runs load
+them by memory mapping instead of parsing the text again. As the key depends
+on the content of the alignment, a modified alignment is parsed again.
+
+A snapshot directory contains:
+
+    fnames.npy   the sorted filenames
+    ptr.npy      intervals of fnames[i] are between ptr[i] and ptr[i + 1]
+    onsets.npy   onsets of all the intervals
+    offsets.npy  offsets of all the intervals
+    codes.npy    symbol codes of all the intervals
+    symbols.npy  the symbol of each code
+
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+# bump when the content or layout of the snapshots changes
+CACHE_VERSION = 1
+
+_ARRAYS = ('ptr', 'onsets', 'offsets', 'codes')
+
+
+def cache_key(gold_path, symbol_type=None):
+    """ Return the hash of the content of the alignment, of the way it
+        is read and of the version of the snapshot layout
+    """
+    digest = hashlib.sha1()
+    digest.update('tdev2 gold cache v{} {}\n'.format(
+        CACHE_VERSION, symbol_type).encode('utf8'))
+    with open(gold_path, 'rb') as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_arrays(cache_path, fnames, ptr, onsets, offsets, codes, symbols):
+    """ Write the snapshot of an alignment in the directory cache_path.
+
+        The snapshot is written in a temporary directory which is then
+        renamed, so that concurrent runs never read a partial snapshot.
+    """
+    parent = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix='.tmp-')
+    try:
+        np.save(os.path.join(tmp_path, 'fnames.npy'),
+                np.array(fnames, dtype=str))
+        np.save(os.path.join(tmp_path, 'symbols.npy'),
+                np.array(symbols, dtype=str))
+        for name, array in zip(_ARRAYS, (ptr, onsets, offsets, codes)):
+            np.save(os.path.join(tmp_path, name + '.npy'), array)
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # another run may have written the same snapshot in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(cache_path):
+            raise
+
+
+def load_arrays(cache_path):
+    """ Load the snapshot of an alignment. The numerical arrays are
+        memory mapped, so only the pages that are used are read.
+
+        Output
+        :return: fnames, ptr, onsets, offsets, codes, symbols, in the
+                 same format as `Gold.read_alignment_arrays`
+    """
+    fnames = np.load(os.path.join(cache_path, 'fnames.npy')).tolist()
+    symbols = np.load(os.path.join(cache_path, 'symbols.npy')).tolist()
+    # plain ndarray views on the memory maps, slicing memmap objects
+    # is much slower
+    ptr, onsets, offsets, codes = (
+        np.asarray(np.load(os.path.join(cache_path, name + '.npy'),
+                           mmap_mode='r'))
+        for name in _ARRAYS)
+    return fnames, ptr, onsets, offsets, codes, symbols
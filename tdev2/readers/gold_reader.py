@@ -8,13 +8,19 @@ detection)
 """
 
 import os
+import csv
+import numpy as np
 import pandas as pd
 import intervaltree
 
 from collections import defaultdict
 
 
-from tdev2.utils import read_config
+from tdev2.config import load_config
+from tdev2.readers import gold_cache
+from tdev2.readers.alignment import Alignment
+from tdev2.readers.symbols import SymbolTable
+from tdev2.utils import interval_union, covered_time
 # from tdev2 import config
 # ovth = config.overlap_th
 
@@ -24,38 +30,162 @@ from tdev2.utils import read_config
 
 
 class Gold():
-    def __init__(self, vad_path=None, wrd_path=None, phn_path=None, **kwargs):
+    def __init__(self, vad_path=None, wrd_path=None, phn_path=None,
+                 backend="array", cache_dir=None, config=None, **kwargs):
         """Object representing the gold.
 
         Contains the VAD,the word alignement and the phone alignment. The
         alignments can be stored as interval trees or as dictionnaries. The
         interval tree of the silences can also be stored.
 
+        The backend used to store the word and phone alignments is either
+        "array" (an :class:`Alignment` of sorted arrays per file) or
+        "intervaltree" (an `intervaltree.IntervalTree` per file). Both
+        are accessed the same way through `gold.words[fname]` and
+        `gold.phones[fname]`.
+
+        With the "array" backend, if a cache_dir is given, the parsed
+        alignments are saved there as binary snapshots (see
+        `tdev2.readers.gold_cache`), and loaded by memory mapping in
+        later runs.
+
+        The configuration of the evaluation is given as a Config, or read
+        from config_file, and is used by default by the Disc and the
+        measures evaluated against this gold.
+
         """
-        self.conf = read_config(kwargs['config_file'])
-        print(kwargs['config_file'])
+        self.config = load_config(config, kwargs.get('config_file'))
 
         # paths
         self.vad_path = vad_path
         self.wrd_path = wrd_path
         self.phn_path = phn_path
+        self.cache_dir = cache_dir
 
         # golds
         self.boundaries = None
         self.phones = None
         self.words = None
+        self.vad = None
+        self.silences = None
 
         # read alignments
+        if backend == "array":
+            read_gold = self.read_gold_array
+        elif backend == "intervaltree":
+            read_gold = self.read_gold_intervalTree
+        else:
+            raise ValueError('backend should be "array" or "intervaltree"'
+                             ' but is {}'.format(backend))
+        self.backend = backend
+
         self.words, _, self.ix2wrd, self.wrd2ix, self.boundaries = (
-            self.read_gold_intervalTree(self.wrd_path, "word"))
+            read_gold(self.wrd_path, "word"))
 
         if "SIL" in self.wrd2ix:
             print("WARNING: Word alignement contains silences, those will be counted as word by the evaluation.\n"
                   "You should keep them in the phone alignment but remove them from the word alignment.")
 
         self.phones, _, self.ix2phn, self.phn2ix, _ = (
-            self.read_gold_intervalTree(self.phn_path, "phone"))
-        # self.boundaries = self.get_boundaries()
+            read_gold(self.phn_path, "phone"))
+
+        # interned words and phones, the codes are those of the alignments
+        self.word_symbols = SymbolTable(
+            self.ix2wrd[ix] for ix in range(len(self.ix2wrd)))
+        self.phone_symbols = SymbolTable(
+            self.ix2phn[ix] for ix in range(len(self.ix2phn)))
+        if backend == "array":
+            self.index_word_transcriptions()
+
+        if self.vad_path is not None:
+            self.vad = self.read_vad(self.vad_path)
+            self.silences = self.get_silence_intervals(self.vad)
+
+    @property
+    def boundaries(self):
+        """The word boundaries, as a tuple of dicts {fname: set of offsets}
+        and {fname: set of onsets}. With the array backend, they are only
+        built from the words the first time they are asked (see
+        `get_boundaries`), so that loading a cached gold doesn't build
+        the sets.
+
+        """
+        if self._boundaries is None and self.words is not None:
+            self._boundaries = self.get_boundaries()
+        return self._boundaries
+
+    @boundaries.setter
+    def boundaries(self, boundaries):
+        self._boundaries = boundaries
+
+    def get_boundaries(self):
+        """Compute the boundaries of the words of each file (see
+        `boundaries`)
+
+        """
+        boundaries_up = defaultdict(set)
+        boundaries_down = defaultdict(set)
+        for fname, words in self.words.items():
+            if isinstance(words, Alignment):
+                boundaries_up[fname] = set(words.offsets.tolist())
+                boundaries_down[fname] = set(words.onsets.tolist())
+            else:
+                boundaries_up[fname] = {float(off) for _, off, _ in words}
+                boundaries_down[fname] = {float(on) for on, _, _ in words}
+        return boundaries_up, boundaries_down
+
+    def read_vad(self, vad_path):
+        """Read the VAD, with fields: file start end, one speech segment
+        per line.
+
+        Returns a dict with the file as a key, and the arrays of the
+        onsets and offsets of the speech of the file, sorted, the
+        overlapping segments being merged.
+
+        """
+        if not os.path.isfile(vad_path):
+            raise ValueError('{}: File Not Found'.format(vad_path))
+
+        try:
+            df = pd.read_csv(
+                vad_path, sep=' ', header=None, encoding='utf8',
+                names=['file', 'start', 'end'], dtype={'file': str},
+                quoting=csv.QUOTE_NONE, float_precision='round_trip')
+        except pd.errors.EmptyDataError:
+            return dict()
+        except pd.errors.ParserError as err:
+            raise ValueError(
+                'format of vad should be:\n'
+                '\tfilename onset offset\n'
+                'but vad contains wrongly formated line:\n'
+                '{}'.format(err))
+
+        start = pd.to_numeric(df['start'], errors='coerce').to_numpy(float)
+        end = pd.to_numeric(df['end'], errors='coerce').to_numpy(float)
+        if (np.isnan(start) | np.isnan(end)).any():
+            raise ValueError('format of vad should be:\n'
+                             '\tfilename onset offset')
+
+        file_ix, fnames = pd.factorize(df['file'], sort=True)
+        order = np.argsort(file_ix, kind='stable')
+        ptr = np.searchsorted(file_ix[order], np.arange(len(fnames) + 1))
+        return {fname: interval_union(start[order[ptr[i]:ptr[i + 1]]],
+                                      end[order[ptr[i]:ptr[i + 1]]])
+                for i, fname in enumerate(fnames)}
+
+    def index_word_transcriptions(self):
+        """For each gold word, store the codes of the phones it covers,
+        sorted by onset, in the `transcriptions` column of the word
+        alignment, so that the phonetic transcription of a word is obtained
+        by index instead of querying the phone alignment. The codes are
+        decoded with `self.ix2phn`.
+
+        Words of files that are not in the phone alignment are not indexed.
+
+        """
+        for fname, words in self.words.items():
+            if fname in self.phones:
+                words.transcriptions = words.transcribe(self.phones[fname])
 
     def read_gold_dict(self, gold_path):
         """Read the gold phoneme file with fields: speaker/file start end annotation
@@ -113,11 +243,10 @@ class Gold():
 
         return gold, ix2symbols, symbol2ix
 
-    def read_gold_intervalTree(self, gold_path, symbol_type=None):
-        '''Read the gold alignment and build an interval tree (O( log(n) )).
-        After that, take each found interval, search for its overlaps
-        (O( log(n) + m), m being the number of results found),
-        and check if we want to keep each interval.
+    def read_alignment(self, gold_path, symbol_type=None):
+        """Read the gold alignment as a list of (onset, offset, symbol)
+        tuples for each filename.
+
         INPUT
         =====
         - gold : the path to the gold alignment
@@ -126,23 +255,19 @@ class Gold():
                        if "phone", keep them and raise warning if none are found
         OUTPUT
         ======
-        - gold: a dict {fname: intervaltree} which returns the interval tree
-                of the gold phones for each file
-        - ix2symbols: a dict that returns the symbols for each index of encoding
-                      (to compute the ned, we assign numbers to symbols)
-        '''
+        - intervals: a dict {fname: list of (onset, offset, symbol)}
+        - symbols: the set of all the symbols found in the alignment
+        - boundaries: a tuple of dicts {fname: set of offsets} and
+                      {fname: set of onsets}
+        """
         if not os.path.isfile(gold_path):
             raise ValueError('{}: File Not Found'.format(gold_path))
 
-        # read the gold and create a list of tuples for each filename, then create an interval
-        # tree from this list of tuple.
         intervals = defaultdict(list)
-        gold = dict()
         symbols = set() # create a set of all the available symbols
-        transcription = dict() # create dict that returns the transcription for an interval
         boundaries_up = defaultdict(set)
         boundaries_down = defaultdict(set)
-        
+
         # keep flag to check that phone alignement contains silences
         sil_flag = True
         with open(gold_path, 'r') as fin:
@@ -167,28 +292,199 @@ class Gold():
                     continue
                 elif symbol_type == "phone" and symbol == "SIL":
                     sil_flag = True
-                transcription[(fname, float(on), float(off))] = symbol
                 symbols.add(symbol)
                 intervals[fname].append((float(on), float(off), symbol))
                 boundaries_up[fname].add(float(off))
                 boundaries_down[fname].add(float(on))
 
-            # for each filename, create an interval tree
-            for fname in intervals:
-                gold[fname] = intervaltree.IntervalTree.from_tuples(
-                    intervals[fname])
-
         # raise warning if phone alignment doesn't contain silences
         if symbol_type == "phone" and not sil_flag:
             raise UserWarning("phone alignment does not contain"
                     " silences, which are necessary for correct"
                     " evaluation.")
+
+        return intervals, symbols, (boundaries_up, boundaries_down)
+
+    def read_gold_intervalTree(self, gold_path, symbol_type=None):
+        '''Read the gold alignment and build an interval tree (O( log(n) )).
+        After that, take each found interval, search for its overlaps
+        (O( log(n) + m), m being the number of results found),
+        and check if we want to keep each interval.
+        INPUT
+        =====
+        - gold : the path to the gold alignment
+        - symbol_type: string, "word" or "phone",
+                       if "word", don't  keep the silences if some are found
+                       if "phone", keep them and raise warning if none are found
+        OUTPUT
+        ======
+        - gold: a dict {fname: intervaltree} which returns the interval tree
+                of the gold phones for each file
+        - ix2symbols: a dict that returns the symbols for each index of encoding
+                      (to compute the ned, we assign numbers to symbols)
+        '''
+        intervals, symbols, boundaries = self.read_alignment(
+            gold_path, symbol_type)
+
+        # for each filename, create an interval tree, and create dict that
+        # returns the transcription for an interval
+        gold = dict()
+        transcription = dict()
+        for fname in intervals:
+            gold[fname] = intervaltree.IntervalTree.from_tuples(
+                intervals[fname])
+            for on, off, symbol in intervals[fname]:
+                transcription[(fname, on, off)] = symbol
+
         # create a mapping index -> symbols for the phones
         symbol2ix = {v: k for k, v in enumerate(list(symbols))}
         ix2symbols = dict((v, k) for k, v in symbol2ix.items())
 
         return (gold, transcription, ix2symbols,
-                symbol2ix, (boundaries_up, boundaries_down))
+                symbol2ix, boundaries)
+
+    def read_alignment_arrays(self, gold_path, symbol_type=None):
+        """Read the gold alignment as flat arrays, sorted by filename and
+        onset, using the pandas C parser.
+
+        INPUT
+        =====
+        - gold : the path to the gold alignment
+        - symbol_type: string, "word" or "phone",
+                       if "word", don't  keep the silences if some are found
+        OUTPUT
+        ======
+        - fnames: the sorted list of the filenames
+        - ptr: array of size len(fnames) + 1, the intervals of fnames[i]
+               are stored between ptr[i] and ptr[i + 1]
+        - onsets, offsets, codes: arrays of the onsets, offsets and symbol
+                                  codes of all the intervals
+        - ix2symbol_list: the list of the symbols, sorted, so that the
+                          encoding doesn't depend on the run
+        """
+        if not os.path.isfile(gold_path):
+            raise ValueError('{}: File Not Found'.format(gold_path))
+
+        try:
+            df = pd.read_csv(
+                gold_path, sep=' ', header=None, encoding='utf8',
+                names=['file', 'start', 'end', 'symbol'],
+                dtype={'file': str, 'symbol': str}, keep_default_na=False,
+                quoting=csv.QUOTE_NONE, float_precision='round_trip')
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame({'file': [], 'start': [], 'end': [],
+                               'symbol': []})
+        except pd.errors.ParserError as err:
+            raise ValueError(
+                'format of alignement should be:\n'
+                '\tfilename onset offset symbol\n'
+                'but alignment contains wrongly formated line:\n'
+                '{}'.format(err))
+
+        # a missing or non numerical field shows as a NaN
+        start = pd.to_numeric(df['start'], errors='coerce').to_numpy(float)
+        end = pd.to_numeric(df['end'], errors='coerce').to_numpy(float)
+        bad = np.isnan(start) | np.isnan(end) | (df['symbol'] == '').to_numpy()
+        if bad.any():
+            raise ValueError(
+                'format of alignement should be:\n'
+                '\tfilename onset offset symbol\n'
+                'but alignment contains wrongly formated line:\n'
+                '{}'.format(' '.join(map(str, df[bad].iloc[0]))))
+
+        # check timestamps are in correct order
+        wrong = np.flatnonzero(~(end > start))
+        assert len(wrong) == 0, ("timestamps are not"
+                " correct\n {}".format(' '.join(map(str, df.iloc[wrong[0]]))))
+
+        # If word alignement, don't keep silences, else, keep them.
+        if symbol_type == "word":
+            keep = (df['symbol'] != 'SIL').to_numpy()
+            df, start, end = df[keep], start[keep], end[keep]
+
+        file_ix, fnames = pd.factorize(df['file'], sort=True)
+        codes, ix2symbol_list = pd.factorize(df['symbol'], sort=True)
+
+        # sort by file and onset, and as in an interval tree, only keep
+        # duplicated intervals once
+        order = np.lexsort((codes, end, start, file_ix))
+        file_ix, start, end, codes = (
+            file_ix[order], start[order], end[order], codes[order])
+        dup = np.zeros(len(order), dtype=bool)
+        dup[1:] = ((file_ix[1:] == file_ix[:-1]) & (start[1:] == start[:-1])
+                   & (end[1:] == end[:-1]) & (codes[1:] == codes[:-1]))
+        file_ix, start, end, codes = (
+            file_ix[~dup], start[~dup], end[~dup], codes[~dup])
+
+        ptr = np.searchsorted(file_ix, np.arange(len(fnames) + 1))
+        return (list(fnames), ptr, start, end, codes.astype(np.int32),
+                list(ix2symbol_list))
+
+    def read_alignment_arrays_cached(self, gold_path, symbol_type=None):
+        """Same as `read_alignment_arrays`, but load the arrays from the
+        snapshot of the alignment in self.cache_dir if it exists, and
+        write it otherwise.
+        """
+        if self.cache_dir is None:
+            return self.read_alignment_arrays(gold_path, symbol_type)
+        if not os.path.isfile(gold_path):
+            raise ValueError('{}: File Not Found'.format(gold_path))
+
+        cache_path = os.path.join(
+            self.cache_dir, gold_cache.cache_key(gold_path, symbol_type))
+        if os.path.isdir(cache_path):
+            return gold_cache.load_arrays(cache_path)
+
+        arrays = self.read_alignment_arrays(gold_path, symbol_type)
+        try:
+            gold_cache.save_arrays(cache_path, *arrays)
+        except OSError as err:
+            print("WARNING: could not write gold cache in {}: {}".format(
+                self.cache_dir, err))
+        return arrays
+
+    def read_gold_array(self, gold_path, symbol_type=None):
+        '''Read the gold alignment and store it, for each file, as arrays
+        of onsets, offsets and symbol codes sorted by onset (see
+        :class:`Alignment`). Overlap queries are done by binary search
+        (O( log(n) + m), m being the number of results found).
+        INPUT
+        =====
+        - gold : the path to the gold alignment
+        - symbol_type: string, "word" or "phone",
+                       if "word", don't  keep the silences if some are found
+        OUTPUT
+        ======
+        - gold: a dict {fname: Alignment} which returns the alignment
+                of the gold symbols for each file
+        - transcription: None, the transcription of each interval is
+                         stored in the Alignment
+        - ix2symbols: a dict that returns the symbols for each index of encoding
+        - symbol2ix: a dict that returns the index of encoding of each symbol
+        - boundaries: None, they are built from the alignment when they
+                      are first asked (see `Gold.boundaries`)
+        '''
+        fnames, ptr, onsets, offsets, codes, ix2symbol_list = (
+            self.read_alignment_arrays_cached(gold_path, symbol_type))
+        symbol2ix = {v: k for k, v in enumerate(ix2symbol_list)}
+        ix2symbols = dict(enumerate(ix2symbol_list))
+
+        # check at once if the offsets of each file are sorted: find the
+        # decreasing offsets that are not the first interval of a file
+        unsorted = np.flatnonzero(offsets[1:] < offsets[:-1]) + 1
+        file_ix = np.searchsorted(ptr, unsorted, side='right') - 1
+        unsorted_files = set(file_ix[ptr[file_ix] != unsorted].tolist())
+
+        # each alignment is a view on the flat arrays
+        gold = dict()
+        ptr = ptr.tolist()
+        for i, fname in enumerate(fnames):
+            on, off = ptr[i], ptr[i + 1]
+            gold[fname] = Alignment(onsets[on:off], offsets[on:off],
+                                    codes[on:off], ix2symbol_list,
+                                    sorted_offsets=i not in unsorted_files)
+
+        return gold, None, ix2symbols, symbol2ix, None
 
     def get_intervals(fname, on, off, gold, transcription):
         """ Given a filename and an interval, retrieve the list of
@@ -227,5 +523,62 @@ class Gold():
         return cov_int, trs
 
     def get_silence_intervals(self, vad):
-        ''' Compute interval tree of silences '''
-        pass
+        """Compute the silences of each file of the VAD: the gaps between
+        its speech segments, and before the first one.
+
+        Returns a dict with the file as a key, and the arrays of the
+        onsets and offsets of the silences of the file, sorted.
+
+        """
+        silences = dict()
+        for fname, (onsets, offsets) in vad.items():
+            sil_on = np.concatenate([[0.], offsets[:-1]])
+            sil_off = onsets
+            keep = sil_off > sil_on
+            silences[fname] = (sil_on[keep], sil_off[keep])
+        return silences
+
+    def speech_fractions(self, fnames, onsets, offsets):
+        """Vectorized query of the VAD: return the array of the fraction of
+        each interval (fnames[i], onsets[i], offsets[i]) that is speech.
+
+        The fraction is NaN for the intervals of the files that are not in
+        the VAD, and for all the intervals if the gold has no VAD.
+
+        """
+        onsets = np.asarray(onsets, dtype=float)
+        offsets = np.asarray(offsets, dtype=float)
+        fractions = np.full(len(onsets), np.nan)
+        if self.vad is None or len(onsets) == 0:
+            return fractions
+
+        # the intervals of the i-th file are order[ptr[i]:ptr[i + 1]]
+        names, file_ix = np.unique(np.asarray(fnames, dtype=str),
+                                   return_inverse=True)
+        order = np.argsort(file_ix, kind='stable')
+        ptr = np.searchsorted(file_ix[order], np.arange(len(names) + 1))
+        durations = offsets - onsets
+        for i, fname in enumerate(names):
+            if fname not in self.vad:
+                continue
+            ix = order[ptr[i]:ptr[i + 1]]
+            speech_on, speech_off = self.vad[fname]
+            covered = covered_time(speech_on, speech_off,
+                                   onsets[ix], offsets[ix])
+            fractions[ix] = np.divide(covered, durations[ix],
+                                      out=np.zeros(len(ix)),
+                                      where=durations[ix] > 0)
+        return fractions
+
+    def in_speech(self, fnames, onsets, offsets, min_fraction=0.):
+        """Vectorized query of the VAD: return a boolean array which is
+        True where more than min_fraction of the interval is speech, or
+        where it isn't known (the file is not in the VAD).
+
+        With the default min_fraction, the intervals that are entirely
+        outside the speech are False. The out of speech intervals are
+        ~in_speech(...).
+
+        """
+        fractions = self.speech_fractions(fnames, onsets, offsets)
+        return np.isnan(fractions) | (fractions > min_fraction)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""Columnar storage of the discovered intervals
+
+An :class:`IntervalTable` stores the distinct discovered intervals as a few
+NumPy columns instead of python tuples: the code of the file name, the
+onset, the offset, the code of the n-gram, and the bounds [start, end) of
+the transcription of the interval in a flat buffer of phones (onsets,
+offsets and codes). When the gold is an :class:`Alignment`, the buffer holds
+the phones of each file once, and the transcriptions of the intervals are
+slices of it, so a discovered interval takes a few tens of bytes whatever the
+length of its transcription.
+
+The clusters are stored as a :class:`ClusterTable`: the flat array of the
+rows of the intervals of all the clusters, and the bounds of each cluster in
+this array.
+
+Both tables can be read with the tuple API used by the measures: iterating
+over an IntervalTable gives the (fname, onset, offset, token_ngram, ngram)
+tuples of `Disc.intervals`, and a ClusterTable is a read-only mapping from
+the class numbers to the lists of these tuples, as `Disc.clusters`. The
+tuples are built when they are read, and are not kept.
+
+"""
+
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+
+class IntervalTable(Sequence):
+    def __init__(self, fnames, file_ix, onsets, offsets, starts, ends,
+                 ngram_ix, phones, ngrams, transcribed=True):
+        """Table of the distinct discovered intervals.
+
+        :param fnames:   SymbolTable of the file names
+        :param file_ix:  array of the code of the file of each interval
+        :param onsets:   array of the onsets
+        :param offsets:  array of the offsets
+        :param starts:   array of the index in the phone buffer of the first
+                         phone of the transcription of each interval
+        :param ends:     array of the index after its last phone
+        :param ngram_ix: array of the code of the n-gram of each interval
+        :param phones:   the phone buffer, as a tuple (onsets, offsets,
+                         codes, symbols) of three arrays and a SymbolTable
+        :param ngrams:   SymbolTable of the n-grams
+        :param transcribed: whether the intervals were transcribed, their
+                            token_ngram and ngram are None otherwise
+        """
+        self.fnames = fnames
+        self.file_ix = file_ix
+        self.onsets = onsets
+        self.offsets = offsets
+        self.starts = starts
+        self.ends = ends
+        self.ngram_ix = ngram_ix
+        self.phones = phones
+        self.ngrams = ngrams
+        self.transcribed = transcribed
+
+    def __len__(self):
+        return len(self.onsets)
+
+    def __repr__(self):
+        return 'IntervalTable({} intervals)'.format(len(self))
+
+    @property
+    def nbytes(self):
+        """ Number of bytes of the columns and of the phone buffer"""
+        return (sum(column.nbytes for column in (
+                    self.file_ix, self.onsets, self.offsets, self.starts,
+                    self.ends, self.ngram_ix))
+                + sum(column.nbytes for column in self.phones[:3]))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('interval index out of range')
+        return self.rows([i])[0]
+
+    def __iter__(self):
+        return iter(self.rows(range(len(self))))
+
+    def rows(self, ix):
+        """ Return the list of the (fname, onset, offset, token_ngram, ngram)
+            tuples of the intervals of indices ix
+        """
+        ix = np.asarray(ix, dtype=np.int64)
+        fnames = self.fnames
+        interval_keys = zip(
+            [fnames[f] for f in self.file_ix[ix].tolist()],
+            self.onsets[ix].tolist(), self.offsets[ix].tolist())
+        if not self.transcribed:
+            return [key + (None, None) for key in interval_keys]
+
+        ngrams = self.ngrams
+        ngram_ix = self.ngram_ix[ix].tolist()
+
+        # gather the phones of all the transcriptions at once, the
+        # transcription of the i-th interval being phones[bounds[i]:
+        # bounds[i + 1]]
+        phone_ix, lengths = self.phone_ix(ix)
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        phn_on, phn_off, phn_codes, symbols = self.phones
+        phones = list(zip(phn_on[phone_ix].tolist(),
+                          phn_off[phone_ix].tolist(),
+                          [symbols[c] for c in phn_codes[phone_ix].tolist()]))
+        bounds = bounds.tolist()
+        return [key + (tuple(phones[s:e]), ngrams[n])
+                for key, s, e, n in zip(interval_keys, bounds[:-1],
+                                        bounds[1:], ngram_ix)]
+
+    def phone_ix(self, ix=None):
+        """ Return the indices in the phone buffer of the phones of the
+            transcriptions of the intervals of indices ix (all the
+            intervals if None), one transcription after the other, and the
+            array of the number of phones of each transcription
+        """
+        if ix is None:
+            starts, ends = self.starts, self.ends
+        else:
+            starts, ends = self.starts[ix], self.ends[ix]
+        lengths = ends - starts
+        bounds = np.cumsum(lengths) - lengths
+        return (np.arange(lengths.sum(), dtype=np.int64)
+                + np.repeat(starts - bounds, lengths)), lengths
+
+    def boundaries(self):
+        """ Return the codes of the files (in self.fnames), and the onsets
+            of the first phone and the offsets of the last phone of the
+            transcriptions of the intervals that have one, as three arrays
+        """
+        has_phones = self.ends > self.starts
+        if not self.transcribed:
+            has_phones[:] = False
+        phn_on, phn_off = self.phones[0], self.phones[1]
+        return (self.file_ix[has_phones], phn_on[self.starts[has_phones]],
+                phn_off[self.ends[has_phones] - 1])
+
+
+class ClusterTable(Mapping):
+    def __init__(self, table, class_numbers, members, bounds):
+        """Read-only mapping from the class numbers to their intervals.
+
+        :param table:         the IntervalTable of the intervals
+        :param class_numbers: list of the class numbers, in file order
+        :param members:       array of the rows of the intervals of all the
+                              clusters, one cluster after the other
+        :param bounds:        array of the len(class_numbers) + 1 bounds of
+                              the clusters in members
+        """
+        self.table = table
+        self.class_numbers = class_numbers
+        self.class2ix = {class_nb: ix
+                         for ix, class_nb in enumerate(class_numbers)}
+        self.members = members
+        self.bounds = bounds
+
+    def __len__(self):
+        return len(self.class_numbers)
+
+    def __iter__(self):
+        return iter(self.class_numbers)
+
+    def __contains__(self, class_nb):
+        return class_nb in self.class2ix
+
+    def __getitem__(self, class_nb):
+        ix = self.class2ix[class_nb]
+        return self.table.rows(
+            self.members[self.bounds[ix]:self.bounds[ix + 1]])
+
+    def __repr__(self):
+        return 'ClusterTable({} clusters)'.format(len(self))
+
+    @property
+    def nbytes(self):
+        """ Number of bytes of the arrays of the cluster members"""
+        return self.members.nbytes + self.bounds.nbytes
+
+    def sizes(self):
+        """ Return the array of the number of intervals of each cluster"""
+        return np.diff(self.bounds)
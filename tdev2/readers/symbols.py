@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Interning of symbols as small integers
+
+A :class:`SymbolTable` gives a distinct integer code to each symbol it sees,
+in order of appearance, and returns the symbol of each code. It is used for
+the phones and words of the gold (the codes stored in the alignments), and
+for the n-grams of the discovered intervals: the n-grams are interned once
+when the class file is read, so that all the intervals with the same
+transcription share the same tuple, and the measures can key their
+counters and sets by code instead of hashing tuples of strings again.
+
+The symbols are decoded back only when the results are written.
+
+"""
+
+
+class SymbolTable():
+    def __init__(self, symbols=()):
+        """Table of interned symbols.
+
+        :param symbols: iterable of symbols to intern first, the i-th
+                        distinct symbol gets the code i
+        """
+        self.symbols = []
+        self.symbol2ix = dict()
+        for symbol in symbols:
+            self.intern(symbol)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.symbol2ix
+
+    def __getitem__(self, ix):
+        return self.symbols[ix]
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __repr__(self):
+        return 'SymbolTable({} symbols)'.format(len(self))
+
+    def intern(self, symbol):
+        """ Return the code of a symbol, adding it to the table if needed"""
+        ix = self.symbol2ix.setdefault(symbol, len(self.symbols))
+        if ix == len(self.symbols):
+            self.symbols.append(symbol)
+        return ix
+
+    def index(self, symbol, default=None):
+        """ Return the code of a symbol, or default if it isn't interned"""
+        return self.symbol2ix.get(symbol, default)
+
+    def canonical(self, symbol):
+        """ Return the interned object equal to symbol, so that equal
+            symbols (e.g. n-gram tuples) are stored only once
+        """
+        return self.symbols[self.intern(symbol)]
+
+    def encode(self, sequence):
+        """ Return the tuple of codes of a sequence of symbols, interning
+            the new symbols
+        """
+        return tuple(self.intern(symbol) for symbol in sequence)
+
+    def decode(self, codes):
+        """ Return the tuple of symbols of a sequence of codes"""
+        return tuple(self.symbols[ix] for ix in codes)
@@ -5,6 +5,12 @@
                    at least either 50% of the phone duration
                    or 30ms of the phone duration.
 
+   check_boundaries: vectorized version of check_boundary, for
+                   arrays of phones and discovered intervals.
+                   The overlaps are computed by edge_overlaps, and
+                   compared to the threshold by keep_boundaries, so that
+                   they can be compared to several thresholds.
+
    overlap:        return the percentage of overlap and the
                    duration (in seconds) of the overlap
                    between two intervals.
@@ -15,45 +21,142 @@
 """
 
 import os
-import json
-# from tdev2 import config
-# ovth = config.overlap_th
+import sys
+import copy
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from tdev2.config import Config
 
 
 def read_config(config_file):
-    global ovth, excluded_units, discoverable_th
+    """ Read a .json config file as a dict. The configuration is now passed
+        explicitly as a Config (see `tdev2.config.Config.read`).
+    """
+    return Config.read(config_file)._asdict()
+
+
+# data published to the workers forked by fork_map
+_fork_shared = None
+# whether this process is a worker forked by fork_map
+_fork_worker = False
 
-    with open(config_file, 'r') as f:
-        conf = json.load(f)
 
-    ovth = conf['overlap_th']
-    excluded_units = conf['excluded_units']
-    discoverable_th = conf['discoverable_th']
+def can_fork():
+    return 'fork' in mp.get_all_start_methods()
 
-    print('*** Config file read, ovth {} ***'.format(ovth))
-    return conf
+
+def fork_shared():
+    """ Return the data shared with the workers of the current fork_map"""
+    return _fork_shared
+
+
+def fork_map(func, tasks, njobs, shared=None, on_crash=None):
+    """ Apply func to each task on a pool of njobs forked processes, and
+        return the results in the order of the tasks.
+
+        shared is published before the workers are forked, so they can
+        read it with fork_shared() without it being pickled for each task
+        (it is shared copy-on-write). With njobs <= 1, or if processes can't
+        be forked on this platform, the tasks are run in this process. The
+        tasks are also run in this process when it is itself a worker of a
+        fork_map (e.g. a measure computed concurrently with the others), so
+        that no more than njobs processes are used.
+
+        If a worker dies (e.g. killed when out of memory), the pool is
+        broken and the tasks that were not done are run again, each on its
+        own worker, so that only the tasks that crash are lost. The result
+        of such a task is on_crash(task, exc), exc being the
+        BrokenProcessPool error, which is raised if on_crash is None.
+    """
+    global _fork_shared
+    if njobs > 1 and len(tasks) > 1 and not can_fork():
+        print("WARNING: processes can't be forked on this platform,"
+              " running in a single process")
+        njobs = 1
+    if _fork_worker:
+        njobs = 1
+
+    previous, _fork_shared = _fork_shared, shared
+    try:
+        if njobs <= 1 or len(tasks) <= 1:
+            return [func(task) for task in tasks]
+        with _fork_pool(min(njobs, len(tasks))) as pool:
+            futures = [pool.submit(func, task) for task in tasks]
+            results = []
+            for task, future in zip(tasks, futures):
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool:
+                    results.append(_run_alone(func, task, on_crash))
+            return results
+    finally:
+        _fork_shared = previous
+
+
+def _fork_pool(n_workers):
+    return ProcessPoolExecutor(n_workers, mp_context=mp.get_context('fork'),
+                               initializer=_start_fork_worker)
+
+
+def _start_fork_worker():
+    global _fork_worker
+    _fork_worker = True
+
+
+def _run_alone(func, task, on_crash):
+    """ Run a task of a broken pool on its own worker"""
+    with _fork_pool(1) as pool:
+        try:
+            return pool.submit(func, task).result()
+        except BrokenProcessPool as exc:
+            if on_crash is None:
+                raise
+            return on_crash(task, exc)
+
+
+def balance(sizes, n_chunks):
+    """ Split the keys of sizes in at most n_chunks chunks of balanced total
+        size, by putting the biggest keys first in the smallest chunk.
+        Keys are sorted so the chunks don't depend on the order of sizes.
+    """
+    n_chunks = max(1, n_chunks)
+    chunks = [[] for _ in range(n_chunks)]
+    chunk_sizes = [0] * n_chunks
+    for key in sorted(sizes, key=lambda k: (-sizes[k], k)):
+        smallest = chunk_sizes.index(min(chunk_sizes))
+        chunks[smallest].append(key)
+        chunk_sizes[smallest] += sizes[key]
+    return [chunk for chunk in chunks if chunk]
 
 
 def write_disc_class_file(dedups_, nodes_, outfile):
-    # creating the output class used by eval
-    t_ = ''
-    for n, class_ in enumerate(dedups_, start=1):
-        t_ += 'Class {}\n'.format(n)
-        for element in class_:
-            file_, start_, end_ = nodes_[element]
-            t_ += '{} {:.2f} {:.2f}\n'.format(file_, start_, end_)
-        t_ += '\n'
+    """ Write the clusters in the class file format read by Disc, line by
+        line, to outfile or to stdout if outfile is None
+    """
+    def _write(output):
+        for n, class_ in enumerate(dedups_, start=1):
+            output.write('Class {}\n'.format(n))
+            for element in class_:
+                file_, start_, end_ = nodes_[element]
+                output.write('{} {:.2f} {:.2f}\n'.format(file_, start_, end_))
+            output.write('\n')
 
     # stdout or save to file file
     if outfile is None:
-        print(t_)
+        _write(sys.stdout)
+        sys.stdout.write('\n')
     else:
         with open(outfile, 'w') as output:
-            output.write(t_) 
+            _write(output)
 
 
 
-def zr2tde(nodesfile, dedupsfile, outfile):
+def read_zr17(nodesfile, dedupsfile):
+    """ Read the nodes and the clusters (dedups) output by the zr17 system.
+        The nodes are numbered from 1.
+    """
     # Decode nodes file
     nodes_ = dict()
     with open(nodesfile) as nodes:
@@ -73,23 +176,39 @@ def zr2tde(nodesfile, dedupsfile, outfile):
             except:
                 raise
 
-    write_disc_class_file(dedups_, nodes_, outfile)
+    return nodes_, dedups_
+
 
+def zr2tde(nodesfile, dedupsfile, outfile):
+    nodes_, dedups_ = read_zr17(nodesfile, dedupsfile)
+    write_disc_class_file(dedups_, nodes_, outfile)
 
 
-def zrexp2tde(exp_path):
 
+def zrexp2nodes(exp_path):
+    """ Return the nodes and clusters of a zr17 experiment, and the path
+        of its class file
+    """
     nodesfile = os.path.join(exp_path, 'results','master_graph.nodes')
     dedupsfile = os.path.join(exp_path, 'results','master_graph.dedups')
     outfile = os.path.join(exp_path, 'results','master_graph.class')
-    zr2tde(nodesfile, dedupsfile, outfile)
+    nodes_, dedups_ = read_zr17(nodesfile, dedupsfile)
+    return nodes_, dedups_, outfile
+
+
+def zrexp2tde(exp_path):
+
+    nodes_, dedups_, outfile = zrexp2nodes(exp_path)
+    write_disc_class_file(dedups_, nodes_, outfile)
     
     return outfile 
 
 
 
-def sdtw2tde(postdisc_path):
-
+def sdtw2nodes(postdisc_path):
+    """ Return the nodes and clusters of a sdtw experiment, and the path
+        of its class file
+    """
     import pandas as pd
     import pickle 
 
@@ -99,10 +218,18 @@ def sdtw2tde(postdisc_path):
     nodes_df = pd.read_pickle(os.path.join(postdisc_path,'nodes.pkl'))
     subset = nodes_df[['filename','start','end']]
     # very important, in order to let index start from 1
-    nodes_ = [None] + [tuple(x) for x in subset.to_numpy()] 
+    nodes_ = [None] + list(zip(subset['filename'].tolist(),
+                               subset['start'].tolist(),
+                               subset['end'].tolist()))
 
     outfile = os.path.join(postdisc_path,'master_graph.class')
 
+    return nodes_, dedups_, outfile
+
+
+def sdtw2tde(postdisc_path):
+
+    nodes_, dedups_, outfile = sdtw2nodes(postdisc_path)
     write_disc_class_file(dedups_, nodes_, outfile)
 
     return outfile
@@ -110,18 +237,28 @@ def sdtw2tde(postdisc_path):
 
 
 def select_included_seqs_from_gold(seqs_included, gold ):
-    # select boundaries    
-    allkeys = gold.boundaries[0].keys()
-    for key in list(allkeys):
-        if key not in seqs_included:
-            for i in range(2):
-                gold.boundaries[i].pop(key)
+    # the selection is a shallow copy of the gold, so the same loaded gold
+    # can be narrowed for several experiments: only the dicts are copied,
+    # the alignments of the files are shared
+    included = set(seqs_included)
+    gold = copy.copy(gold)
+
+    # the boundaries are built again from the selected words, when they
+    # are asked
+    gold.boundaries = None
     
     # select phones
     gold.phones = { name: gold.phones[name] for name in seqs_included }
     
     # select words
     gold.words = { name: gold.words[name] for name in seqs_included }
+
+    # select vad and silences
+    if getattr(gold, 'vad', None) is not None:
+        gold.vad = {name: gold.vad[name] for name in gold.vad
+                    if name in included}
+        gold.silences = {name: gold.silences[name] for name in gold.silences
+                         if name in included}
     
     return gold
 
@@ -129,12 +266,12 @@ def select_included_seqs_from_gold(seqs_included, gold ):
 def narrow_gold(gold, seqfiledir):
 
     with open(os.path.join(seqfiledir, 'seq_names.txt'), 'r') as f: 
-        seqs_included = f.read().split('\n')
+        seqs_included = [name for name in f.read().splitlines() if name]
 
     return select_included_seqs_from_gold(seqs_included, gold )
 
 
-def check_boundary(gold_times, disc_times):
+def check_boundary(gold_times, disc_times, ovth=None):
     """ Consider phone discovered if the found interval overlaps
         with either more thant 50% or more than 'ovth' of the
         gold phone.
@@ -145,7 +282,8 @@ def check_boundary(gold_times, disc_times):
         :param disc_times: tuples: contains the timestamps of the
                                    discovered phone
         :type disc_times:  tuples of float
-        :param ovth: overlap threshold, include transcription if more than 'ovth'
+        :param ovth: overlap threshold, include transcription if more than
+                     'ovth', the default one (see `tdev2.config`) if None
         :type ovth:  float
 
         Output
@@ -153,6 +291,8 @@ def check_boundary(gold_times, disc_times):
                            False otherwise
     """
 
+    if ovth is None:
+        ovth = Config().overlap_th
     gold_dur = round(gold_times[1] - gold_times[0], 3)
     ov, ov_time = overlap(disc_times, gold_times)
 
@@ -167,6 +307,118 @@ def check_boundary(gold_times, disc_times):
         return False
 
 
+def round_array(values, decimals):
+    """ Vectorized equivalent of the builtin round.
+
+        np.round rounds the scaled binary value half to even, while the
+        builtin round rounds the exact decimal value of the float, so the
+        values close to a tie are rounded with the builtin round to get
+        exactly the same result as `check_boundary`.
+    """
+    values = np.asarray(values, dtype=float)
+    scaled = values * 10 ** decimals
+    rounded = np.round(values, decimals)
+    for i in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded[i] = round(float(values[i]), decimals)
+    return rounded
+
+
+def check_boundaries(gold_on, gold_off, disc_on, disc_off, ovth=None):
+    """ Vectorized version of `check_boundary`: for arrays of gold phones
+        and of discovered intervals, return a boolean array which is True
+        where the gold phone is considered discovered.
+    """
+    return keep_boundaries(
+        edge_overlaps(gold_on, gold_off, disc_on, disc_off), ovth)
+
+
+def edge_overlaps(gold_on, gold_off, disc_on, disc_off):
+    """ Compute the quantities `check_boundary` compares to the overlap
+        threshold, for arrays of gold phones and of discovered intervals,
+        so that they can be compared to several thresholds (see
+        `keep_boundaries`).
+
+        Output
+        :return: gold_dur, ov, ov_time, the arrays of the duration of the
+                 gold phones, of the ratio of the phones that is
+                 overlapped, and of the duration of the overlap
+    """
+    gold_dur = round_array(gold_off - gold_on, 3)
+    ov_time = np.minimum(disc_off, gold_off) - np.maximum(disc_on, gold_on)
+    ov = ov_time / (gold_off - gold_on)
+    ov_time = round_array(ov_time, 3)
+    return gold_dur, ov, ov_time
+
+
+def keep_boundaries(overlaps, ovth=None):
+    """ Given the output of `edge_overlaps`, return a boolean array which
+        is True where the gold phone is considered discovered with the
+        overlap threshold ovth (the default one if None).
+    """
+    if ovth is None:
+        ovth = Config().overlap_th
+    gold_dur, ov, ov_time = overlaps
+    long_phone = gold_dur >= 2*ovth
+    return ((long_phone & (ov_time >= ovth)) |
+            (~long_phone & (ov >= 0.5)))
+
+
+def interval_union(onsets, offsets):
+    """ Merge intervals into their union, a list of disjoint intervals.
+
+        The intervals are sorted by onset, and an interval starts a new
+        part of the union when it begins after the end of all the previous
+        ones (intervals that only touch are merged). In O(n log(n)).
+
+        Output
+        :return: onsets, offsets, the arrays of the onsets and offsets of
+                 the disjoint intervals, sorted
+    """
+    onsets = np.asarray(onsets, dtype=float)
+    offsets = np.asarray(offsets, dtype=float)
+    if len(onsets) == 0:
+        return onsets, offsets
+    order = np.argsort(onsets, kind='stable')
+    onsets, offsets = onsets[order], offsets[order]
+    ends = np.maximum.accumulate(offsets)
+    starts = np.ones(len(onsets), dtype=bool)
+    starts[1:] = onsets[1:] > ends[:-1]
+    first = np.flatnonzero(starts)
+    last = np.append(first[1:], len(onsets)) - 1
+    return onsets[first], ends[last]
+
+
+def covered_time(onsets, offsets, begins, ends):
+    """ Return the time of each [begin, end) that is covered by disjoint
+        intervals, sorted, as returned by `interval_union`. In
+        O((n + m) log(n)) for m queries.
+
+        Input
+        :param onsets:  array of the onsets of the disjoint intervals
+        :param offsets: array of their offsets
+        :param begins:  array of the onsets of the queries
+        :param ends:    array of the offsets of the queries
+        Output
+        :return:        array of the time covered in each query
+    """
+    begins = np.asarray(begins, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    if len(onsets) == 0:
+        return np.zeros(len(begins))
+    durations = offsets - onsets
+    # time covered before each interval
+    before = np.cumsum(durations) - durations
+
+    def covered_until(times):
+        # the last interval that begins before each time, -1 if none
+        ix = np.searchsorted(onsets, times, side='right') - 1
+        last = np.maximum(ix, 0)
+        inside = np.clip(times - onsets[last], 0., durations[last])
+        return np.where(ix >= 0, before[last] + inside, 0.)
+
+    return np.maximum(covered_until(ends) - covered_until(begins), 0.)
+
+
 def overlap(disc, gold):
     ov = (min(disc[1], gold[1]) - max(disc[0], gold[0])) \
         / (gold[1] - gold[0])
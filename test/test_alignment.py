@@ -0,0 +1,47 @@
+import random
+import intervaltree
+
+from tdev2.readers.alignment import Alignment
+
+
+def test_same_as_intervaltree(mandarin_gold):
+    """ overlap queries should give the same result as an interval tree"""
+    tree_phones, _, _, _, _ = mandarin_gold.read_gold_intervalTree(
+        mandarin_gold.phn_path, "phone")
+
+    random.seed(0)
+    for fname in tree_phones:
+        assert len(tree_phones[fname]) == len(mandarin_gold.phones[fname]), (
+            "not same number of intervals for file {}".format(fname))
+        for _ in range(200):
+            on = random.uniform(0, 300)
+            off = on + random.uniform(0, 2)
+            tree_ov = sorted(tuple(iv) for iv
+                             in tree_phones[fname].overlap(on, off))
+            assert tree_ov == mandarin_gold.phones[fname].overlap(on, off), (
+                "array and tree overlaps differ for {} {} {}".format(
+                    fname, on, off))
+
+
+def test_overlapping_intervals():
+    intervals = [(0.0, 10.0, 'a'), (1.0, 2.0, 'b'),
+                 (3.0, 4.0, 'c'), (3.0, 4.0, 'c')]
+    symbols = ['a', 'b', 'c']
+    ali = Alignment.from_tuples(intervals, {'a': 0, 'b': 1, 'c': 2}, symbols)
+    tree = intervaltree.IntervalTree.from_tuples(intervals)
+
+    assert len(ali) == len(tree) == 3, "duplicates should be kept once"
+    for on, off in [(2.5, 3.5), (0.5, 1.5), (4.0, 5.0), (9.0, 11.0),
+                    (10.0, 11.0), (2.0, 3.0)]:
+        assert ali.overlap(on, off) == sorted(
+            tuple(iv) for iv in tree.overlap(on, off))
+
+
+def test_word_transcriptions(mandarin_gold):
+    """ the indexed phones of each word should be the phones overlapping it"""
+    for fname, words in mandarin_gold.words.items():
+        phones = mandarin_gold.phones[fname]
+        assert len(words.transcriptions) == len(words)
+        for (on, off, _), trs in zip(words, words.transcriptions):
+            assert tuple(mandarin_gold.ix2phn[c] for c in trs) == tuple(
+                phn for _, _, phn in phones.overlap(on, off))
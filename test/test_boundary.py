@@ -1,5 +1,10 @@
 from collections import defaultdict
-from tdev2.measures.boundary import Boundary
+
+import numpy as np
+
+from tdev2.measures.boundary import Boundary, match_times
+from tdev2.readers.disc_reader import Disc
+from tdev2.readers.gold_reader import Gold
 
 
 def test_boundaries(gold):
@@ -49,5 +54,38 @@ def test_ZR17Disc_subpart(mandarin_gold, ZR17_disc):
     bound = Boundary(mandarin_gold, ZR17_disc)
     bound.compute_boundary()
 
-    assert bound.n_discovered_boundary == 12, ("should have found "
-            "13 boundaries in those pairs")
+    # the discovered intervals are transcribed with the gold words, so the
+    # first onset and last offset of each of the 12 transcribed intervals
+    # are gold boundaries, and they are all distinct
+    assert bound.n_discovered_boundary == 24, ("should have found "
+            "24 boundaries in those pairs")
+
+
+def test_tolerance(tmp_path):
+    """ with a tolerance, the discovered boundaries close to a gold
+        boundary are found, and a gold boundary is only recalled once"""
+    alignment = 'f1 0.00 1.00 A\nf1 1.00 2.00 B\nf1 2.00 3.00 C\n'
+    for ext in ('phn', 'wrd'):
+        (tmp_path / 'gold.{}'.format(ext)).write_text(alignment)
+    (tmp_path / 'disc.class').write_text(
+        'Class 1\nf1 0.00 1.00\nf1 0.00 2.00\n\n')
+    gold = Gold(wrd_path=str(tmp_path / 'gold.wrd'),
+                phn_path=str(tmp_path / 'gold.phn'))
+    disc = Disc(str(tmp_path / 'disc.class'), gold)
+
+    bound = Boundary(gold, disc)
+    bound.compute_boundary()
+    assert (bound.n_discovered_boundary, bound.n_all_disc_boundary,
+            bound.n_gold_boundary) == (3, 3, 4)
+
+    assert list(match_times([0.9, 1.05, 2.5], np.array([1., 2.]), 0.1)) == [
+        True, True, False]
+    assert not match_times([1.05], np.array([1.]), 0.).any()
+    # the discovered boundaries near 1.00 are both found, but recall it once
+    bound = Boundary(gold, disc, config=gold.config._replace(
+        boundary_tolerance=0.1))
+    bound.disc_boundaries = {'f1': (np.array([0., 0.95]),
+                                    np.array([1.05, 2.]))}
+    bound.compute_boundary()
+    assert (bound.n_discovered_boundary, bound.n_matched_gold_boundary,
+            bound.n_all_disc_boundary) == (4, 3, 4)
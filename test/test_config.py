@@ -0,0 +1,45 @@
+import json
+import threading
+
+from tdev2.config import Config, load_config
+from tdev2.readers.disc_reader import Disc
+
+
+def test_read(tmp_path):
+    """ a config file overrides the defaults, and the Config is immutable"""
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps(
+        {'overlap_th': 5.0, 'excluded_units': ['SIL', 'SPN'],
+         'discoverable_th': 2}))
+    config = load_config(config_file=str(config_file))
+    assert config == Config(5.0, ['SPN', 'SIL'], 2)
+    assert config._replace(overlap_th=1.0).overlap_th == 1.0
+    assert config.overlap_th == 5.0
+    assert load_config(default=config) is config
+    assert load_config() == Config()
+
+
+def test_concurrent_configs(mandarin_gold, kamper_disc):
+    """ reading the discovered classes with two configurations at the same
+        time should give the same intervals as reading them one after the
+        other"""
+    configs = [mandarin_gold.config._replace(overlap_th=ovth)
+               for ovth in (0.01, 5.0)]
+    sequential = [Disc(kamper_disc.disc_path, mandarin_gold, config=config)
+                  for config in configs]
+
+    concurrent = [None] * len(configs)
+
+    def read(i):
+        concurrent[i] = Disc(kamper_disc.disc_path, mandarin_gold,
+                             config=configs[i])
+    threads = [threading.Thread(target=read, args=(i,))
+               for i in range(len(configs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(sequential[0].intervals) != sorted(sequential[1].intervals)
+    for seq, conc in zip(sequential, concurrent):
+        assert sorted(seq.intervals) == sorted(conc.intervals)
@@ -0,0 +1,26 @@
+from tdev2.measures.context import EvaluationContext
+from tdev2.measures.coverage import Coverage
+from tdev2.measures.grouping import Grouping
+
+
+def test_cached(mandarin_gold, kamper_disc):
+    context = EvaluationContext(mandarin_gold, kamper_disc)
+    assert context.phone_counts is context.phone_counts, (
+        "derived data should be computed once")
+    assert sum(context.phone_counts.values()) == sum(
+        len(mandarin_gold.phones[fname]) for fname in mandarin_gold.phones)
+
+
+def test_shared_context(mandarin_gold, kamper_disc):
+    """ measures should give the same results with a shared context"""
+    context = EvaluationContext(mandarin_gold, kamper_disc)
+    for shared in (context, None):
+        coverage = Coverage(mandarin_gold, kamper_disc, context=shared)
+        coverage.compute_coverage()
+        grouping = Grouping(kamper_disc, context=shared)
+        grouping.compute_grouping()
+        if shared is not None:
+            shared_scores = (coverage.coverage, grouping.precision,
+                             grouping.recall)
+    assert shared_scores == (coverage.coverage, grouping.precision,
+                             grouping.recall)
@@ -1,4 +1,7 @@
-from tdev2.measures.coverage import Coverage
+from tdev2.measures.coverage import Coverage, Coverage_NoSingleton
+from tdev2.measures.coverage import TimeCoverage
+from tdev2.readers.gold_reader import Gold
+from tdev2.readers.disc_reader import Disc
 
 
 def test_gold_coverage(gold, gold_disc):
@@ -11,3 +14,55 @@ def test_coverage_max(mandarin_gold, kamper_disc):
     cov = Coverage(mandarin_gold, kamper_disc)
     cov.compute_coverage()
     assert cov.coverage <= 1.0, "Coverage can't be greater than 1"
+
+
+def test_coverage_nosingleton(tmp_path):
+    """ the singletons and the excluded units are not discoverable, and a
+        phone covered by several intervals is counted once"""
+    alignment = ('f1 0.00 1.00 A\nf1 1.00 2.00 B\nf1 2.00 3.00 SIL\n'
+                 'f2 0.00 1.00 A\nf2 1.00 2.00 SIL\n')
+    for ext in ('phn', 'wrd'):
+        (tmp_path / 'gold.{}'.format(ext)).write_text(alignment)
+    (tmp_path / 'disc.class').write_text(
+        'Class 1\nf1 0.00 2.00\nf1 0.00 1.00\n\n'
+        'Class 2\nf1 1.00 3.00\nf2 1.00 2.00\n\n')
+    gold = Gold(wrd_path=str(tmp_path / 'gold.wrd'),
+                phn_path=str(tmp_path / 'gold.phn'))
+    disc = Disc(str(tmp_path / 'disc.class'), gold)
+
+    cov = Coverage_NoSingleton(gold, disc)
+    cov.compute_coverage()
+    assert (cov.n_covered, cov.n_phones) == (1, 2)
+    assert cov.coverage_frames == 0.5
+
+    # the same from the intervals as tuples
+    disc.intervals = list(disc.intervals)
+    cov = Coverage_NoSingleton(gold, disc)
+    cov.compute_coverage()
+    assert (cov.n_covered, cov.n_phones) == (1, 2)
+
+
+def test_time_coverage(tmp_path):
+    """ the time coverage is the speech time covered by the union of the
+        discovered intervals, overlapping intervals being counted once"""
+    alignment = ('f1 0.00 1.00 A\nf1 1.00 2.00 SIL\nf1 2.00 4.00 B\n'
+                 'f2 0.00 1.00 A\n')
+    for ext in ('phn', 'wrd'):
+        (tmp_path / 'gold.{}'.format(ext)).write_text(alignment)
+    (tmp_path / 'gold.vad').write_text(
+        'f1 0.00 1.00\nf1 2.00 3.00\nf1 2.50 4.00\nf2 0.00 1.00\n')
+    (tmp_path / 'disc.class').write_text(
+        'Class 1\nf1 0.50 2.50\nf1 0.00 1.00\nf1 3.00 5.00\n\n')
+
+    gold = Gold(wrd_path=str(tmp_path / 'gold.wrd'),
+                phn_path=str(tmp_path / 'gold.phn'))
+    cov = TimeCoverage(gold, Disc(str(tmp_path / 'disc.class'), gold))
+    cov.compute_coverage()
+    assert (cov.covered_time, cov.speech_time) == (2.5, 4.0)
+
+    gold = Gold(vad_path=str(tmp_path / 'gold.vad'),
+                wrd_path=str(tmp_path / 'gold.wrd'),
+                phn_path=str(tmp_path / 'gold.phn'))
+    cov = TimeCoverage(gold, Disc(str(tmp_path / 'disc.class'), gold))
+    cov.compute_coverage()
+    assert (cov.covered_time, cov.speech_time) == (2.5, 4.0)
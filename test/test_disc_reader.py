@@ -1,3 +1,10 @@
+import pytest
+
+from tdev2.readers.disc_reader import Disc
+from tdev2.readers.gold_reader import Gold
+from tdev2.utils import write_disc_class_file
+
+
 def test_unique_intervals():
     pass
 
@@ -47,3 +54,127 @@ def test_50percent(disc, gold):
         'should not have found last phone because took less than 50% of it')
     assert ngram_good == ('ah', 'n'), (
         'should have found last phone because took more thant 50% of it')
+
+
+def test_batch_transcription(mandarin_gold, kamper_disc):
+    """ transcribing all intervals at once should give the same result
+        as transcribing them one by one"""
+    intervals = [(fname, on, off) for fname, on, off, _, _
+                 in kamper_disc.intervals]
+    # add intervals that cover no phone at all
+    intervals += [(fname, on + 1000, off + 1000) for fname, on, off
+                  in intervals[:10]]
+    batch = kamper_disc.get_transcriptions(intervals, mandarin_gold.words)
+    for interval, transcription in zip(intervals, batch):
+        assert transcription == kamper_disc.get_transcription(
+            *interval, mandarin_gold.words), (
+                'batch transcription differs for {}'.format(interval))
+
+
+def test_parallel_transcription(mandarin_gold, kamper_disc):
+    """ sharding the files between processes should not change the
+        discovered clusters"""
+    parallel_disc = Disc(kamper_disc.disc_path, mandarin_gold, njobs=3)
+    assert parallel_disc.clusters == kamper_disc.clusters
+    assert sorted(parallel_disc.intervals) == sorted(kamper_disc.intervals)
+
+
+def test_from_nodes(mandarin_gold, kamper_disc, tmp_path):
+    """ reading the nodes directly should give the same clusters as
+        writing and reading the class file"""
+    nodes = [None]
+    dedups = []
+    for class_nb in sorted(kamper_disc.clusters, key=int):
+        dedups.append([])
+        for fname, disc_on, disc_off, _, _ in kamper_disc.clusters[class_nb]:
+            nodes.append((fname, disc_on + 0.0049, disc_off - 0.0051))
+            dedups[-1].append(len(nodes) - 1)
+
+    class_file = str(tmp_path / 'master_graph.class')
+    write_disc_class_file(dedups, nodes, class_file)
+    from_file = Disc(class_file, mandarin_gold)
+    from_nodes = Disc.from_nodes(nodes, dedups, mandarin_gold)
+
+    assert from_nodes.clusters == from_file.clusters
+    assert sorted(from_nodes.intervals) == sorted(from_file.intervals)
+
+
+def test_iter_clusters(mandarin_gold, kamper_disc):
+    """ the clusters read one at a time should be the clusters of the
+        Disc"""
+    clusters = dict(Disc.iter_clusters(kamper_disc.disc_path, mandarin_gold))
+    assert clusters == kamper_disc.clusters
+
+
+def test_missing_final_line(mandarin_gold, kamper_disc, tmp_path):
+    """ a class file that doesn't end with an empty line is rejected"""
+    with open(kamper_disc.disc_path, 'r') as fin:
+        lines = fin.read().rstrip('\n')
+    class_file = tmp_path / 'truncated.class'
+    class_file.write_text(lines + '\n')
+    with pytest.raises(AssertionError):
+        list(Disc.iter_clusters(str(class_file), mandarin_gold))
+
+
+def test_interval_table(mandarin_gold, kamper_disc):
+    """ the views of the columns should give the tuples of the transcribed
+        intervals, with a few tens of bytes per interval"""
+    nodes = sorted({(fname, on, off) for fname, on, off, _, _
+                    in kamper_disc.intervals})
+    transcriptions = Disc.get_transcriptions(nodes, mandarin_gold.words)
+    expected = sorted(node + transcription
+                      for node, transcription in zip(nodes, transcriptions))
+    assert sorted(kamper_disc.intervals) == expected
+    assert kamper_disc.intervals[-1] == kamper_disc.intervals[
+        len(kamper_disc.intervals) - 1]
+    assert set(kamper_disc.clusters) == set(
+        class_nb for class_nb, _ in Disc.iter_clusters(
+            kamper_disc.disc_path, mandarin_gold))
+    assert kamper_disc.table.nbytes / len(kamper_disc.table) < 100
+
+
+def test_without_gold(kamper_disc):
+    """ without gold, all the intervals are kept, without transcription"""
+    disc = Disc(kamper_disc.disc_path)
+    assert len(disc.intervals) >= len(kamper_disc.intervals)
+    assert all(interval[3:] == (None, None) for interval in disc.intervals)
+
+
+def test_sweep(mandarin_gold, kamper_disc):
+    """ transcribing the intervals with several overlap thresholds at once
+        should give the same clusters as reading them with each threshold"""
+    thresholds = [0.01, 0.03, 5.0]
+    discs = Disc.sweep(thresholds, mandarin_gold,
+                       disc_path=kamper_disc.disc_path)
+    for ovth in thresholds:
+        config = mandarin_gold.config._replace(overlap_th=ovth)
+        disc = Disc(kamper_disc.disc_path, mandarin_gold, config=config)
+        assert discs[ovth].clusters == disc.clusters
+        assert sorted(discs[ovth].intervals) == sorted(disc.intervals)
+
+
+def test_prune_silence(mandarin_gold, kamper_disc, tmp_path):
+    """ pruning the silences should only throw away the intervals entirely
+        outside of the VAD, whether they are read or swept"""
+    # the speech is the first half of each file
+    vad_path = tmp_path / 'mandarin.vad'
+    with open(str(vad_path), 'w') as fout:
+        for fname in sorted(mandarin_gold.words):
+            words = list(mandarin_gold.words[fname])
+            fout.write('{} {:.2f} {:.2f}\n'.format(
+                fname, words[0][0], (words[0][0] + words[-1][1]) / 2))
+    gold = Gold(vad_path=str(vad_path), wrd_path=mandarin_gold.wrd_path,
+                phn_path=mandarin_gold.phn_path)
+
+    disc = Disc(kamper_disc.disc_path, gold, prune_silence=True)
+    intervals = sorted(kamper_disc.intervals)
+    speech = gold.in_speech([interval[0] for interval in intervals],
+                            [interval[1] for interval in intervals],
+                            [interval[2] for interval in intervals])
+    assert 0 < speech.sum() < len(intervals)
+    assert sorted(disc.intervals) == [
+        interval for interval, keep in zip(intervals, speech) if keep]
+
+    swept = Disc.sweep([gold.config.overlap_th], gold,
+                       disc_path=kamper_disc.disc_path, prune_silence=True)
+    assert swept[gold.config.overlap_th].clusters == disc.clusters
@@ -0,0 +1,20 @@
+import os
+import sys
+import subprocess
+import pkg_resources
+
+
+def test_boundary(tmp_path):
+    """ eval.py should compute the boundary measure in a worker and write
+        its score"""
+    class_file = pkg_resources.resource_filename(
+            pkg_resources.Requirement.parse('tdev2'),
+            'tdev2/share/kamper_mandarin.class')
+    output = tmp_path / 'output'
+    os.makedirs(str(output))
+    subprocess.check_call([sys.executable, '-m', 'tdev2.eval', class_file,
+                           'mandarin', str(output), '-m', 'boundary'])
+    with open(str(output / 'boundary')) as fin:
+        lines = fin.readlines()
+    assert lines[0] == 'metric: boundary\n'
+    assert len(lines) == 4
@@ -0,0 +1,188 @@
+import os
+import json
+import pytest
+import pkg_resources
+
+from tdev2 import eval_sign, eval_batch
+from tdev2.eval_sign import try_compute_scores, evaluate_experiment
+from tdev2.eval_sign import compute_scores, compute_statistics
+from tdev2.measures.statistics import Statistics, merge_statistics
+from tdev2.profiling import Profiler
+from tdev2.eval_batch import expand_paths, evaluate_batch, write_csv
+
+
+def test_concurrent_measures(mandarin_gold, kamper_disc):
+    """ measures computed concurrently should give the same scores, and a
+        failing measure (token/type fails on mandarin, as no token is
+        found) should not stop the others"""
+    measures = ['boundary', 'grouping', 'token/type']
+    scores = try_compute_scores(mandarin_gold, kamper_disc, measures, njobs=1)
+    concurrent = try_compute_scores(
+        mandarin_gold, kamper_disc, measures, njobs=3)
+
+    assert scores == concurrent
+    assert concurrent['grouping_F'] > 0 and concurrent['boundary_F'] > 0
+
+
+def test_crashed_worker(mandarin_gold, kamper_disc, monkeypatch):
+    """ a measure whose worker dies (e.g. killed when out of memory) should
+        fail without stopping the others"""
+    compute_scores = eval_sign.compute_scores
+
+    def crashing_compute_scores(gold, disc, measures, **kwargs):
+        if 'grouping' in measures:
+            os._exit(1)
+        return compute_scores(gold, disc, measures, **kwargs)
+
+    measures = ['boundary', 'grouping', 'coverage']
+    scores = try_compute_scores(mandarin_gold, kamper_disc, measures, njobs=1)
+    monkeypatch.setattr(eval_sign, 'compute_scores', crashing_compute_scores)
+    crashed = try_compute_scores(
+        mandarin_gold, kamper_disc, measures, njobs=3)
+
+    assert crashed['grouping_F'] == 0
+    assert {k: v for k, v in crashed.items() if not k.startswith('grouping')} \
+        == {k: v for k, v in scores.items() if not k.startswith('grouping')}
+
+
+def test_profile(mandarin_gold, kamper_disc, tmp_path):
+    """ profiling should record each measure, also when they are computed
+        by workers, without changing the scores, and each worker should
+        only compute its measure"""
+    measures = ['boundary', 'grouping', 'token/type', 'coverage',
+                'coverageNS', 'coverageT']
+    scores = try_compute_scores(mandarin_gold, kamper_disc, measures, njobs=1)
+    for njobs in [1, 3]:
+        profiler = Profiler(cprofile_dir=str(tmp_path / str(njobs)))
+        assert try_compute_scores(mandarin_gold, kamper_disc, measures,
+                                  njobs=njobs, profiler=profiler) == scores
+        stages = profiler.to_dict()
+        assert set(measures) <= set(stages)
+        assert all(stages[measure]['calls'] == 1
+                   and stages[measure]['wall_time'] > 0
+                   for measure in measures)
+        assert os.path.isfile(str(tmp_path / str(njobs) / 'grouping.prof'))
+        json.dumps(stages)
+
+
+def test_sharded_statistics(mandarin_gold, kamper_disc, tmp_path):
+    """ the statistics of the shards, written to JSON and merged, should
+        be the statistics of the whole corpus, and give the same scores"""
+    config_file = str(tmp_path / 'config.json')
+    with open(config_file, 'w') as fout:
+        json.dump({'overlap_th': 5.0, 'excluded_units': ['SIL', 'SPN'],
+                   'discoverable_th': 1}, fout)
+
+    measures = ['boundary', 'grouping', 'token/type', 'coverage',
+                'coverageNS', 'coverageT', 'ned']
+    full = compute_statistics(mandarin_gold, kamper_disc, measures,
+                              config_file=config_file)
+    shards = [compute_statistics(mandarin_gold, kamper_disc, measures,
+                                 shard=shard, n_shards=3,
+                                 config_file=config_file)
+              for shard in range(3)]
+    shards = [{measure: Statistics.from_dict(json.loads(json.dumps(
+                  stats[measure].to_dict()))) for measure in stats}
+              for stats in shards]
+    merged = {measure: merge_statistics(stats[measure] for stats in shards)
+              for measure in measures}
+    assert merged.keys() == full.keys()
+    for measure in measures:
+        # the durations and edit distances are summed in another order,
+        # so they are only equal up to rounding
+        assert merged[measure].metric_name == full[measure].metric_name
+        assert merged[measure].counts == pytest.approx(full[measure].counts)
+        assert merged[measure].sets == full[measure].sets
+        assert merged[measure].counters.keys() \
+            == full[measure].counters.keys()
+        for name, counter in full[measure].counters.items():
+            assert dict(merged[measure].counters[name]) \
+                == pytest.approx(dict(counter))
+
+    measures = ['boundary', 'grouping', 'coverage', 'coverageNS',
+                'coverageT', 'ned']
+    scores = compute_scores(mandarin_gold, kamper_disc, measures, njobs=1,
+                            config_file=config_file)
+    assert compute_scores(mandarin_gold, kamper_disc, measures,
+                          statistics=merged, njobs=1,
+                          config_file=config_file) \
+        == pytest.approx(scores, nan_ok=True)
+
+
+def write_zr17_experiment(exp_path, class_file, fnames):
+    """ Write the nodes and dedups of the clusters of a class file as the
+        output of the zr17 system"""
+    nodes, dedups = [], []
+    with open(class_file) as fin:
+        for line in fin:
+            line = line.split()
+            if len(line) > 0 and line[0] == 'Class':
+                dedups.append([])
+            elif len(line) == 3:
+                nodes.append(' '.join(line))
+                dedups[-1].append(str(len(nodes)))
+    os.makedirs(os.path.join(exp_path, 'results'))
+    with open(os.path.join(exp_path, 'results', 'master_graph.nodes'),
+              'w') as fout:
+        fout.write('\n'.join(nodes) + '\n')
+    with open(os.path.join(exp_path, 'results', 'master_graph.dedups'),
+              'w') as fout:
+        fout.write('\n'.join(' '.join(dedup) for dedup in dedups) + '\n')
+    with open(os.path.join(exp_path, 'seq_names.txt'), 'w') as fout:
+        fout.write(''.join(fname + '\n' for fname in fnames))
+
+
+def test_batch(mandarin_gold, tmp_path):
+    """ each experiment of a batch should get the same scores as when
+        evaluated alone, and a failing experiment should not stop the
+        others"""
+    class_file = pkg_resources.resource_filename(
+            pkg_resources.Requirement.parse('tdev2'),
+            'tdev2/share/ZR17_mandarin.class')
+    fnames = sorted(mandarin_gold.phones)
+    write_zr17_experiment(str(tmp_path / 'all'), class_file, fnames)
+    write_zr17_experiment(str(tmp_path / 'other'), class_file, fnames)
+    os.makedirs(str(tmp_path / 'broken'))
+
+    exp_paths = expand_paths([str(tmp_path / '*')])
+    assert [os.path.basename(p) for p in exp_paths] == [
+        'all', 'broken', 'other']
+
+    measures = ['boundary', 'grouping']
+    all_scores = evaluate_batch(mandarin_gold, exp_paths, 'zr17', measures,
+                                njobs=2)
+    assert all_scores[str(tmp_path / 'broken')] is None
+    assert all_scores[str(tmp_path / 'all')] == evaluate_experiment(
+        mandarin_gold, str(tmp_path / 'all'), 'zr17', measures, njobs=1)
+    assert len(mandarin_gold.phones) == len(fnames), (
+        "the gold should not be modified by the evaluation")
+
+    write_csv(all_scores, str(tmp_path / 'scores.csv'))
+    with open(str(tmp_path / 'scores.csv')) as fin:
+        assert len(fin.readlines()) == 4
+
+
+def test_batch_crashed_worker(mandarin_gold, tmp_path, monkeypatch):
+    """ an experiment whose process dies should fail without stopping the
+        others"""
+    class_file = pkg_resources.resource_filename(
+            pkg_resources.Requirement.parse('tdev2'),
+            'tdev2/share/ZR17_mandarin.class')
+    fnames = sorted(mandarin_gold.phones)
+    for name in ('all', 'crashed', 'other'):
+        write_zr17_experiment(str(tmp_path / name), class_file, fnames)
+    evaluate_experiment = eval_batch.evaluate_experiment
+
+    def crashing_evaluate_experiment(gold, exp_path, *args, **kwargs):
+        if exp_path.endswith('crashed'):
+            os._exit(1)
+        return evaluate_experiment(gold, exp_path, *args, **kwargs)
+
+    monkeypatch.setattr(eval_batch, 'evaluate_experiment',
+                        crashing_evaluate_experiment)
+    exp_paths = expand_paths([str(tmp_path / '*')])
+    all_scores = evaluate_batch(mandarin_gold, exp_paths, 'zr17',
+                                ['boundary'], njobs=3)
+    assert all_scores[str(tmp_path / 'crashed')] is None
+    assert all_scores[str(tmp_path / 'all')]['boundary_F'] > 0
+    assert all_scores[str(tmp_path / 'other')]['boundary_F'] > 0
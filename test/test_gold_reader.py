@@ -1,4 +1,7 @@
 import pytest
+import numpy as np
+
+from tdev2.readers.gold_reader import Gold
 
 
 def test_bad_file(gold_vad):
@@ -63,7 +66,43 @@ def test_phone_word_read_gold(gold_vad):
                 "word offset does not appear in phone alignment")
 
 
-def test_silences_tree():
-    # TODO: compare overlaps between vad/phn/word and silence: should be
-    # None...
-    pass
+def test_silences(tmp_path):
+    """ the silences are the gaps of the VAD, and the intervals outside of
+        them are in the speech"""
+    alignment = 'f1 0.00 1.00 A\nf1 1.00 4.00 B\nf2 0.00 1.00 A\n'
+    for ext in ('phn', 'wrd'):
+        (tmp_path / 'gold.{}'.format(ext)).write_text(alignment)
+    (tmp_path / 'gold.vad').write_text('f1 0.50 1.00\nf1 2.00 3.00\n')
+    gold = Gold(vad_path=str(tmp_path / 'gold.vad'),
+                wrd_path=str(tmp_path / 'gold.wrd'),
+                phn_path=str(tmp_path / 'gold.phn'))
+
+    onsets, offsets = gold.silences['f1']
+    assert list(onsets) == [0., 1.] and list(offsets) == [0.5, 2.]
+
+    fnames = ['f1', 'f1', 'f1', 'f2']
+    onsets, offsets = [0., 1.2, 2.5, 0.], [1., 1.8, 4., 1.]
+    fractions = gold.speech_fractions(fnames, onsets, offsets)
+    assert list(fractions[:3]) == pytest.approx([0.5, 0., 1 / 3])
+    assert np.isnan(fractions[3]), "f2 is not in the VAD"
+    assert list(gold.in_speech(fnames, onsets, offsets)) == [
+        True, False, True, True]
+
+
+def test_gold_cache(mandarin_gold, tmp_path):
+    """ gold loaded from the binary cache should be the same as parsed"""
+    cached = [Gold(wrd_path=mandarin_gold.wrd_path,
+                   phn_path=mandarin_gold.phn_path,
+                   cache_dir=str(tmp_path)) for _ in range(2)]
+    assert len(list(tmp_path.iterdir())) == 2, (
+        "should have written one snapshot per alignment")
+
+    for gold in cached:
+        assert gold._boundaries is None, (
+            "the boundaries should only be built when they are asked")
+        assert gold.boundaries == mandarin_gold.boundaries
+        assert gold.ix2phn == mandarin_gold.ix2phn
+        for fname in mandarin_gold.phones:
+            assert (list(gold.phones[fname])
+                    == list(mandarin_gold.phones[fname]))
+            assert list(gold.words[fname]) == list(mandarin_gold.words[fname])
@@ -1,3 +1,9 @@
+import numpy as np
+
+from itertools import combinations
+from collections import defaultdict
+
+from tdev2.utils import overlap
 from tdev2.measures.grouping import Grouping
 
 
@@ -44,3 +50,59 @@ def test_weights(disc_clusters):
         "'cassoulet' has 2 tokens out of 6 in pairs in good_pairs")
     assert weights_overlap['tambour'] == 2/4, (
         "'tambour' has 2 tokens out of 4 in overlap_pairs")
+
+
+def test_counts_same_as_pairs(kamper_disc):
+    """ counting the tokens should give the same result as creating all
+        the discovered and gold pairs"""
+    def sort_pair(f1, f2):
+        return tuple(sorted((f1, f2), key=lambda f: (f[0], f[1])))
+
+    found_pairs = {sort_pair(f1, f2)
+                   for class_nb in kamper_disc.clusters
+                   for f1, f2 in combinations(
+                       kamper_disc.clusters[class_nb], 2)}
+    same = defaultdict(set)
+    for interval in kamper_disc.intervals:
+        same[interval[4]].add(interval)
+    gold_pairs = {sort_pair(f1, f2)
+                  for ngram in same
+                  for f1, f2 in combinations(same[ngram], 2)
+                  if not (f1[0] == f2[0] and
+                          overlap((f1[1], f1[2]), (f2[1], f2[2]))[0] > 0)}
+
+    group = Grouping(kamper_disc)
+    group.compute_grouping()
+    weights, counter = group.get_weights(found_pairs)
+    assert group.found_counter == counter
+    assert group.found_weights == weights
+    weights, counter = group.get_weights(gold_pairs)
+    assert group.gold_counter == counter
+    assert group.gold_weights == weights
+    assert group.n_gold_pairs == len(gold_pairs)
+    _, counter = group.get_weights(gold_pairs.intersection(found_pairs))
+    assert group.found_gold_counter == counter
+
+
+def test_njobs(kamper_disc):
+    """ counting the gold pairs on several processes should give the same
+        counts"""
+    group = Grouping(kamper_disc)
+    group.compute_grouping()
+    group_parallel = Grouping(kamper_disc, njobs=3)
+    group_parallel.compute_grouping()
+
+    assert group.gold_counter == group_parallel.gold_counter
+    assert group.precision == group_parallel.precision
+    assert group.recall == group_parallel.recall
+
+
+def test_count_overlaps():
+    """ overlaps should only be counted in the same segment, and intervals
+        that only touch each other don't overlap"""
+    segments = np.array([0, 0, 0, 0, 1, 1])
+    onsets = np.array([0.0, 1.0, 2.0, 0.5, 0.0, 0.0])
+    offsets = np.array([1.0, 2.0, 3.0, 2.5, 1.0, 1.0])
+
+    n_overlaps = Grouping.count_overlaps(segments, onsets, offsets)
+    assert n_overlaps.tolist() == [1, 1, 1, 3, 1, 1]
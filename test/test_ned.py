@@ -1,7 +1,43 @@
+import pytest
+import numpy as np
+
+from itertools import combinations
 from tdev2.measures.ned import Ned
+from tdev2.readers.disc_reader import Disc
 
 
 def test_gold_pairs(gold, gold_disc_pairs):
     n = Ned(gold_disc_pairs)
     n.compute_ned()
     assert n.ned == 0, "gold pairs should have a ned of 0"
+
+
+def test_same_as_all_pairs(kamper_disc):
+    """ ned computed on distinct n-grams should be the mean of the ned
+        of all the pairs"""
+    n = Ned(kamper_disc)
+    n.compute_ned()
+    all_pairs = [n.pairwise_ned(ngram1, ngram2)
+                 for class_nb in kamper_disc.clusters
+                 for (_, _, _, _, ngram1), (_, _, _, _, ngram2)
+                 in combinations(kamper_disc.clusters[class_nb], 2)]
+
+    assert n.n_pairs == len(all_pairs)
+    assert n.ned == pytest.approx(np.mean(all_pairs), abs=1e-12)
+
+    memoized = Ned(kamper_disc, memoize=True)
+    memoized.compute_ned()
+    assert memoized.ned == n.ned, "memoization should not change ned"
+
+
+def test_streamed_clusters(mandarin_gold, kamper_disc):
+    """ ned computed on the clusters read one at a time should be the same
+        as on all the clusters"""
+    n = Ned(kamper_disc)
+    n.compute_ned()
+    streamed = Ned(None)
+    streamed.compute_ned(Disc.iter_clusters(kamper_disc.disc_path,
+                                          mandarin_gold))
+
+    assert streamed.n_pairs == n.n_pairs
+    assert streamed.ned == n.ned
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from tdev2.profiling import Profiler, memory_status, reset_peak_rss
+
+
+@pytest.mark.skipif(memory_status() is None or not reset_peak_rss(),
+                    reason="the peak memory can't be reset on this platform")
+def test_stage_peak_rss():
+    """ the peak memory of a stage should be that of the stage, not the
+        peak of the process since it started"""
+    profiler = Profiler()
+    with profiler.stage('big'):
+        big = np.ones(200 * 1024 ** 2 // 8)
+        del big
+    with profiler.stage('small'):
+        small = np.ones(1024 ** 2 // 8)
+        del small
+    stages = profiler.to_dict()
+
+    assert stages['big']['peak_rss_mb'] \
+        > stages['big']['rss_start_mb'] + 150
+    assert stages['small']['peak_rss_mb'] \
+        < stages['big']['peak_rss_mb'] - 150
+    assert stages['small']['rss_start_mb'] \
+        <= stages['small']['peak_rss_mb']
+    assert stages['small']['rss_end_mb'] <= stages['small']['peak_rss_mb']
+
+
+def test_update():
+    """ the stages recorded by another profiler should be added"""
+    profiler, worker = Profiler(), Profiler()
+    for prof in (profiler, worker):
+        with prof.stage('measure'):
+            pass
+    profiler.update(worker.to_dict())
+    record = profiler.to_dict()['measure']
+    assert record['calls'] == 2
+    assert set(record) == {'wall_time', 'cpu_time', 'peak_rss_mb',
+                           'rss_start_mb', 'rss_end_mb', 'calls'}
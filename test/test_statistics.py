@@ -0,0 +1,19 @@
+from collections import Counter
+
+from tdev2.measures.statistics import Statistics, merge_statistics
+
+
+def test_merge():
+    """ merging adds the counts and counters, and unites the sets, in any
+        order"""
+    a = Statistics('m', {'n': 1}, {'s': {('a',)}}, {'c': Counter(a=1)})
+    b = Statistics('m', {'n': 2}, {'s': {('b',)}}, {'c': Counter(a=2, b=1)})
+    c = Statistics('m', {'n': 3}, {'s': {('a',)}}, {'c': Counter(b=1)})
+
+    merged = merge_statistics([a, b, c])
+    assert merged.counts == {'n': 6}
+    assert merged.sets == {'s': {('a',), ('b',)}}
+    assert merged.counters == {'c': Counter(a=3, b=2)}
+    assert a.merge(b.merge(c)) == merged == c.merge(a).merge(b)
+    assert a.counts == {'n': 1}, "merging should not change the statistics"
+    assert Statistics.from_dict(merged.to_dict()) == merged
@@ -0,0 +1,21 @@
+from tdev2.readers.symbols import SymbolTable
+
+
+def test_interning():
+    table = SymbolTable(['a', 'b', 'a'])
+    assert len(table) == 2, "symbols should be interned once"
+    assert table.encode(('b', 'c', 'a')) == (1, 2, 0)
+    assert table.decode((2, 0)) == ('c', 'a')
+    assert table.index('d') is None
+
+    ngrams = SymbolTable()
+    ngram = ngrams.canonical(tuple(['a', 'b']))
+    assert ngrams.canonical(('a', 'b')) is ngram, (
+        "equal n-grams should share the same object")
+
+
+def test_disc_ngrams_shared(kamper_disc):
+    """ intervals with the same transcription should share their n-gram"""
+    ngrams = dict()
+    for interval in kamper_disc.intervals:
+        assert ngrams.setdefault(interval[4], interval[4]) is interval[4]
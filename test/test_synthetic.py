@@ -0,0 +1,35 @@
+from tdev2.benchmarks import synthetic
+from tdev2.benchmarks.scaling import run, MEASURES
+from tdev2.eval_sign import try_compute_scores
+from tdev2.readers.disc_reader import Disc
+from tdev2.readers.gold_reader import Gold
+
+
+def test_perfect_clusters(tmp_path):
+    """ clusters of exact tokens of single words should be perfectly
+        pure and precise, and the same seed gives the same corpus"""
+    params = dict(cluster_params=dict(max_ngram=1, purity=1, jitter=0))
+    wrd_path, phn_path, class_file = synthetic.generate(
+        str(tmp_path / 'a'), gold_params=dict(n_files=3), **params)
+    gold = Gold(wrd_path=wrd_path, phn_path=phn_path)
+    disc = Disc(class_file, gold)
+
+    scores = try_compute_scores(gold, disc, ['ned', 'token/type'])
+    assert scores['ned'] == 0
+    assert scores['token_P'] == 100
+
+    paths = synthetic.generate(
+        str(tmp_path / 'b'), gold_params=dict(n_files=3), **params)
+    for path, other in zip([wrd_path, phn_path, class_file], paths):
+        assert open(path).read() == open(other).read()
+
+
+def test_scaling(tmp_path):
+    """ the scaling benchmark should record every stage of every corpus"""
+    results = run('n_files', [2, 4], dict(words_per_file=50),
+                  work_dir=str(tmp_path))
+    assert [point['value'] for point in results['points']] == [2, 4]
+    for point in results['points']:
+        assert set(['read_gold', 'read_disc'] + MEASURES) \
+            <= set(point['stages'])
+        assert point['n_intervals'] > 0